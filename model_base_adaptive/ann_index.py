@@ -0,0 +1,132 @@
+import math
+import time
+import faiss
+import numpy as np
+from config import (
+    ANN_IVF_NLIST, ANN_IVF_NPROBE, ANN_HNSW_M, ANN_HNSW_EF_SEARCH, ANN_PREFILTER
+)
+
+
+def l2_normalized(vectors):
+    """Row-wise L2-normalized float32 copy (zero rows stay zero)."""
+    vectors = np.array(vectors, dtype=np.float32, copy=True).reshape(-1, vectors.shape[-1])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class RecipeAnnIndex:
+    """
+    Approximate inner-product index over the catalog's L2-normalized feature rows.
+
+    Per-request adaptive weights w are folded into the query: (w^2 * u) . x ranks rows by the
+    numerator of the weighted cosine, so the index never has to be rebuilt per weight vector.
+    Its ordering is only approximate (rows are normalized by |x|, not |w * x|), so callers
+    fetch a shortlist and re-rank it with the exact scorer.
+
+    Rows whose normalized vectors are identical (common after ReLU: every row with a single
+    above-average nutrient maps to the same unit vector) are indexed once and expanded back to
+    their rows after the search; thousands of exact duplicates otherwise trap HNSW on a plateau.
+
+    Filters are applied inside the search with a faiss ID selector ("selector"), or by
+    over-fetching and dropping filtered rows ("overfetch").
+    kind: "flat" (exact inner product), "ivf" (IVFFlat) or "hnsw" (HNSWFlat).
+    """
+
+    def __init__(self, features, kind="hnsw", nlist=ANN_IVF_NLIST, nprobe=ANN_IVF_NPROBE,
+                 hnsw_m=ANN_HNSW_M, ef_search=ANN_HNSW_EF_SEARCH, prefilter=ANN_PREFILTER):
+        self.kind = kind
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.prefilter = prefilter
+        self.size = len(features)
+
+        start = time.perf_counter()
+        vectors, self.vector_of_row, counts = np.unique(
+            l2_normalized(features), axis=0, return_inverse=True, return_counts=True
+        )
+        self.vector_of_row = self.vector_of_row.reshape(-1)
+        # CSR groups: rows_by_vector[group_offsets[v]:group_offsets[v + 1]] are the rows of vector v
+        self.rows_by_vector = np.argsort(self.vector_of_row, kind="stable")
+        self.group_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.n_vectors, self.dim = vectors.shape
+
+        if kind == "flat":
+            self.index = faiss.IndexFlatIP(self.dim)
+        elif kind == "ivf":
+            nlist = nlist or max(1, int(4 * math.sqrt(self.n_vectors)))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            self.index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(vectors)
+        elif kind == "hnsw":
+            self.index = faiss.IndexHNSWFlat(self.dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            raise ValueError(f"Unknown ANN index kind: {kind}")
+        self.index.add(vectors)
+        self.build_seconds = time.perf_counter() - start
+
+    def _params(self, k, selector=None):
+        if self.kind == "ivf":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        if self.kind == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=max(self.ef_search, k))
+        return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+    def _search(self, query, k, selector=None):
+        k = min(k, self.n_vectors)
+        _, ids = self.index.search(query, k, params=self._params(k, selector))
+        ids = ids[0]
+        return ids[ids >= 0]
+
+    def _expand(self, vector_ids, k, row_mask=None):
+        """Rows of the ranked vectors (catalog order within a vector), first k that pass row_mask."""
+        found, total = [], 0
+        for v in vector_ids.tolist():
+            group = self.rows_by_vector[self.group_offsets[v]:self.group_offsets[v + 1]]
+            if row_mask is not None:
+                group = group[row_mask[group]]
+            found.append(group)
+            total += len(group)
+            if total >= k:
+                break
+        rows = np.concatenate(found)[:k] if found else np.empty(0, dtype=np.int64)
+        return np.sort(rows)
+
+    def query_vector(self, user_features, weights=None):
+        """The (w^2 * u) search vector for one ReLU-normalized user vector."""
+        query = np.asarray(user_features, dtype=np.float64).reshape(1, -1)
+        if weights is not None:
+            query = query * np.square(np.asarray(weights, dtype=np.float64)).reshape(1, -1)
+        return l2_normalized(query)
+
+    def search(self, user_features, k, weights=None, rows=None):
+        """
+        Catalog row positions of (about) the k best candidates among `rows` (all rows if None),
+        in catalog order.
+        """
+        query = self.query_vector(user_features, weights)
+        if rows is None:
+            return self._expand(self._search(query, k), k)
+
+        rows = np.asarray(rows)
+        if len(rows) <= k:
+            return rows
+        row_mask = np.zeros(self.size, dtype=bool)
+        row_mask[rows] = True
+        vector_mask = np.zeros(self.n_vectors, dtype=bool)
+        vector_mask[self.vector_of_row[rows]] = True
+
+        if self.prefilter == "selector":
+            bitmap = np.packbits(vector_mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(self.n_vectors, faiss.swig_ptr(bitmap))
+            return self._expand(self._search(query, k, selector), k, row_mask)
+
+        # Over-fetch in proportion to the filter's selectivity, widening until k rows survive
+        fetch = int(k * self.n_vectors / vector_mask.sum()) * 2
+        while True:
+            ids = self._search(query, fetch)
+            ids = ids[vector_mask[ids]]
+            found = self._expand(ids, k, row_mask)
+            if len(found) >= k or fetch >= self.n_vectors:
+                return found
+            fetch *= 2
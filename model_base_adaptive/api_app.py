@@ -1,7 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from main import run_recommendation_pipeline
+from typing import List, Dict, Any, Literal, Optional, Union
+from main import run_recommendation_pipeline, run_recommendation_pipeline_batch, run_meal_plan, PIPELINE_FIELDS
+from pipeline_executor import PipelineExecutor, PoolSaturated, PipelineTimeout
+from response_cache import create_response_cache
+from hot_reload import SourceWatcher, source_version, prepare_reload, reload_engines
+from feedback_learner import feedback_store, feedback_learner, snapshot_periodically
+from recommender_engine import NutritionRecommender
+from logger import log_feedback
+from config import (
+    METRICS_ENABLED, PROFILING_ENABLED, RELOAD_WATCH_INTERVAL_S, MEAL_PLAN_MAX_DAYS, MEAL_PLAN_MAX_MEALS,
+    FEEDBACK_SNAPSHOT_INTERVAL_S
+)
+import asyncio
+import metrics
+import time
 import uvicorn
 
 app = FastAPI(
@@ -10,16 +24,96 @@ app = FastAPI(
     version="2.0.0"
 )
 
+executor = PipelineExecutor()
+response_cache = create_response_cache()
+loaded_sources = None  # source_version() the engines were last (re)loaded from
+
+async def reload_data(force=False):
+    """Swaps the engines to the current recipe and guideline files (see PipelineExecutor.reload)."""
+    global loaded_sources
+    start = time.perf_counter()
+    sources = source_version()
+    if not force and sources == loaded_sources:
+        return {"reloaded": False, "seconds": time.perf_counter() - start}
+    with metrics.collect() as collected:
+        with metrics.stage("reload"):
+            summary = await executor.reload(prepare_reload, reload_engines)
+            # /feedback maps Recipe_ids through this process's catalog, which process pools do not swap
+            await asyncio.get_running_loop().run_in_executor(None, NutritionRecommender.reload_catalog)
+    metrics.REGISTRY.merge(collected.records)
+    loaded_sources = sources
+    # Responses computed on the previous version must not be served any more, including those
+    # of requests still running on it: their keys belong to the previous generation
+    response_cache.invalidate()
+    summary["reloaded"] = True
+    summary["seconds"] = time.perf_counter() - start
+    print(f"Reloaded engine data: {summary}")
+    return summary
+
+watcher = SourceWatcher(reload_data, RELOAD_WATCH_INTERVAL_S)
+
+# Pipeline fields each endpoint returns unless the request selects others with ?fields=a,b;
+# the pipeline only runs the stages those fields need
+DEFAULT_FIELDS = {
+    "/recommend": ["nutrient_ranges"],
+    "/recommend/batch": ["nutrient_ranges"],
+}
+
 @app.on_event("startup")
 async def startup_event():
-    """Initializer for recommendation engines to avoid cold-start latency."""
-    print("Pre-loading Recommendation Engines...")
-    from rag_engine import MedicalRAG
-    from recommender_engine import NutritionRecommender
-    MedicalRAG()
-    NutritionRecommender()
+    """Starts the pipeline worker pool; every worker preloads the engines to avoid cold-start latency."""
+    global loaded_sources
+    print(f"Starting {executor.workers} {executor.kind} pipeline worker(s)...")
+    loaded_sources = source_version()
+    await executor.start()
+    # /feedback needs the catalog in this process too; process pool workers load their own
+    await asyncio.get_running_loop().run_in_executor(None, NutritionRecommender)
+    if RELOAD_WATCH_INTERVAL_S > 0:
+        watcher.start()
+    if FEEDBACK_SNAPSHOT_INTERVAL_S > 0:
+        snapshot_periodically(FEEDBACK_SNAPSHOT_INTERVAL_S)
     print("Engines Ready.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    watcher.stop()
+    executor.shutdown()
+    store = feedback_store()
+    if store is not None:
+        store.save()
+
+def learned_for(user_id):
+    """
+    The user's learned weight mapping and its cache-key component. Looked up here because
+    only this process receives /feedback; workers get the mapping with the request.
+    """
+    store = feedback_store()
+    if store is None:
+        return {}, None
+    return store.learned(user_id), store.key(user_id)
+
+def executor_http_error(e):
+    """Maps pool backpressure to HTTP errors: saturated -> 429, timed out -> 503."""
+    if isinstance(e, PoolSaturated):
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    return HTTPException(status_code=503, detail=str(e))
+
+def wants_profile(request):
+    """Per-request sampling profiler, switched on with an "X-Profile: 1" header when profiling is enabled."""
+    return PROFILING_ENABLED and request.headers.get("X-Profile") == "1"
+
+def finish_instrumented(response, records, profile_path, start, endpoint):
+    """Merges a call's metric records into the registry and sets the Server-Timing header."""
+    if not METRICS_ENABLED:
+        return
+    metrics.REGISTRY.merge(records)
+    elapsed = time.perf_counter() - start
+    metrics.observe("foodoscope_request_seconds", elapsed, endpoint=endpoint)
+    timing = metrics.server_timing(records)
+    response.headers["Server-Timing"] = (timing + ", " if timing else "") + f"total;dur={elapsed * 1000:.2f}"
+    if profile_path:
+        response.headers["X-Profile-Path"] = profile_path
+
 # Pydantic Models for Request/Response
 class UserProfileRequest(BaseModel):
     user_id: str = Field(..., example="user_001")
@@ -33,6 +127,13 @@ class UserProfileRequest(BaseModel):
     allergies: List[str] = Field(default_factory=list, example=["Peanuts", "Shellfish"])
     medicalHistory: List[str] = Field(default_factory=list, example=["Diabetes Type 2", "Hypertension"])
     healthGoals: List[str] = Field(default_factory=list, example=["Weight Gain"])
+    regionPreference: Optional[str] = Field(None, example="Indian")
+    cuisines: List[str] = Field(default_factory=list, example=["Indian Subcontinent", "Middle Eastern"])
+    spiceLevel: Optional[int] = Field(None, ge=1, le=5, example=4)
+    sweetness: Optional[int] = Field(None, ge=1, le=5, example=2)
+    proteinLevel: Optional[int] = Field(None, ge=1, le=5, example=4)
+    carbsLevel: Optional[int] = Field(None, ge=1, le=5, example=3)
+    fatsLevel: Optional[int] = Field(None, ge=1, le=5, example=2)
 
 class RecipeMatch(BaseModel):
     Recipe_title: str
@@ -43,46 +144,243 @@ class NutrientRange(BaseModel):
     max: float
 
 class RecommendationResponse(BaseModel):
-    nutrient_ranges: Dict[str, NutrientRange]
+    user_id: Optional[str] = None
+    nutrient_ranges: Optional[Dict[str, NutrientRange]] = None
+    top_local_matches: Optional[List[RecipeMatch]] = None
+    generative_profiles: Optional[Union[List[Dict[str, float]], str]] = None
+    api_request_payload: Optional[Dict[str, Any]] = None
+
+class MealPlanRequest(UserProfileRequest):
+    mealsPerDay: Optional[int] = Field(None, ge=1, le=MEAL_PLAN_MAX_MEALS, example=3)
+    mealTimes: Dict[str, str] = Field(default_factory=dict, example={"breakfast": "08:00", "lunch": "13:00", "dinner": "19:30"})
+
+class PlannedMeal(BaseModel):
+    meal: str
+    time: Optional[str] = None
+    Recipe_id: int
+    Recipe_title: str
+    Region: Optional[str] = None
+
+class PlanDay(BaseModel):
+    day: int
+    meals: List[PlannedMeal]
+    totals: Dict[str, float]
+    deviation: float
+    threshold_excess: Dict[str, float]
+
+class MealPlanResponse(BaseModel):
+    user_id: str
+    days: List[PlanDay]
+    daily_targets: Dict[str, float]
+    solver: Dict[str, Any]
+
+class FeedbackEvent(BaseModel):
+    user_id: str = Field(..., example="user_001")
+    Recipe_id: int = Field(..., example=2631)
+    event: Literal["accept", "reject", "rating"] = Field(..., example="rating")
+    rating: Optional[float] = Field(None, ge=1, le=5, example=4)
+
+class FeedbackResponse(BaseModel):
+    user_id: str
+    Recipe_id: int
+    reward: float
+    user_events: int
+    events: int
+
+class BatchRecommendationRequest(BaseModel):
+    profiles: List[UserProfileRequest]
+
+class BatchRecommendationItem(RecommendationResponse):
+    user_id: str
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[BatchRecommendationItem]
+    profiles_per_second: float
+
+def selected_fields(fields, endpoint):
+    """Pipeline fields for a request: ?fields=a,b (any of PIPELINE_FIELDS) or the endpoint's default."""
+    if not fields:
+        return list(DEFAULT_FIELDS[endpoint])
+    names = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [name for name in names if name not in PIPELINE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"unknown field(s): {', '.join(unknown)}")
+    return names
 
 @app.get("/")
 async def root():
     return {"message": "Foodoscope Recommendation API is running. Use /recommend for results."}
 
-@app.post("/recommend", response_model=RecommendationResponse)
-async def get_recommendations(profile: UserProfileRequest):
+@app.post("/recommend", response_model=RecommendationResponse, response_model_exclude_none=True)
+async def get_recommendations(profile: UserProfileRequest, request: Request, response: Response,
+                              fields: Optional[str] = None):
     """
     Triggers the recommendation pipeline for a given user profile.
-    Calculates min/max ranges for each nutrient across generative profiles.
+    By default returns min/max ranges for each nutrient across generative profiles;
+    ?fields=top_local_matches,api_request_payload,... selects other outputs.
     """
+    start = time.perf_counter()
+    names = selected_fields(fields, "/recommend")
     try:
         # Convert Pydantic model to dict for the pipeline
         user_data = profile.dict()
-        
-        # Run the existing pipeline logic
-        results = run_recommendation_pipeline(user_data)
-        profiles = results["internal_preview"]["generative_profiles"]
-        
-        if not profiles or not isinstance(profiles, list):
-            return {"nutrient_ranges": {}}
+        learned, learned_key = learned_for(profile.user_id)
 
-        # Aggregate min/max for each nutrient
-        nutrient_keys = profiles[0].keys()
-        nutrient_ranges = {}
-        
-        for key in nutrient_keys:
-            values = [p[key] for p in profiles if key in p]
-            if values:
-                nutrient_ranges[key] = {
-                    "min": min(values),
-                    "max": max(values)
-                }
+        # Identical profiles (e.g. dashboard reloads) are answered from the response cache
+        key_fields = names + [learned_key] if learned_key else names
+        cache_key = response_cache.key(user_data, key_fields) if response_cache.enabled else None
+        if cache_key is not None:
+            with metrics.collect() as collected:
+                with metrics.stage("response_cache"):
+                    cached = response_cache.get(cache_key)
+            if cached is not None:
+                finish_instrumented(response, collected.records, None, start, "/recommend")
+                return cached
         
+        # Run the existing pipeline logic in the worker pool (keeps the event loop free)
+        body, records, background, profile_path = await executor.run(
+            metrics.run_instrumented, run_recommendation_pipeline, (user_data, names, learned), wants_profile(request)
+        )
+        metrics.REGISTRY.merge(background)
+
+        with metrics.collect() as collected:
+            with metrics.stage("serialize"):
+                if cache_key is not None:
+                    response_cache.put(cache_key, body)
+        finish_instrumented(response, records + collected.records, profile_path, start, "/recommend")
+        return body
+    except (PoolSaturated, PipelineTimeout) as e:
+        raise executor_http_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse, response_model_exclude_none=True)
+async def get_batch_recommendations(request: BatchRecommendationRequest, http_request: Request, response: Response,
+                                    fields: Optional[str] = None):
+    """
+    Runs the batched pipeline for many profiles at once (shared RAG encode and one
+    similarity matrix product) and reports throughput in profiles per second.
+    Accepts the same ?fields= selection as /recommend; every item carries its user_id.
+    """
+    names = selected_fields(fields, "/recommend/batch")
+    if "user_id" not in names:
+        names.insert(0, "user_id")
+    try:
+        start = time.perf_counter()
+        results, records, background, profile_path = await executor.run(
+            metrics.run_instrumented, run_recommendation_pipeline_batch,
+            ([profile.dict() for profile in request.profiles], names,
+             [learned_for(profile.user_id)[0] for profile in request.profiles]), wants_profile(http_request)
+        )
+        metrics.REGISTRY.merge(background)
+        elapsed = time.perf_counter() - start
+        finish_instrumented(response, records, profile_path, start, "/recommend/batch")
+
         return {
-            "nutrient_ranges": nutrient_ranges
+            "results": results,
+            "profiles_per_second": len(results) / elapsed if elapsed > 0 else 0.0
         }
+    except (PoolSaturated, PipelineTimeout) as e:
+        raise executor_http_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/plan", response_model=MealPlanResponse)
+async def get_meal_plan(profile: MealPlanRequest, request: Request, response: Response,
+                        days: int = Query(1, ge=1, le=MEAL_PLAN_MAX_DAYS)):
+    """
+    Builds a meal plan of mealsPerDay recipes per day for 1-7 days whose daily nutrient totals
+    approach the profile's targets under the medical thresholds, without repeating recipes.
+    """
+    start = time.perf_counter()
+    try:
+        user_data = profile.dict()
+        learned, learned_key = learned_for(profile.user_id)
+
+        key_fields = [f"meal_plan:{days}"] + ([learned_key] if learned_key else [])
+        cache_key = response_cache.key(user_data, key_fields) if response_cache.enabled else None
+        if cache_key is not None:
+            with metrics.collect() as collected:
+                with metrics.stage("response_cache"):
+                    cached = response_cache.get(cache_key)
+            if cached is not None:
+                finish_instrumented(response, collected.records, None, start, "/plan")
+                return cached
+
+        body, records, background, profile_path = await executor.run(
+            metrics.run_instrumented, run_meal_plan, (user_data, days, learned), wants_profile(request)
+        )
+        metrics.REGISTRY.merge(background)
+
+        with metrics.collect() as collected:
+            with metrics.stage("serialize"):
+                if cache_key is not None:
+                    response_cache.put(cache_key, body)
+        finish_instrumented(response, records + collected.records, profile_path, start, "/plan")
+        return body
+    except (PoolSaturated, PipelineTimeout) as e:
+        raise executor_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/feedback", response_model=FeedbackResponse)
+async def post_feedback(feedback: FeedbackEvent):
+    """
+    Records an accept / reject / 1-5 rating event on a recipe and updates the user's (and,
+    more slowly, everyone's) nutrient weights online; later /recommend and /plan calls rank
+    with them. Weights are snapshotted to disk periodically and at shutdown.
+    """
+    if feedback.event == "rating" and feedback.rating is None:
+        raise HTTPException(status_code=422, detail="a rating event needs a rating")
+    learner = feedback_learner(NutritionRecommender().catalog)
+    try:
+        with metrics.stage("feedback"):
+            value = learner.record(feedback.user_id, feedback.Recipe_id, feedback.event, feedback.rating)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    log_feedback(feedback.user_id, feedback.Recipe_id, feedback.event, feedback.rating)
+    store = learner.store
+    return {
+        "user_id": feedback.user_id,
+        "Recipe_id": feedback.Recipe_id,
+        "reward": value,
+        "user_events": int(store.user_events[store.users[feedback.user_id]]),
+        "events": store.events,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms, rows scanned, cache hits/misses and pool state in Prometheus text format."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="metrics are disabled")
+    stats = executor.stats()
+    metrics.REGISTRY.set_gauge("foodoscope_pool_inflight", stats["inflight"])
+    metrics.REGISTRY.set_gauge("foodoscope_pool_queue_depth", stats["queue_depth"])
+    metrics.REGISTRY.set_counter("foodoscope_pool_rejected_total", stats["rejected"])
+    metrics.REGISTRY.set_counter("foodoscope_pool_timed_out_total", stats["timed_out"])
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False):
+    """
+    Reloads combined_recipes.csv and medical_guidelines.json without a restart (a no-op when
+    neither file changed, unless force=true). In-flight requests finish on the previous data;
+    appended guidelines are added to the index incrementally.
+    """
+    try:
+        return await reload_data(force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"reload failed, still serving the previous data: {e}")
+
+@app.get("/admin/memory")
+async def admin_memory():
+    """RSS / PSS / USS of the API process, each pipeline worker and the shared embedding process (Linux)."""
+    return executor.memory()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit ratio and size."""
+    return response_cache.stats()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
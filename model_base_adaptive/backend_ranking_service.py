@@ -1,91 +1,177 @@
+import heapq
+import os
+import time
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
+from penalty_engine import compute_penalties, with_diet_avoidance
+
+# Rows per chunk when streaming candidates from a CSV/Parquet file
+STREAM_CHUNK_ROWS = 100_000
+
+
+def iter_candidate_chunks(source, columns=None, chunk_size=STREAM_CHUNK_ROWS):
+    """
+    Yields candidate DataFrames from a CSV/Parquet path (read chunk by chunk), or passes
+    through an iterable of DataFrames / 2-D arrays (array columns follow `columns`).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Streaming Parquet candidates requires pyarrow (pip install pyarrow)")
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, chunksize=chunk_size)
+        return
+
+    for chunk in source:
+        yield chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(np.asarray(chunk), columns=columns)
+
+
+def scaling_from_frame(frame, nutrients):
+    """
+    StandardScaler-equivalent statistics (population std, zero std -> 1, NaN values ignored)
+    of a reference recipe set, in the payload's {"mean": {...}, "std": {...}} format.
+    """
+    values = np.asarray(frame[nutrients], dtype=np.float64)
+    stds = np.nanstd(values, axis=0)
+    stds[stds == 0] = 1.0
+    return {
+        "mean": dict(zip(nutrients, np.nanmean(values, axis=0).tolist())),
+        "std": dict(zip(nutrients, stds.tolist())),
+    }
+
 
 class BackendRanker:
-    def __init__(self, api_payload):
+    def __init__(self, api_payload, scaling=None):
         """
         Initializes the ranker with the API request payload.
+
+        Scaling statistics come from `scaling`, else from the payload's "scaling" entry
+        (sent by NutritionRecommender.generate_search_query). With neither, each batch is
+        normalized by its own distribution (legacy behaviour; scores then depend on the batch).
+        Everything is precomputed here and never mutated, so one instance can be shared
+        across threads.
         """
         self.target_nutrients = api_payload["target_nutrients"]
         self.weights = api_payload["weights"]
-        self.constraints = api_payload["constraints"]
+        self.constraints = api_payload["constraints"] or {}
         self.dietary_preference = api_payload.get("dietary_preference", "").lower()
         self.nutrients = list(self.target_nutrients.keys())
-        
+
         # Prepare target vector and weight vector
-        self.target_vec = np.array([self.target_nutrients[n] for n in self.nutrients]).reshape(1, -1)
-        self.weight_vec = np.array([self.weights[n] for n in self.nutrients]).reshape(1, -1)
-        
-        # Dictionary of non-compliant ingredients based on diet
-        self.diet_avoidance = {
-            "vegan": ["chicken", "beef", "pork", "fish", "egg", "dairy", "milk", "cheese", "honey", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "vegetarian": ["chicken", "beef", "pork", "fish", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "pescetarian": ["chicken", "beef", "pork", "meat", "lamb", "bacon", "steak"]
-        }
+        self.target_vec = np.array([self.target_nutrients[n] for n in self.nutrients], dtype=np.float64)
+        self.weight_vec = np.array([self.weights[n] for n in self.nutrients], dtype=np.float64)
+
+        # Medical constraints, with the diet's non-compliant ingredients merged in
+        self.r_thresholds = dict(self.constraints.get("nutrient_thresholds", {}) or {})
+        self.avoid_ingredients = tuple(with_diet_avoidance(
+            self.constraints.get("avoid_ingredients", []), self.dietary_preference
+        ))
+
+        scaling = scaling or api_payload.get("scaling")
+        if scaling:
+            self.means = np.array([scaling["mean"][n] for n in self.nutrients], dtype=np.float64)
+            self.stds = np.array([scaling["std"][n] for n in self.nutrients], dtype=np.float64)
+            self.target_weighted = self._weighted(self.target_vec, self.means, self.stds)
+        else:
+            self.means = self.stds = self.target_weighted = None
 
-        # Initialize scaler for normalization within the receiver's context
-        self.scaler = StandardScaler()
+    def _weighted(self, values, means, stds):
+        """Standardize, apply ReLU to focus on above-average features, then weight."""
+        return np.maximum(0, (values - means) / stds) * self.weight_vec
+
+    def similarities(self, candidates_df):
+        """Weighted ReLU-cosine similarity of every candidate to the target (one matrix product)."""
+        X_orig = np.asarray(candidates_df[self.nutrients], dtype=np.float64)
+        if np.isnan(X_orig).any():
+            # The legacy cosine_similarity raised here; a NaN row would otherwise just score 0
+            raise ValueError("Candidate nutrients contain NaN")
+
+        if self.means is None:
+            stats = scaling_from_frame(candidates_df, self.nutrients)
+            means = np.array(list(stats["mean"].values()))
+            stds = np.array(list(stats["std"].values()))
+            target = self._weighted(self.target_vec, means, stds)
+        else:
+            means, stds, target = self.means, self.stds, self.target_weighted
+
+        X_weighted = self._weighted(X_orig, means, stds)
+        norms = np.linalg.norm(X_weighted, axis=1) * np.linalg.norm(target)
+        sims = X_weighted @ target
+        return np.divide(sims, norms, out=np.zeros_like(sims), where=norms > 0)
 
     def rank_candidates(self, candidates_df, top_n=5):
         """
         Ranks candidate recipes based on the api_payload specifications.
+        Returns a new frame; the input frame and the ranker are left untouched.
         """
         if candidates_df.empty:
             return pd.DataFrame()
 
-        # Consolidate avoid ingredients
-        avoid_ingredients = self.constraints.get("avoid_ingredients", [])
-        if self.dietary_preference in self.diet_avoidance:
-            avoid_ingredients.extend(self.diet_avoidance[self.dietary_preference])
-            avoid_ingredients = list(set(avoid_ingredients))
-
-        # Extract only the relevant nutrients
-        X_orig = candidates_df[self.nutrients].values
-        
-        # Normalize candidates and target relative to the candidates pool
-        # For simplicity in this demo, we normalize candidates based on their own distribution
-        # Real-world apps should use consistent scaling factors
-        X_norm = self.scaler.fit_transform(X_orig)
-        target_norm = self.scaler.transform(self.target_vec)
-
-        # Apply ReLU to focus on above-average features
-        X_relu = np.maximum(0, X_norm)
-        target_relu = np.maximum(0, target_norm)
-
-        # Apply weights
-        X_weighted = X_relu * self.weight_vec
-        target_weighted = target_relu * self.weight_vec
-
-        # Calculate Cosine Similarity
-        sims = cosine_similarity(target_weighted, X_weighted)[0]
-
-        # Apply Medical Constraints (Penalties)
-        r_thresholds = self.constraints.get("nutrient_thresholds", {})
-        avoid_ingredients = self.constraints.get("avoid_ingredients", [])
-
-        scores = sims.copy()
-        
-        for i in range(len(candidates_df)):
-            row = candidates_df.iloc[i]
-            penalty = 1.0
-            
-            # 1. Ingredient Avoidance (Title based - Robust Stemming)
-            title = str(row.get("Recipe_title", "")).lower()
-            for ing in avoid_ingredients:
-                stem = ing.lower().rstrip('s')
-                if stem in title:
-                    penalty *= 0.01 # Extreme penalty
-                    break
-            
-            # 2. Nutrient Thresholds
-            for nutrient, threshold in r_thresholds.items():
-                if row.get(nutrient, 0) > threshold:
-                    penalty *= 0.5 # Substantial penalty for exceeding medical limits
-
-            scores[i] *= penalty
+        scores = self.similarities(candidates_df) * compute_penalties(
+            candidates_df, r_thresholds=self.r_thresholds, avoid_ingredients=self.avoid_ingredients,
+            threshold_penalty=0.5, avoid_penalty=0.01
+        )
 
         # Add scores and sort
-        candidates_df["interest_score"] = scores
-        return candidates_df.sort_values(by="interest_score", ascending=False).head(top_n)
+        ranked = candidates_df.assign(interest_score=scores)
+        return ranked.sort_values(by="interest_score", ascending=False).head(top_n)
+
+    def rank_candidates_stream(self, source, top_n=5, chunk_size=STREAM_CHUNK_ROWS, return_stats=False):
+        """
+        Out-of-core rank_candidates over a candidate pool that does not fit in memory.
+
+        source: CSV/Parquet path, or an iterable of DataFrame / array chunks (arrays hold
+        the payload's nutrients in order and carry no titles).
+        Every chunk is scored with the ranker's fixed scaling statistics and only its best
+        top_n rows enter a bounded heap, so peak memory is O(chunk + top_n). Ties keep the
+        earliest row. With return_stats, also returns rows, chunks, seconds and rows_per_second.
+        """
+        if self.means is None:
+            raise ValueError("Streaming needs fixed scaling statistics (payload 'scaling' or the scaling argument)")
+
+        start = time.perf_counter()
+        heap = []  # min-heap of (score, -row, record): the weakest kept candidate is heap[0]
+        rows = chunks = 0
+        columns = None
+        for chunk in iter_candidate_chunks(source, columns=self.nutrients, chunk_size=chunk_size):
+            if chunk.empty:
+                continue
+            columns = chunk.columns if columns is None else columns
+            scores = self.similarities(chunk) * compute_penalties(
+                chunk, r_thresholds=self.r_thresholds, avoid_ingredients=self.avoid_ingredients,
+                threshold_penalty=0.5, avoid_penalty=0.01
+            )
+
+            best = np.arange(len(scores))
+            if len(scores) > top_n:
+                # Every row tied with the chunk's k-th best score, so the heap can keep the earliest
+                kth = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+                best = np.flatnonzero(scores >= kth)
+            records = chunk.iloc[best].to_dict(orient="records")
+            for position, record in zip(best.tolist(), records):
+                item = (float(scores[position]), -(rows + position), record)
+                if len(heap) < top_n:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+            rows += len(chunk)
+            chunks += 1
+
+        best_first = sorted(heap, key=lambda item: item[:2], reverse=True)
+        ranked = pd.DataFrame([record for _, _, record in best_first], columns=columns)
+        ranked["interest_score"] = [score for score, _, _ in best_first]
+
+        if not return_stats:
+            return ranked
+        seconds = time.perf_counter() - start
+        return ranked, {
+            "rows": rows,
+            "chunks": chunks,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds > 0 else 0.0,
+        }
@@ -0,0 +1,72 @@
+"""
+Recall@k versus latency of the ANN shortlist in NutritionRecommender.rank, against the
+exact scorer, for each faiss index kind and search setting.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_ann [--rows 100000] [--profiles 50]
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+import recommender_engine
+from recommender_engine import NutritionRecommender
+from ann_index import RecipeAnnIndex
+from user_profile import UserProfile
+from constraint_engine import generate_constraints
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles
+
+TOP_N = 10
+SETTINGS = [
+    ("flat", {}),
+    ("ivf", {"nprobe": 4}),
+    ("ivf", {"nprobe": 16}),
+    ("ivf", {"nprobe": 64}),
+    ("hnsw", {"ef_search": 64}),
+    ("hnsw", {"ef_search": 256}),
+]
+
+
+def rank_all(recommender, requests):
+    """Top-N recipe ids per request and the mean rank() latency in ms."""
+    results, start = [], time.perf_counter()
+    for user_vector, constraints, user_data, weights in requests:
+        ranked = recommender.rank(user_vector, constraints, user_data, weights=weights, top_n=TOP_N)
+        results.append(set(ranked["Recipe_id"]) if not ranked.empty else set())
+    return results, (time.perf_counter() - start) / len(requests) * 1000
+
+
+def run_benchmark(n_rows, n_profiles):
+    warnings.filterwarnings("ignore")
+    NutritionRecommender.load_catalog(synthetic_catalog(n_rows))
+    recommender = NutritionRecommender()
+    weights = recommender.get_adaptive_weights()
+
+    requests = []
+    for user_data in synthetic_profiles(n_profiles, seed=1):
+        # Diet flags would shrink most candidate sets below ANN_MIN_ROWS; keep allergies only
+        user_data["dietaryPreference"] = ""
+        user_vector = UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+        requests.append((user_vector, generate_constraints(user_data["medicalHistory"]), user_data, weights))
+
+    recommender_engine.ANN_INDEX_KIND = ""
+    exact, exact_ms = rank_all(recommender, requests)
+    print(f"{n_rows} recipes, {n_profiles} profiles, top_n={TOP_N}, shortlist={recommender_engine.ANN_SHORTLIST}")
+    print(f"{'exact':<22} | {'build s':>7} | {'ms/rank':>8} | recall@{TOP_N}")
+    print(f"{'':<22} | {'':>7} | {exact_ms:>8.2f} | 1.000")
+
+    for kind, params in SETTINGS:
+        index = RecipeAnnIndex(recommender.catalog.features, kind=kind, **params)
+        NutritionRecommender._ann_indexes[recommender.catalog] = index
+        recommender_engine.ANN_INDEX_KIND = kind
+        approx, ms = rank_all(recommender, requests)
+        recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(approx, exact)])
+        label = kind + "".join(f" {k}={v}" for k, v in params.items())
+        print(f"{label:<22} | {index.build_seconds:>7.2f} | {ms:>8.2f} | {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--profiles", type=int, default=50)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.profiles)
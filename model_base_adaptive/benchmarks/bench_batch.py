@@ -0,0 +1,39 @@
+"""
+Throughput of run_recommendation_pipeline_batch versus looping run_recommendation_pipeline,
+in profiles per second. Also checks that both paths return the same top matches.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_batch [n_profiles]
+"""
+import sys
+import time
+import warnings
+from main import run_recommendation_pipeline, run_recommendation_pipeline_batch
+from benchmarks.synthetic import synthetic_profiles
+
+
+def top_matches(result):
+    return [(m["Recipe_title"], round(m["score"], 9)) for m in result["internal_preview"]["top_local_matches"]]
+
+
+def run_benchmark(n_profiles=500):
+    warnings.filterwarnings("ignore")
+    profiles = synthetic_profiles(n_profiles)
+    run_recommendation_pipeline_batch(profiles[:2])  # load engines outside the timed section
+
+    start = time.perf_counter()
+    single = [run_recommendation_pipeline(dict(p)) for p in profiles]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = run_recommendation_pipeline_batch([dict(p) for p in profiles])
+    batch_time = time.perf_counter() - start
+
+    mismatches = sum(top_matches(a) != top_matches(b) for a, b in zip(single, batch))
+    print(f"profiles: {n_profiles}")
+    print(f"single : {n_profiles / single_time:>10.1f} profiles/s")
+    print(f"batch  : {n_profiles / batch_time:>10.1f} profiles/s  ({single_time / batch_time:.1f}x)")
+    print(f"top-match mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,95 @@
+"""
+Latency under concurrent load against a live uvicorn server started with a given pool size.
+Reports p50/p99 of /recommend, p99 of / (event-loop responsiveness) and the status mix
+(429 = pool saturated, 503 = timed out).
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_concurrency --workers 4 --concurrency 16 --requests 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.synthetic import synthetic_profiles
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, (time.perf_counter() - start) * 1000
+
+
+def wait_until_ready(base_url, deadline_s=300):
+    deadline = time.time() + deadline_s
+    while time.time() < deadline:
+        try:
+            if request(base_url + "/")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def run_benchmark(workers, concurrency, n_requests, kind, port):
+    env = dict(os.environ, FOODOSCOPE_POOL_WORKERS=str(workers), FOODOSCOPE_POOL_KIND=kind)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_app:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+        profiles = synthetic_profiles(n_requests)
+
+        with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+            start = time.perf_counter()
+            recommend = [pool.submit(request, base_url + "/recommend", p) for p in profiles]
+            pings = []
+            while not all(f.done() for f in recommend):
+                pings.append(request(base_url + "/")[1])
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - start
+
+        results = [f.result() for f in recommend]
+        ok = [ms for status, ms in results if status == 200]
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+
+        print(f"pool: {workers} {kind} worker(s), client concurrency {concurrency}, {n_requests} requests")
+        print(f"/recommend  p50 {percentile(ok, 50):8.1f} ms   p99 {percentile(ok, 99):8.1f} ms   "
+              f"throughput {len(ok) / elapsed:.1f} req/s")
+        print(f"/           p50 {percentile(pings, 50):8.1f} ms   p99 {percentile(pings, 99):8.1f} ms")
+        print(f"status mix  {statuses}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--kind", default="process", choices=["process", "thread", "inline"])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    run_benchmark(args.workers, args.concurrency, args.requests, args.kind, args.port)
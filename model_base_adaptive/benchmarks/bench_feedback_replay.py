@@ -0,0 +1,90 @@
+"""
+Replays the recommendation history (logger.iter_logs: logs/diet_logs.json plus any
+JSON-lines segments) through FeedbackLearner and reports events per second, the size of
+the weight store and the cost of a snapshot.
+
+Logged /feedback events are replayed as they are. Older records carry no explicit
+feedback, so each recommended recipe in them is replayed as a rating derived from its
+logged score (1 + 4 * score). --repeat replays the history again under new user ids
+(user_001#1, ...), to measure throughput over a larger history and a growing store.
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_feedback_replay [--repeat 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+from recommender_engine import NutritionRecommender
+from feedback_learner import WeightStore, FeedbackLearner
+from logger import iter_logs
+
+
+def logged_recommendations(record):
+    """(Recipe_id or None, Recipe_title, score) of every recipe a history record recommended."""
+    data = record.get("data") if isinstance(record.get("data"), dict) else {}
+    items = record.get("recommendations") or data.get("recommendations") \
+        or (data.get("internal_preview") or {}).get("top_local_matches") or []
+    return [(item.get("Recipe_id"), item.get("Recipe_title"), item.get("score", 0.5)) for item in items]
+
+
+def history_events(records, catalog):
+    """(user_id, recipe_id, event, rating) tuples from logged records."""
+    title_ids = {title: recipe for title, recipe in zip(catalog.titles.tolist(), catalog.recipe_ids.tolist())}
+    events = []
+    for record in records:
+        user_id = record.get("user_id", "user_001")
+        feedback = record.get("feedback")
+        if feedback:
+            events.append((user_id, feedback["Recipe_id"], feedback["event"], feedback.get("rating")))
+            continue
+        for recipe_id, title, score in logged_recommendations(record):
+            recipe_id = recipe_id if recipe_id is not None else title_ids.get(title)
+            if recipe_id is not None:
+                events.append((user_id, recipe_id, "rating", min(max(1 + 4 * float(score), 1), 5)))
+    return events
+
+
+def run_benchmark(repeat):
+    warnings.filterwarnings("ignore")
+    catalog = NutritionRecommender().catalog
+    history = history_events(iter_logs(), catalog)
+    events = [(f"{user_id}#{k}" if k else user_id, recipe_id, event, rating)
+              for k in range(repeat) for user_id, recipe_id, event, rating in history]
+    print(f"history events: {len(history)}, replayed: {len(events)} (x{repeat}), catalog rows: {len(catalog)}")
+
+    learner = FeedbackLearner(WeightStore(catalog.nutrients), catalog)
+    catalog.row_of(0)  # build the id map outside the timed section
+    start = time.perf_counter()
+    applied = learner.replay(events)
+    elapsed = time.perf_counter() - start
+
+    store = learner.store
+    store_bytes = store.user_weights[:len(store)].nbytes + store.global_weights.nbytes
+    print(f"applied {applied} events in {elapsed * 1000:.1f} ms: {applied / elapsed:,.0f} events/s "
+          f"({elapsed / max(applied, 1) * 1e6:.2f} us/event)")
+    print(f"users: {len(store)}, weight store: {store_bytes / 1024:.1f} KiB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "weights.npz")
+        start = time.perf_counter()
+        store.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = WeightStore.load(path)
+        restored = time.perf_counter() - start
+        same = all((loaded.multipliers(user) == store.multipliers(user)).all() for user in list(store.users)[:100])
+        print(f"snapshot: save {saved * 1000:.1f} ms, load {restored * 1000:.1f} ms, "
+              f"{os.path.getsize(path) / 1024:.1f} KiB, round-trip equal: {same}")
+    sample = next(iter(store.users), None)
+    if sample is not None:
+        multipliers = store.multipliers(sample)
+        print(f"{sample}: multipliers in [{multipliers.min():.3f}, {multipliers.max():.3f}]")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000, help="replays of the history under new user ids")
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
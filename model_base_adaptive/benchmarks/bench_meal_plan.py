@@ -0,0 +1,70 @@
+"""
+Meal plan latency and quality: 1-day and 7-day plans from MealPlanner against stitching
+the /recommend top-k list into days (the client-side approach it replaces). Reports the
+solver time, the end-to-end run_meal_plan time and the mean daily deviation from the
+nutrient targets (lower is better) of both.
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_meal_plan [--rows 100000] [--profiles 20]
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from recommender_engine import NutritionRecommender
+from meal_planner import MealPlanner, meal_slots
+from main import PIPELINE, run_meal_plan
+from benchmarks.offline import use_offline_embeddings
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles
+
+
+def stitched_deviation(planner, recommender, context, constraints, meals, days):
+    """Mean daily deviation of consecutive top-k recipes taken `meals` at a time."""
+    ranked = recommender.rank_context(context, constraints, top_n=meals * days)
+    ids = ranked["Recipe_id"].to_numpy() if len(ranked) else []
+    rows = pd.Index(recommender.catalog.recipe_ids).get_indexer(ids)
+    chunks = [rows[i:i + meals] for i in range(0, len(rows), meals) if len(rows[i:i + meals]) == meals]
+    return np.mean([planner.deviation(context, chunk) for chunk in chunks]) if chunks else float("nan")
+
+
+def run_benchmark(n_rows, n_profiles):
+    warnings.filterwarnings("ignore")
+    use_offline_embeddings()
+    if n_rows:
+        NutritionRecommender.load_catalog(synthetic_catalog(n_rows))
+    recommender = NutritionRecommender()
+    profiles = synthetic_profiles(n_profiles, seed=11)
+    run_meal_plan(dict(profiles[0]))  # load engines outside the timed section
+
+    print(f"catalog rows: {len(recommender.catalog)}, profiles: {n_profiles}")
+    print(f"{'days':>4} | {'solver ms p50':>13} | {'solver ms max':>13} | {'end-to-end ms p50':>17} | "
+          f"{'plan dev':>8} | {'stitched dev':>12}")
+    for days in (1, 7):
+        solver, total, plan_dev, stitched_dev = [], [], [], []
+        for user_data in profiles:
+            outputs = PIPELINE.run(["context", "constraints"], recommender=recommender, user_data=dict(user_data),
+                                   learned=None)
+            context = outputs["context"]
+            context.rows  # candidate filtering is shared with /recommend; time the solver on its own
+            planner = MealPlanner(recommender)
+            plan = planner.plan(context, days=days)
+            solver.append(plan["solver"]["elapsed_ms"])
+            plan_dev.append(np.mean([day["deviation"] for day in plan["days"]]))
+            stitched_dev.append(stitched_deviation(
+                planner, recommender, context, outputs["constraints"], len(meal_slots(user_data)), days
+            ))
+
+            start = time.perf_counter()
+            run_meal_plan(dict(user_data), days=days)
+            total.append((time.perf_counter() - start) * 1000)
+        print(f"{days:>4} | {np.median(solver):>13.2f} | {np.max(solver):>13.2f} | {np.median(total):>17.2f} | "
+              f"{np.nanmean(plan_dev):>8.3f} | {np.nanmean(stitched_dev):>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic catalog size (0: combined_recipes.csv)")
+    parser.add_argument("--profiles", type=int, default=20)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.profiles)
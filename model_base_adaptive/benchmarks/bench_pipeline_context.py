@@ -0,0 +1,78 @@
+"""
+Times the rank + generative stages with and without a shared PipelineContext
+(each stage filtering the catalog itself vs. one filter per request) and checks that
+both produce the same recommendations and the same generative candidate set.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_pipeline_context [--rows 100000]
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+from recommender_engine import NutritionRecommender
+from pipeline_context import PipelineContext
+from constraint_engine import generate_constraints
+from user_profile import UserProfile
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles
+
+PROFILES = 50
+
+
+def build_cases(recommender, n_profiles):
+    weights = recommender.get_adaptive_weights()
+    cases = []
+    for user_data in synthetic_profiles(n_profiles, seed=3):
+        cases.append((
+            user_data,
+            UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means),
+            generate_constraints(user_data["medicalHistory"]),
+            {"avoid_ingredients": ["sugar", "salt"], "nutrient_thresholds": {"Sodium, Na (mg)": 1500}},
+            weights,
+        ))
+    return cases
+
+
+def separate(recommender, user_data, user_vector, constraints, r_constraints, weights):
+    ranked = recommender.rank(user_vector, constraints, user_data, weights=weights, r_constraints=r_constraints)
+    # The generative stage used to filter the catalog again
+    rows = recommender.filter_indices(user_data, avoid_ingredients=r_constraints["avoid_ingredients"])
+    return ranked, rows
+
+
+def shared(recommender, user_data, user_vector, constraints, r_constraints, weights):
+    context = PipelineContext(recommender, user_data, r_constraints=r_constraints, user_vector=user_vector, weights=weights)
+    ranked = recommender.rank_context(context, constraints)
+    return ranked, context.rows
+
+
+def run_benchmark(n_rows, n_profiles):
+    warnings.filterwarnings("ignore")
+    NutritionRecommender.load_catalog(synthetic_catalog(n_rows))
+    recommender = NutritionRecommender()
+    cases = build_cases(recommender, n_profiles)
+
+    timings = {}
+    outputs = {}
+    for name, fn in [("separate filters", separate), ("shared context", shared)]:
+        fn(recommender, *cases[0])
+        start = time.perf_counter()
+        outputs[name] = [fn(recommender, *case) for case in cases]
+        timings[name] = (time.perf_counter() - start) * 1000 / len(cases)
+
+    same = all(
+        list(a[0]["Recipe_id"]) == list(b[0]["Recipe_id"]) and np.allclose(a[0]["score"], b[0]["score"])
+        and np.array_equal(a[1], b[1])
+        for a, b in zip(outputs["separate filters"], outputs["shared context"])
+    )
+    print(f"{n_rows} rows, {len(cases)} profiles")
+    for name, ms in timings.items():
+        print(f"{name:<17}: {ms:.2f} ms/request")
+    print(f"identical recommendations and candidate rows: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--profiles", type=int, default=PROFILES)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.profiles)
@@ -0,0 +1,72 @@
+"""
+Preference scoring: the per-row fuzzy_match list comprehension the ranker used to run
+against PreferenceEngine (an affinity table per dictionary value, mapped through codes).
+Checks that region-only profiles score exactly as before, then times full multi-preference
+profiles (region + cuisines + levels) and batch_scores over a batch of profiles.
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_preferences [--rows 1000 100000 1000000]
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+from catalog import RecipeCatalog
+from preference_engine import PreferenceEngine, fuzzy_match
+from benchmarks.synthetic import synthetic_catalog
+
+REGIONS = ["Indian", "Italian", "Middle Eastern", "Mexican", "Asian", "Nordic", ""]
+FULL_PROFILE = {
+    "regionPreference": "Indian",
+    "cuisines": ["Indian Subcontinent", "Middle Eastern", "Italian"],
+    "spiceLevel": 4, "sweetness": 2, "proteinLevel": 4, "carbsLevel": 3, "fatsLevel": 2,
+}
+
+
+def legacy_scores(catalog, pref_region, rows):
+    return np.array([fuzzy_match(pref_region, region) for region in catalog.regions[rows]])
+
+
+def best_ms(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def batch_profiles(n):
+    rng = np.random.default_rng(0)
+    return [dict(FULL_PROFILE, regionPreference=str(rng.choice(REGIONS)), spiceLevel=int(rng.integers(1, 6)))
+            for _ in range(n)]
+
+
+def run_benchmark(row_counts, batch_size):
+    warnings.filterwarnings("ignore")
+    print(f"{'rows':>9} | {'legacy ms':>9} | {'engine ms':>9} | {'speedup':>7} | {'full ms':>8} | "
+          f"{'batch ms':>9} | region-only equal")
+    for n_rows in row_counts:
+        catalog = RecipeCatalog.from_frame(synthetic_catalog(n_rows))
+        engine = PreferenceEngine(catalog)
+        rows = np.arange(len(catalog))
+        equal = all(
+            np.array_equal(legacy_scores(catalog, region, rows), engine.scores({"regionPreference": region}, rows))
+            for region in REGIONS
+        )
+        engine.scores(FULL_PROFILE, rows)  # per-catalog level columns, built once
+        legacy = best_ms(lambda: legacy_scores(catalog, "Indian", rows))
+        region = best_ms(lambda: engine.scores({"regionPreference": "Indian"}, rows))
+        full = best_ms(lambda: engine.scores(FULL_PROFILE, rows))
+        profiles = batch_profiles(batch_size)
+        batch = best_ms(lambda: engine.batch_scores(profiles), repeat=1)
+        print(f"{n_rows:>9} | {legacy:>9.2f} | {region:>9.2f} | {legacy / region:>6.0f}x | {full:>8.2f} | "
+              f"{batch:>9.2f} | {equal}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--batch", type=int, default=64, help="profiles per batch_scores call")
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.batch)
@@ -0,0 +1,91 @@
+"""
+Memory per pipeline worker: a live uvicorn server is started with the "process" pool (every
+worker spawned, loading its own catalog and embedding model) and with the "prefork" pool
+(workers forked from a parent that loaded the catalog, one shared embedding process), at
+each worker count. After a warm-up of requests that each need a query embedding, it reads
+GET /admin/memory and reports the mean worker USS (memory only that worker holds), the total
+PSS of the server's processes, and the memory one more worker adds under each pool.
+
+Without sentence-transformers/torch installed the model being shared is a stand-in, so the
+saving reported then covers the catalog and engines only; a real all-MiniLM-L6-v2 with torch
+adds a few hundred MB per "process" worker and nothing per "prefork" worker.
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_prefork_memory [--workers 1 2 4] [--requests-per-worker 16]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.bench_concurrency import request, wait_until_ready
+from benchmarks.synthetic import synthetic_profiles
+
+
+def measure(kind, workers, n_requests, port):
+    """/admin/memory of a server with `workers` workers of `kind` after `n_requests` requests."""
+    socket_path = os.path.join(tempfile.gettempdir(), f"foodoscope-bench-{port}.sock")
+    env = dict(os.environ, FOODOSCOPE_POOL_WORKERS=str(workers), FOODOSCOPE_POOL_KIND=kind,
+               FOODOSCOPE_EMBEDDING_SOCKET=socket_path, FOODOSCOPE_RESPONSE_CACHE="off")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_app:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+        profiles = synthetic_profiles(n_requests)
+        for i, profile in enumerate(profiles):
+            # A condition set no other request has: every request encodes a query, in whichever worker
+            profile["medicalHistory"] = profile["medicalHistory"] + [f"Condition {i:05d}"]
+        with ThreadPoolExecutor(max_workers=2 * workers) as pool:
+            statuses = list(pool.map(lambda p: request(base_url + "/recommend", p)[0], profiles))
+        with urllib.request.urlopen(base_url + "/admin/memory", timeout=30) as resp:
+            report = json.loads(resp.read())
+        report["ok"] = statuses.count(200)
+        if kind == "prefork":
+            from embedding_service import EmbeddingClient
+            report["embedding_stats"] = EmbeddingClient(socket_path).stats()
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_benchmark(worker_counts, per_worker, port):
+    results = {}
+    print(f"{'pool':>8} | {'workers':>7} | {'ok':>4} | {'parent USS MB':>13} | {'worker USS MB':>13} | "
+          f"{'embedder PSS MB':>15} | {'total PSS MB':>12}")
+    for kind in ("process", "prefork"):
+        for workers in worker_counts:
+            report = measure(kind, workers, per_worker * workers, port)
+            results[kind, workers] = report
+            embedder = report.get("embedding_server")
+            print(f"{kind:>8} | {workers:>7} | {report['ok']:>4} | {report['parent']['uss_mb']:>13.1f} | "
+                  f"{report.get('worker_uss_mb', float('nan')):>13.1f} | "
+                  f"{embedder['pss_mb'] if embedder else 0.0:>15.1f} | {report['total_pss_mb']:>12.1f}")
+            if "embedding_stats" in report:
+                stats = report["embedding_stats"]
+                print(f"{'':>8}   embedding server: {stats['requests']} requests in {stats['batches']} model calls")
+
+    low, high = min(worker_counts), max(worker_counts)
+    if high > low:
+        added = {
+            kind: (results[kind, high]["total_pss_mb"] - results[kind, low]["total_pss_mb"]) / (high - low)
+            for kind in ("process", "prefork")
+        }
+        print(f"memory per added worker (total PSS, {low} -> {high} workers): "
+              f"process {added['process']:.1f} MB, prefork {added['prefork']:.1f} MB, "
+              f"saved {added['process'] - added['prefork']:.1f} MB per worker")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests-per-worker", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    run_benchmark(args.workers, args.requests_per_worker, args.port)
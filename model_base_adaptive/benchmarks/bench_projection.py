@@ -0,0 +1,60 @@
+"""
+Latency of run_recommendation_pipeline per output projection: the full document (CLI),
+nutrient_ranges (/recommend) and top_local_matches (a ranking client). Prints the stages
+each projection runs and the time saved against the full document.
+
+Run from model_base_adaptive/:
+    python -m benchmarks.bench_projection [--rows 100000] [--generative fit]
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+import recommender_engine
+from recommender_engine import NutritionRecommender
+from main import run_recommendation_pipeline, PIPELINE, DOCUMENT_FIELDS
+from benchmarks.offline import use_offline_embeddings
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles
+
+PROJECTIONS = {
+    "full document (CLI)": None,
+    "nutrient_ranges (/recommend)": ["nutrient_ranges"],
+    "top_local_matches": ["top_local_matches"],
+}
+
+
+def time_projection(profiles, fields):
+    timings = []
+    for user_data in profiles:
+        start = time.perf_counter()
+        run_recommendation_pipeline(dict(user_data), fields)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings)
+
+
+def run_benchmark(n_rows, n_profiles, generative):
+    warnings.filterwarnings("ignore")
+    use_offline_embeddings()
+    recommender_engine.GENERATIVE_MODEL_MODE = generative
+    if n_rows:
+        NutritionRecommender.load_catalog(synthetic_catalog(n_rows))
+    profiles = synthetic_profiles(n_profiles, seed=5)
+    run_recommendation_pipeline(dict(profiles[0]))  # load engines outside the timed section
+
+    print(f"catalog rows: {len(NutritionRecommender().catalog)}, profiles: {n_profiles}, generative mode: {generative}")
+    print(f"{'projection':<30} | {'median ms':>9} | {'saved':>6} | stages")
+    full = None
+    for label, fields in PROJECTIONS.items():
+        ms = time_projection(profiles, fields)
+        full = ms if full is None else full
+        stages = PIPELINE.required(DOCUMENT_FIELDS if fields is None else fields)
+        print(f"{label:<30} | {ms:>9.2f} | {1 - ms / full:>6.0%} | {', '.join(stages)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=0, help="synthetic catalog size (0: combined_recipes.csv)")
+    parser.add_argument("--profiles", type=int, default=50)
+    parser.add_argument("--generative", default="skip", choices=["skip", "fit"])
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.profiles, args.generative)
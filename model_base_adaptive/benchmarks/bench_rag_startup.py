@@ -0,0 +1,43 @@
+"""
+Compares MedicalRAG cold start (encode guidelines + build FAISS index) with warm start
+(memory-mapped embeddings + persisted index) in fresh processes.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_rag_startup
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+STARTUP_SNIPPET = """
+import time
+start = time.perf_counter()
+from rag_engine import MedicalRAG
+rag = MedicalRAG()
+init = time.perf_counter() - start
+rag.retrieve(["Hypertension"])
+print(f"{init * 1000:.1f} {(time.perf_counter() - start) * 1000:.1f}")
+"""
+
+
+def run_once(cache_dir):
+    env = dict(os.environ, FOODOSCOPE_RAG_CACHE=cache_dir)
+    out = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    init_ms, first_query_ms = out.stdout.strip().splitlines()[-1].split()
+    return float(init_ms), float(first_query_ms)
+
+
+def run_benchmark(repeats=3):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold = run_once(cache_dir)
+        warm = [run_once(cache_dir) for _ in range(repeats)]
+
+    best_warm = min(warm)
+    print(f"{'start':<6} | {'MedicalRAG() ms':>16} | {'+ first retrieve ms':>20}")
+    print(f"{'cold':<6} | {cold[0]:>16.1f} | {cold[1]:>20.1f}")
+    print(f"{'warm':<6} | {best_warm[0]:>16.1f} | {best_warm[1]:>20.1f}")
+    print(f"Init speedup: {cold[0] / max(best_warm[0], 1e-6):.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,48 @@
+"""
+Shows that NutritionRecommender.rank scales with top_n rather than catalog size
+once the similarity pass is done.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_rank_topk
+"""
+import time
+import warnings
+from recommender_engine import NutritionRecommender
+from user_profile import UserProfile
+from utils import load_json
+from config import USER_PREF
+from benchmarks.synthetic import synthetic_catalog
+
+CATALOG_SIZES = [1_000, 10_000, 100_000]
+TOP_NS = [5, 50, 500]
+REPEATS = 5
+
+
+def time_rank(recommender, user_vector, user_data, weights, top_n):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        recommender.rank(user_vector, {}, user_data, weights=weights, top_n=top_n, r_constraints=None)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_benchmark():
+    warnings.filterwarnings("ignore")
+    user_data = load_json(USER_PREF)
+    user_data["dietaryPreference"] = ""
+    user_data["allergies"] = []
+
+    print(f"{'rows':>8} | " + " | ".join(f"top_n={n:<5}" for n in TOP_NS) + " | all rows (pre top-k cost)")
+    for size in CATALOG_SIZES:
+        NutritionRecommender.load_catalog(synthetic_catalog(size))
+        recommender = NutritionRecommender()
+        user_vector = UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+        weights = recommender.get_adaptive_weights()
+
+        timings = [time_rank(recommender, user_vector, user_data, weights, n) for n in TOP_NS]
+        full = time_rank(recommender, user_vector, user_data, weights, size)
+        print(f"{size:>8} | " + " | ".join(f"{t:>8.2f} ms" for t in timings) + f" | {full:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()
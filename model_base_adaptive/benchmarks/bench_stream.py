@@ -0,0 +1,60 @@
+"""
+Streams a large synthetic candidate file through BackendRanker.rank_candidates_stream
+and checks the result against in-memory rank_candidates on the same rows.
+
+Run from model_base_adaptive/:  python -m benchmarks.bench_stream [--rows 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from recommender_engine import NutritionRecommender
+from user_profile import UserProfile
+from backend_ranking_service import BackendRanker
+from utils import load_json
+from config import USER_PREF
+from benchmarks.synthetic import synthetic_catalog
+
+CHUNK_SIZES = [10_000, 100_000]
+TOP_N = 10
+
+
+def build_payload():
+    recommender = NutritionRecommender()
+    user_data = load_json(USER_PREF)
+    user_vector = UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+    return recommender.generate_search_query(
+        user_vector, recommender.get_adaptive_weights(),
+        {"avoid_ingredients": ["Peanuts"], "nutrient_thresholds": {"Sodium, Na (mg)": 1000.0}},
+        dietary_preference=user_data.get("dietaryPreference", ""),
+    )
+
+
+def run_benchmark(n_rows):
+    warnings.filterwarnings("ignore")
+    ranker = BackendRanker(build_payload())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "candidates.csv")
+        synthetic_catalog(n_rows).to_csv(path, index=False)
+        print(f"{n_rows} candidates, {os.path.getsize(path) / 2**20:.1f} MiB CSV")
+
+        start = time.perf_counter()
+        expected = ranker.rank_candidates(pd.read_csv(path), top_n=TOP_N)
+        print(f"in-memory rank_candidates: {time.perf_counter() - start:.2f} s")
+
+        for chunk_size in CHUNK_SIZES:
+            ranked, stats = ranker.rank_candidates_stream(path, top_n=TOP_N, chunk_size=chunk_size, return_stats=True)
+            same = np.allclose(ranked["interest_score"], expected["interest_score"]) and \
+                set(ranked["Recipe_id"]) == set(expected["Recipe_id"])
+            print(f"stream chunk={chunk_size:>7}: {stats['seconds']:.2f} s, "
+                  f"{stats['rows_per_second']:,.0f} rows/s, {stats['chunks']} chunks, matches in-memory: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    run_benchmark(parser.parse_args().rows)
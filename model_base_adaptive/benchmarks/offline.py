@@ -0,0 +1,61 @@
+"""
+Offline embeddings for benchmarks: when sentence-transformers or the embedding model is not
+available locally, MedicalRAG gets a deterministic hashing encoder instead of downloading.
+Timings of the RAG stages then exclude real model inference (reported as "offline" in results).
+"""
+import hashlib
+import os
+import sys
+import types
+import numpy as np
+from config import EMBEDDING_MODEL
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+class HashingEncoder:
+    """SentenceTransformer stand-in: bag of hashed tokens, L2-normalized."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, dim=EMBEDDING_DIM):
+        self.model_name = model_name
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        vectors = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in sentence.lower().split():
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                vectors[row, int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+def use_offline_embeddings(force=False):
+    """
+    Installs the embedding model MedicalRAG will use and returns True if it is the offline
+    HashingEncoder. The real model is used only if it loads from the local cache.
+    """
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        shim = types.ModuleType("sentence_transformers")
+        shim.SentenceTransformer = HashingEncoder
+        sys.modules["sentence_transformers"] = shim
+        SentenceTransformer = None
+
+    from rag_engine import MedicalRAG
+    if SentenceTransformer is not None and not force:
+        try:
+            MedicalRAG._model = SentenceTransformer(EMBEDDING_MODEL, local_files_only=True)
+            return False
+        except Exception:
+            pass
+    MedicalRAG._model = HashingEncoder()
+    return True
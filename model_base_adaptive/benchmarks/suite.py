@@ -0,0 +1,225 @@
+"""
+Stage-level benchmark suite.
+
+Times every pipeline stage separately on synthetic catalogs (same schema as
+combined_recipes.csv) and synthetic guideline sets, and writes machine-readable JSON.
+With --compare, flags stages whose median got slower than a saved baseline by more than
+--threshold and exits non-zero. Runs offline (see benchmarks/offline.py).
+
+Run from model_base_adaptive/:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --sizes 1000 10000 --compare bench.json
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+from benchmarks.offline import use_offline_embeddings
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles, synthetic_guidelines
+
+CATALOG_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+GUIDELINE_SIZES = [10, 100, 1_000]
+PROFILES = 20
+TOP_N = 5
+REGRESSION_THRESHOLD = 0.2
+REGRESSION_MIN_DELTA_MS = 0.1  # slowdowns smaller than this are timer noise
+
+
+def time_calls(fn, args_list):
+    """Calls fn once per argument tuple (after one warm-up call); returns per-call milliseconds."""
+    fn(*args_list[0])
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(stage, size, timings):
+    timings = np.asarray(timings)
+    return {
+        "stage": stage,
+        "size": size,
+        "calls": len(timings),
+        "median_ms": float(np.median(timings)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "mean_ms": float(timings.mean()),
+    }
+
+
+def recommender_stages(n_rows, profiles):
+    """Catalog-bound stages, each timed over the same profiles."""
+    from recommender_engine import NutritionRecommender
+    from backend_ranking_service import BackendRanker
+    from penalty_engine import compute_penalties
+    from constraint_engine import generate_constraints
+    from user_profile import UserProfile
+    from pipeline_context import PipelineContext
+
+    NutritionRecommender.load_catalog(synthetic_catalog(n_rows))
+    recommender = NutritionRecommender()
+    catalog = recommender.catalog
+    adaptive = recommender.get_adaptive_weights()
+
+    cases = []
+    for user_data in profiles:
+        r_constraints = {"avoid_ingredients": ["sugar", "salt"], "nutrient_thresholds": {"Sodium, Na (mg)": 1500}}
+        avoid = PipelineContext(recommender, user_data, r_constraints=r_constraints).avoid_ingredients
+        user_vector = UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+        rows = recommender.filter_indices(user_data, avoid_ingredients=list(avoid))
+        payload = recommender.generate_search_query(user_vector, adaptive, r_constraints, user_data["dietaryPreference"])
+        cases.append({
+            "user_data": user_data, "r_constraints": r_constraints, "avoid": avoid, "user_vector": user_vector,
+            "rows": rows, "constraints": generate_constraints(user_data["medicalHistory"]), "payload": payload,
+        })
+
+    stages = {
+        "filter_indices": lambda c: recommender.filter_indices(c["user_data"], avoid_ingredients=list(c["avoid"])),
+        "filter_foods": lambda c: recommender.filter_foods(c["user_data"], avoid_ingredients=list(c["avoid"])),
+        "similarity": lambda c: recommender.similarities(c["user_vector"], c["rows"], weights=adaptive),
+        "penalties": lambda c: compute_penalties(
+            catalog, constraints=c["constraints"], r_thresholds=c["r_constraints"]["nutrient_thresholds"],
+            avoid_ingredients=c["avoid"], rows=c["rows"], titles_lower=catalog.titles_lower
+        ),
+        "nutrient_ranges": lambda c: recommender.nutrient_ranges(c["rows"][:TOP_N]),
+        "rank": lambda c: recommender.rank(
+            c["user_vector"], c["constraints"], c["user_data"], weights=adaptive, top_n=TOP_N,
+            r_constraints=copy.deepcopy(c["r_constraints"])
+        ),
+        "generate_optimal_combinations": lambda c: recommender.generate_optimal_combinations(
+            c["user_data"], r_constraints=copy.deepcopy(c["r_constraints"])
+        ),
+        "generate_search_query": lambda c: recommender.generate_search_query(
+            c["user_vector"], adaptive, c["r_constraints"], c["user_data"]["dietaryPreference"]
+        ),
+    }
+    results = [summarize(name, n_rows, time_calls(stage, [(c,) for c in cases])) for name, stage in stages.items()]
+
+    # The backend receives the filtered candidates of each request as a DataFrame
+    frames = [(BackendRanker(c["payload"]), catalog.foods.iloc[c["rows"]]) for c in cases]
+    results.append(summarize("BackendRanker.rank_candidates", n_rows, time_calls(
+        lambda ranker, frame: ranker.rank_candidates(frame, top_n=TOP_N), frames
+    )))
+    return results
+
+
+def rag_stages(n_guidelines, profiles, cache_dir):
+    """
+    MedicalRAG.retrieve on a synthetic guideline set, cold (query cache cleared) and warm,
+    and the per-request priority weights of the retrieved guidelines.
+    """
+    import rag_engine
+    from rag_engine import MedicalRAG
+    from recommender_engine import NutritionRecommender
+
+    path = os.path.join(cache_dir, f"guidelines_{n_guidelines}.json")
+    with open(path, "w") as f:
+        json.dump(synthetic_guidelines(n_guidelines), f)
+    rag_engine.GUIDELINES_DATA = path
+    rag_engine.RAG_CACHE_DIR = os.path.join(cache_dir, "rag")
+    MedicalRAG._snapshot = None
+    rag = MedicalRAG()
+
+    conditions = [(p["medicalHistory"] or ["Hypertension"],) for p in profiles]
+    nutrients = NutritionRecommender().nutrients
+    retrieved = [(rag.retrieve(*c)[0], nutrients) for c in conditions]
+
+    def cold(medical_history):
+        MedicalRAG.clear_query_cache()
+        rag.retrieve(medical_history)
+
+    return [
+        summarize("MedicalRAG.retrieve (cold)", n_guidelines, time_calls(cold, conditions)),
+        summarize("MedicalRAG.retrieve (warm)", n_guidelines, time_calls(rag.retrieve, conditions)),
+        summarize("MedicalRAG.priority_weights", n_guidelines, time_calls(rag.priority_weights, retrieved)),
+    ]
+
+
+def compare(results, baseline, threshold, min_delta_ms=REGRESSION_MIN_DELTA_MS):
+    """Marks each result with its change against the baseline; returns the regressions."""
+    previous = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["stage"], result["size"]))
+        if before is None or before["median_ms"] <= 0:
+            continue
+        result["baseline_median_ms"] = before["median_ms"]
+        result["change"] = result["median_ms"] / before["median_ms"] - 1
+        result["regression"] = result["change"] > threshold and result["median_ms"] - before["median_ms"] > min_delta_ms
+        if result["regression"]:
+            regressions.append(result)
+    return regressions
+
+
+def print_table(results):
+    print(f"{'stage':<32} | {'size':>8} | {'median ms':>10} | {'p95 ms':>10} | change")
+    for r in results:
+        change = f"{r['change']:+.0%}{'  REGRESSION' if r['regression'] else ''}" if "change" in r else ""
+        print(f"{r['stage']:<32} | {r['size']:>8} | {r['median_ms']:>10.3f} | {r['p95_ms']:>10.3f} | {change}")
+
+
+def run_suite(sizes, guideline_sizes, n_profiles, offline_only=False):
+    warnings.filterwarnings("ignore")
+    offline = use_offline_embeddings(force=offline_only)
+    profiles = synthetic_profiles(n_profiles, seed=1)
+
+    results = []
+    for size in sizes:
+        print(f"catalog {size} rows...", file=sys.stderr)
+        results.extend(recommender_stages(size, profiles))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for size in guideline_sizes:
+            print(f"guidelines {size}...", file=sys.stderr)
+            results.extend(rag_stages(size, profiles, cache_dir))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "profiles": n_profiles,
+            "offline_embeddings": offline,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=CATALOG_SIZES)
+    parser.add_argument("--guidelines", type=int, nargs="+", default=GUIDELINE_SIZES)
+    parser.add_argument("--profiles", type=int, default=PROFILES)
+    parser.add_argument("--offline", action="store_true", help="always use the hashing encoder")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative median slowdown reported as a regression")
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.guidelines, args.profiles, offline_only=args.offline)
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        report["regressions"] = len(regressions)
+
+    print_table(report["results"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from config import FOOD_DATA
+
+
+def synthetic_catalog(n_rows, seed=0):
+    """
+    Builds a catalog with the schema of combined_recipes.csv by resampling the real
+    recipes and jittering their nutrient values, so distributions stay realistic.
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(FOOD_DATA)
+    df = base.iloc[rng.integers(0, len(base), n_rows)].reset_index(drop=True)
+
+    numeric = [c for c in df.select_dtypes(include=[np.number]).columns
+               if c not in ("Recipe_id", "servings", "vegan", "pescetarian", "lacto_vegetarian")]
+    df[numeric] = df[numeric] * rng.uniform(0.8, 1.2, size=(n_rows, len(numeric)))
+    df["Recipe_id"] = np.arange(1, n_rows + 1)
+    df["Recipe_title"] = df["Recipe_title"] + " #" + df["Recipe_id"].astype(str)
+    return df
+
+
+DIETS = ["vegan", "vegetarian", "pescetarian", "lacto_vegetarian", ""]
+CONDITIONS = ["Diabetes Type 2", "Hypertension", "High Cholesterol", "Celiac Disease", "Kidney Disease"]
+ALLERGIES = ["Peanuts", "Shellfish", "Egg", "Milk", "Soy", "Wheat", "Fish"]
+
+
+def synthetic_profiles(n_profiles, seed=0):
+    """User profiles with the UserProfileRequest schema and varied diets, conditions and allergies."""
+    rng = np.random.default_rng(seed)
+    profiles = []
+    for i in range(n_profiles):
+        profiles.append({
+            "user_id": f"synthetic_{i:06d}",
+            "age": int(rng.integers(18, 80)),
+            "gender": str(rng.choice(["male", "female"])),
+            "weight": float(rng.uniform(45, 120)),
+            "height": float(rng.uniform(150, 200)),
+            "activityLevel": str(rng.choice(["sedentary", "light", "moderately_active", "active"])),
+            "dietaryPreference": str(rng.choice(DIETS)),
+            "primaryGoal": str(rng.choice(["weight_loss", "weight_gain", "maintenance"])),
+            "allergies": [str(a) for a in rng.choice(ALLERGIES, size=rng.integers(0, 3), replace=False)],
+            "medicalHistory": [str(c) for c in rng.choice(CONDITIONS, size=rng.integers(0, 3), replace=False)],
+            "healthGoals": [],
+        })
+    return profiles
+
+
+GUIDELINE_PHRASES = [
+    "Limit added sugars.", "Prefer low sugar snacks.", "Limit sodium intake to below 1500 mg per day.",
+    "Choose low sodium options.", "Avoid processed foods.", "Avoid fried foods high in saturated fat.",
+    "Limit cooking oil.", "Prefer high fiber foods.", "Prefer potassium-rich vegetables.",
+    "Control total carbohydrate intake.", "Avoid salt added at the table.", "Prefer lean protein sources.",
+]
+
+
+def synthetic_guidelines(n_guidelines, seed=0):
+    """Guideline records with the medical_guidelines.json schema, built from constraint-bearing phrases."""
+    rng = np.random.default_rng(seed)
+    guidelines = []
+    for i in range(n_guidelines):
+        condition = CONDITIONS[i] if i < len(CONDITIONS) else f"Condition {i:05d}"
+        phrases = rng.choice(GUIDELINE_PHRASES, size=rng.integers(2, 5), replace=False)
+        guidelines.append({"condition": condition, "guideline": " ".join(str(p) for p in phrases)})
+    return guidelines
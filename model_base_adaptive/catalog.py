@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from penalty_engine import lower_titles
+from recipe_index import RecipeIndex, DIET_FLAGS
+
+# Non-nutritional numeric columns of combined_recipes.csv
+EXCLUDED_COLS = [
+    "Recipe_id", "servings", "Recipe_title", "Region", "Sub_region",
+    "Continent", "vegan", "pescetarian", "lacto_vegetarian"
+]
+
+CATEGORICAL_COLS = ["Region", "Sub_region", "Continent"]
+
+
+class DictColumn:
+    """Dictionary-encoded categorical column: integer codes into a small table of values (-1 = missing)."""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = list(values)
+        self._lookup = np.array(self.values + [np.nan], dtype=object)
+
+    @classmethod
+    def from_series(cls, series):
+        codes, uniques = pd.factorize(series)
+        return cls(codes.astype(np.int32), uniques.tolist())
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        return self._lookup[self.codes[rows]]
+
+    def __iter__(self):
+        return iter(self.to_numpy())
+
+    def to_numpy(self):
+        return self._lookup[self.codes]
+
+
+class RecipeCatalog:
+    """
+    Immutable, load-time view of the recipe dataset.
+    Holds the fitted scaler, the raw nutrient matrix, a contiguous float32 ReLU-normalized
+    feature matrix aligned row-for-row with it, and the filter index, so ranking only has
+    to select rows by position. Built from the CSV (`from_frame`) or from a compiled
+    binary store (`recipe_store.load_store`); `foods` is only materialized on demand.
+    """
+
+    def __init__(self, nutrients, nutrient_matrix, scaler, means, stds, recipe_ids, titles,
+                 categoricals, diet_flags, titles_lower=None, title_present=None,
+                 features=None, token_index=None, foods=None):
+        self.nutrients = nutrients
+        self.nutrient_matrix = nutrient_matrix
+        self.scaler = scaler
+        self.means = means
+        self.stds = stds
+
+        if features is None:
+            features = np.ascontiguousarray(
+                np.maximum(0, scaler.transform(np.asarray(nutrient_matrix, dtype=np.float64))), dtype=np.float32
+            )
+        self.features = features
+
+        self.recipe_ids = recipe_ids
+        self.titles = titles
+        self.titles_lower = titles_lower if titles_lower is not None else lower_titles(titles)
+        self.categoricals = categoricals
+        self.regions = categoricals["Region"]
+        self.diet_flags = diet_flags
+        self.index = RecipeIndex(
+            self.titles, self.titles_lower, title_present, self.regions, diet_flags, token_index=token_index
+        )
+        self._foods = foods
+        self._columns = {name: i for i, name in enumerate(nutrients)}
+        self._id_rows = None
+
+    @classmethod
+    def from_frame(cls, foods):
+        """Identifies nutrient columns, fills gaps and fits the scaler."""
+        foods = foods.reset_index(drop=True)
+        nutrients = [
+            col for col in foods.select_dtypes(include=[np.number]).columns
+            if col not in EXCLUDED_COLS
+        ]
+        foods[nutrients] = foods[nutrients].fillna(0)
+        scaler = StandardScaler()
+        scaler.fit(foods[nutrients])
+
+        return cls(
+            nutrients=nutrients,
+            nutrient_matrix=np.ascontiguousarray(foods[nutrients].to_numpy(dtype=np.float64)),
+            scaler=scaler,
+            means=foods[nutrients].mean().to_dict(),
+            stds=foods[nutrients].std(),
+            recipe_ids=foods["Recipe_id"].to_numpy(),
+            titles=foods["Recipe_title"].to_numpy(),
+            categoricals={col: DictColumn.from_series(foods[col]) for col in CATEGORICAL_COLS},
+            diet_flags={flag: (foods[flag] == 1).to_numpy() for flag in DIET_FLAGS if flag in foods},
+            title_present=foods["Recipe_title"].notna().to_numpy(),
+            foods=foods,
+        )
+
+    @property
+    def foods(self):
+        """Full recipes DataFrame (kept from the CSV, or rebuilt once from the binary store)."""
+        if self._foods is None:
+            columns = {"Recipe_id": self.recipe_ids, "Recipe_title": np.asarray(list(self.titles), dtype=object)}
+            for name, column in self.categoricals.items():
+                columns[name] = column.to_numpy()
+            for flag, mask in self.diet_flags.items():
+                columns[flag] = np.where(mask, 1.0, np.nan)
+            foods = pd.DataFrame(columns)
+            nutrients = pd.DataFrame(np.asarray(self.nutrient_matrix, dtype=np.float64), columns=self.nutrients)
+            self._foods = pd.concat([foods, nutrients], axis=1)
+        return self._foods
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def __contains__(self, name):
+        return name in self._columns or name == "Recipe_title"
+
+    def __getitem__(self, name):
+        """Column access by name (nutrient columns are views into the nutrient matrix)."""
+        if name == "Recipe_title":
+            return self.titles
+        return self.nutrient_matrix[:, self._columns[name]]
+
+    def row_of(self, recipe_id):
+        """Catalog position of a Recipe_id, or None (the id map is built on first use)."""
+        if self._id_rows is None:
+            self._id_rows = {recipe: i for i, recipe in enumerate(np.asarray(self.recipe_ids).tolist())}
+        try:
+            return self._id_rows.get(int(recipe_id))
+        except (TypeError, ValueError):
+            return None
+
+    def normalize(self, vectors):
+        """ReLU-normalizes raw nutrient vectors in the catalog's feature space."""
+        return np.maximum(0, self.scaler.transform(np.asarray(vectors).reshape(-1, len(self.nutrients))))
@@ -1,6 +1,95 @@
+import os
+
 DATA_PATH = "./data/"
 FOOD_DATA = DATA_PATH + "combined_recipes.csv"
 GUIDELINES_DATA = DATA_PATH + "medical_guidelines.json"
 USER_PREF = DATA_PATH + "initial_user_pref.json"
 
+# Compiled binary recipe store (python recipe_store.py); the CSV stays the fallback and source
+RECIPE_STORE_DIR = os.environ.get("FOODOSCOPE_RECIPE_STORE", "./cache/recipe_store/")
+USE_RECIPE_STORE = True
+# Nutrient matrix dtype of the store: "float64" keeps thresholds and nutrient_ranges identical to
+# the CSV path; "float32" halves the matrix but rounds values (opt-in, e.g. for very large catalogs)
+RECIPE_STORE_DTYPE = os.environ.get("FOODOSCOPE_RECIPE_STORE_DTYPE", "float64")
+
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# On-disk cache for guideline embeddings and the FAISS index (keyed by guidelines content + model)
+RAG_CACHE_DIR = os.environ.get("FOODOSCOPE_RAG_CACHE", "./cache/rag/")
+# Bounded LRU of retrieve() results keyed on the normalized condition set
+RAG_QUERY_CACHE_SIZE = 256
+
+# Generative model (generate_optimal_combinations)
+# "skip": never fit (synthetic profiles do not use the model output)
+# "fit": legacy behaviour, fit on every request
+GENERATIVE_MODEL_MODE = "skip"
+
+# Execution layer for /recommend (pipeline_executor.PipelineExecutor)
+# "process" (default), "thread", "prefork" (processes forked from a parent that has loaded the
+# catalog, sharing its pages copy-on-write, with one shared embedding process; see
+# embedding_service.py), or "inline" (run on the event loop; debugging only)
+PIPELINE_POOL_KIND = os.environ.get("FOODOSCOPE_POOL_KIND", "process")
+PIPELINE_POOL_WORKERS = int(os.environ.get("FOODOSCOPE_POOL_WORKERS", os.cpu_count() or 1))
+PIPELINE_MAX_QUEUE = int(os.environ.get("FOODOSCOPE_POOL_MAX_QUEUE", 32))  # beyond this -> 429
+PIPELINE_TIMEOUT_S = float(os.environ.get("FOODOSCOPE_POOL_TIMEOUT_S", 30))  # beyond this -> 503
+PIPELINE_START_METHOD = os.environ.get("FOODOSCOPE_POOL_START_METHOD", "spawn")  # ignored by "prefork"
+
+# Shared embedding process of the "prefork" pool (embedding_service.py)
+# Unix socket path; "" = foodoscope-embeddings-<API process pid>.sock in the temp directory
+EMBEDDING_SOCKET = os.environ.get("FOODOSCOPE_EMBEDDING_SOCKET", "")
+EMBEDDING_BATCH_MAX = 64  # texts per model.encode call
+EMBEDDING_BATCH_WAIT_MS = 2.0  # how long the first queued request waits for others to join its batch
+EMBEDDING_TIMEOUT_S = 120.0  # server startup, and each encode round trip
+
+# /recommend response cache (response_cache.py), keyed by the canonical profile + data version
+# "memory" (per process), "disk" (SQLite file shared by all workers on the host) or "off"
+RESPONSE_CACHE_BACKEND = os.environ.get("FOODOSCOPE_RESPONSE_CACHE", "memory")
+RESPONSE_CACHE_TTL_S = float(os.environ.get("FOODOSCOPE_RESPONSE_CACHE_TTL_S", 300))
+RESPONSE_CACHE_MAX_ENTRIES = 4096
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESPONSE_CACHE_PATH = os.environ.get("FOODOSCOPE_RESPONSE_CACHE_PATH", "./cache/response_cache.sqlite")
+
+# Approximate nearest-neighbour shortlist for rank() on large catalogs (ann_index.py)
+# "" (exact scoring only), "flat", "ivf" or "hnsw"
+ANN_INDEX_KIND = os.environ.get("FOODOSCOPE_ANN_INDEX", "")
+ANN_MIN_ROWS = 20000  # filtered candidate sets smaller than this are always scored exactly
+ANN_SHORTLIST = 256  # candidates fetched from the index and re-ranked exactly
+ANN_PREFILTER = "selector"  # "selector" (faiss ID selector) or "overfetch" (search wider, then filter)
+ANN_IVF_NLIST = None  # None -> 4 * sqrt(rows)
+ANN_IVF_NPROBE = 16
+ANN_HNSW_M = 32
+ANN_HNSW_EF_SEARCH = 256
+
+# Batched ranking (rank_batch): users are scored in blocks whose users x catalog float64
+# similarity matrix stays under this size
+BATCH_SIMILARITY_MAX_BYTES = 256 * 1024 * 1024
+
+# Instrumentation (metrics.py): stage latency histograms, counters, /metrics and Server-Timing
+METRICS_ENABLED = os.environ.get("FOODOSCOPE_METRICS", "1") != "0"
+# Per-request sampling profiler (send "X-Profile: 1"); folded stacks are written to PROFILE_DIR
+PROFILING_ENABLED = os.environ.get("FOODOSCOPE_PROFILING", "0") == "1"
+PROFILE_DIR = "./cache/profiles/"
+PROFILE_INTERVAL_S = 0.005
+
+# Hot reload (hot_reload.py): POST /admin/reload, or poll the data files every N seconds (0 = off)
+RELOAD_WATCH_INTERVAL_S = float(os.environ.get("FOODOSCOPE_RELOAD_WATCH_S", 0))
+
+# Preference scoring (preference_engine.py): weight of each component the profile sets
+# (regionPreference, cuisines, and the 1-5 spiceLevel / sweetness / proteinLevel / carbsLevel / fatsLevel)
+PREFERENCE_WEIGHTS = {"region": 1.0, "cuisines": 1.0, "levels": 1.0}
+
+# Meal plans (meal_planner.py, POST /plan): recipes per day from mealsPerDay, 1-7 days
+MEAL_PLAN_DEFAULT_MEALS = 3  # when the profile sets neither mealsPerDay nor mealTimes
+MEAL_PLAN_MAX_MEALS = 6
+MEAL_PLAN_MAX_DAYS = 7
+MEAL_PLAN_POOL_SIZE = 512  # filtered candidates the solver chooses from
+MEAL_PLAN_TIME_BUDGET_S = 0.25  # swap improvement stops here; every day still gets its greedy fill
+MEAL_PLAN_TOLERANCE = 0.05  # a day within this relative deviation of its target is not improved further
+MEAL_PLAN_THRESHOLD_PENALTY = 10.0  # weight of daily totals above the RAG nutrient thresholds
+
+# Online learning of ranking weights from POST /feedback (feedback_learner.py)
+FEEDBACK_LEARNING_RATE = 0.05  # per-user step of the log-weights per event
+FEEDBACK_GLOBAL_LEARNING_RATE = 0.005  # step of the weights shared by every user
+FEEDBACK_MAX_LOG_WEIGHT = 1.0  # learned multipliers stay within [1/e, e]
+FEEDBACK_SNAPSHOT_PATH = os.environ.get("FOODOSCOPE_FEEDBACK_SNAPSHOT", "./cache/feedback/weights.npz")
+FEEDBACK_SNAPSHOT_INTERVAL_S = float(os.environ.get("FOODOSCOPE_FEEDBACK_SNAPSHOT_S", 60))  # 0 = only at shutdown
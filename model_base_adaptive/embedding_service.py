@@ -0,0 +1,257 @@
+"""
+Shared embedding process for the pre-fork pool (PIPELINE_POOL_KIND = "prefork").
+
+One process loads the SentenceTransformer and serves every pipeline worker over a Unix
+socket, so the model (and torch) is in memory once instead of once per worker. Requests that
+arrive within EMBEDDING_BATCH_WAIT_MS of each other are encoded in a single model.encode
+call. Workers use EmbeddingClient, which stands in for the model's encode().
+
+Frames in both directions are a 4-byte big-endian length followed by the payload:
+    request:  JSON {"texts": [...]} or {"op": "stats"}
+    response: b"V" + rows, dim (uint32) + float32 rows x dim, b"J" + JSON, or b"E" + error text
+"""
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+from config import EMBEDDING_MODEL, EMBEDDING_BATCH_MAX, EMBEDDING_BATCH_WAIT_MS, EMBEDDING_TIMEOUT_S
+
+_LENGTH = struct.Struct(">I")
+_SHAPE = struct.Struct(">II")
+
+
+def _recv_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Next frame's payload, or None when the peer closed the connection."""
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    return _recv_exact(sock, _LENGTH.unpack(header)[0])
+
+
+def send_frame(sock, payload):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+class EmbeddingServer:
+    """
+    Accepts worker connections (one thread each) and hands their texts to a single batcher
+    thread, which encodes up to `batch_max` texts per model call, waiting at most
+    `batch_wait` seconds after the first queued request for others to join.
+    """
+
+    def __init__(self, path, model_name=EMBEDDING_MODEL, batch_max=EMBEDDING_BATCH_MAX,
+                 batch_wait=EMBEDDING_BATCH_WAIT_MS / 1000):
+        self.path = path
+        self.model_name = model_name
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait
+        self.model = None
+        self._queue = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+
+    def serve_forever(self, ready=None):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(self.model_name)
+        if os.path.exists(self.path):
+            if socket_in_use(self.path):
+                raise RuntimeError(f"another embedding server is listening on {self.path}")
+            os.unlink(self.path)  # left over from a server that did not shut down cleanly
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(128)
+        threading.Thread(target=self._batcher, name="embedding-batcher", daemon=True).start()
+        print(f"Embedding server ready on {self.path} (model {self.model_name}, pid {os.getpid()})")
+        if ready is not None:
+            ready.set()
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    payload = recv_frame(conn)
+                except OSError:
+                    return
+                if payload is None:
+                    return
+                try:
+                    reply = self._reply(json.loads(payload))
+                except Exception as e:
+                    reply = b"E" + str(e).encode("utf-8")
+                try:
+                    send_frame(conn, reply)
+                except OSError:
+                    return
+
+    def _reply(self, request):
+        if request.get("op") == "stats":
+            stats = {"pid": os.getpid(), "requests": self.requests, "batches": self.batches, "texts": self.texts}
+            return b"J" + json.dumps(stats).encode("utf-8")
+        texts = [str(text) for text in request["texts"]]
+        result = queue.Queue(maxsize=1)
+        self._queue.put((texts, result))
+        vectors = result.get()
+        if isinstance(vectors, Exception):
+            raise vectors
+        return b"V" + _SHAPE.pack(*vectors.shape) + vectors.tobytes()
+
+    def _batcher(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            deadline = time.perf_counter() + self.batch_wait
+            while count < self.batch_max:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = np.asarray(self.model.encode(texts), dtype=np.float32).reshape(len(texts), -1)
+            except Exception as e:
+                for _, result in batch:
+                    result.put(e)
+                continue
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for request_texts, result in batch:
+                result.put(np.ascontiguousarray(vectors[start:start + len(request_texts)]))
+                start += len(request_texts)
+
+
+def default_socket_path():
+    """Socket path of this process's embedding server: unique per API process, so instances never share one."""
+    return os.path.join(tempfile.gettempdir(), f"foodoscope-embeddings-{os.getpid()}.sock")
+
+
+def socket_in_use(path):
+    """Whether a server still accepts connections on `path` (False for a stale socket file)."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(1.0)
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def serve(path, model_name=EMBEDDING_MODEL, ready=None):
+    """Process entry point of the embedding server."""
+    EmbeddingServer(path, model_name).serve_forever(ready)
+
+
+def start_server(path, model_name=EMBEDDING_MODEL, timeout=EMBEDDING_TIMEOUT_S):
+    """Starts the embedding server in a fresh (spawned) process and waits until it listens."""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(target=serve, args=(path, model_name, ready), name="embedding-server", daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while not ready.wait(0.1):
+        if not process.is_alive():
+            raise RuntimeError(f"embedding server exited during startup (exit code {process.exitcode})")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError(f"embedding server did not start within {timeout}s")
+    return process
+
+
+def stop_server(process, path):
+    if process is not None and process.is_alive():
+        process.terminate()
+        process.join(5)
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+class EmbeddingClient:
+    """
+    SentenceTransformer stand-in that encodes through the embedding server. Each thread of
+    each process keeps its own connection (re-opened after a fork), so concurrent callers
+    are batched together by the server rather than serialized here.
+    """
+
+    def __init__(self, path, model_name=EMBEDDING_MODEL, timeout=EMBEDDING_TIMEOUT_S):
+        self.path = path
+        self.model_name = model_name
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.sock = None  # inherited through fork: the parent's connection is not ours
+            local.pid = os.getpid()
+        if local.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            local.sock = sock
+        return local.sock
+
+    def _call(self, request):
+        try:
+            sock = self._connection()
+            send_frame(sock, json.dumps(request).encode("utf-8"))
+            reply = recv_frame(sock)
+        except OSError:
+            self.close()
+            raise
+        if reply is None:
+            self.close()
+            raise ConnectionError("embedding server closed the connection")
+        kind, body = reply[:1], reply[1:]
+        if kind == b"E":
+            raise RuntimeError(f"embedding server: {body.decode('utf-8')}")
+        if kind == b"J":
+            return json.loads(body)
+        rows, dim = _SHAPE.unpack(body[:_SHAPE.size])
+        return np.frombuffer(body, dtype=np.float32, offset=_SHAPE.size).reshape(rows, dim).copy()
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and getattr(self._local, "pid", None) == os.getpid():
+            sock.close()
+        self._local.sock = None
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = self._call({"texts": texts})
+        return vectors[0] if single else vectors
+
+    def stats(self):
+        """Requests, model calls (batches) and texts the server has encoded."""
+        return self._call({"op": "stats"})
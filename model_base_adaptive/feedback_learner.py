@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+import time
+import weakref
+import numpy as np
+from config import (
+    FEEDBACK_LEARNING_RATE, FEEDBACK_GLOBAL_LEARNING_RATE, FEEDBACK_MAX_LOG_WEIGHT,
+    FEEDBACK_SNAPSHOT_PATH
+)
+
+# Reward of each feedback event; ratings are mapped linearly from RATING_RANGE onto [-1, 1]
+EVENT_REWARDS = {"accept": 1.0, "reject": -1.0}
+RATING_RANGE = (1, 5)
+
+
+def reward(event, rating=None):
+    """Reward in [-1, 1] of an accept / reject / rating event."""
+    if event == "rating":
+        if rating is None:
+            raise ValueError("A rating event needs a rating")
+        low, high = RATING_RANGE
+        rating = min(max(float(rating), low), high)
+        return 2.0 * (rating - low) / (high - low) - 1.0
+    if event not in EVENT_REWARDS:
+        raise ValueError(f"Unknown feedback event: {event}")
+    return EVENT_REWARDS[event]
+
+
+class WeightStore:
+    """
+    Per-nutrient weight multipliers learned from feedback, kept as log-weights: one global
+    vector plus one row per user in a float32 matrix that grows by doubling, with a dict from
+    user_id to row. Lookups and updates are O(#nutrients); a user's multipliers are
+    exp(global + user), clipped to [exp(-FEEDBACK_MAX_LOG_WEIGHT), exp(FEEDBACK_MAX_LOG_WEIGHT)].
+    """
+
+    def __init__(self, nutrients, capacity=1024):
+        self.nutrients = list(nutrients)
+        self.columns = {name: i for i, name in enumerate(self.nutrients)}
+        self.global_weights = np.zeros(len(self.nutrients), dtype=np.float32)
+        self.user_weights = np.zeros((capacity, len(self.nutrients)), dtype=np.float32)
+        self.user_events = np.zeros(capacity, dtype=np.int64)
+        self.users = {}
+        self.events = 0
+        self.saved_events = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.users)
+
+    def _row(self, user_id):
+        row = self.users.get(user_id)
+        if row is None:
+            row = self.users[user_id] = len(self.users)
+            if row == len(self.user_weights):
+                self.user_weights = np.concatenate([self.user_weights, np.zeros_like(self.user_weights)])
+                self.user_events = np.concatenate([self.user_events, np.zeros_like(self.user_events)])
+        return row
+
+    def update(self, user_id, direction, reward, learning_rate=FEEDBACK_LEARNING_RATE,
+               global_learning_rate=FEEDBACK_GLOBAL_LEARNING_RATE):
+        """One step along `direction` (per nutrient, store order) for the user and, smaller, for everyone."""
+        limit = FEEDBACK_MAX_LOG_WEIGHT
+        with self.lock:
+            row = self._row(user_id)
+            # In-place ufuncs: np.clip / np.mean wrappers cost more than the O(#nutrients) math here
+            for weights, rate in ((self.user_weights[row], learning_rate), (self.global_weights, global_learning_rate)):
+                weights += (rate * reward) * direction
+                np.minimum(weights, limit, out=weights)
+                np.maximum(weights, -limit, out=weights)
+            self.user_events[row] += 1
+            self.events += 1
+
+    def multipliers(self, user_id):
+        """Learned multiplier per nutrient (store order) for a user; unknown users get the global ones."""
+        row = self.users.get(user_id)
+        log_weights = self.global_weights if row is None else self.global_weights + self.user_weights[row]
+        limit = FEEDBACK_MAX_LOG_WEIGHT
+        return np.exp(np.clip(log_weights.astype(np.float64), -limit, limit))
+
+    def learned(self, user_id):
+        """{nutrient: multiplier} for a user, or {} while nothing has been learned (picklable for worker processes)."""
+        if self.events == 0:
+            return {}
+        return dict(zip(self.nutrients, self.multipliers(user_id).tolist()))
+
+    def key(self, user_id):
+        """Short digest of a user's multipliers (to 3 decimals), or None while nothing has been learned."""
+        if self.events == 0:
+            return None
+        digest = hashlib.sha256(np.round(self.multipliers(user_id), 3).tobytes()).hexdigest()[:16]
+        return f"learned:{digest}"
+
+    def save(self, path=FEEDBACK_SNAPSHOT_PATH):
+        """Writes a snapshot (.npz, replaced atomically) if there were events since the last one."""
+        with self.lock:
+            if self.events == self.saved_events:
+                return False
+            count = len(self.users)
+            arrays = {
+                "nutrients": np.array(self.nutrients),
+                "user_ids": np.array(list(self.users), dtype=object).astype(str),
+                "user_weights": self.user_weights[:count].copy(),
+                "user_events": self.user_events[:count].copy(),
+                "global_weights": self.global_weights.copy(),
+                "events": np.int64(self.events),
+            }
+            events = self.events
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.saved_events = events
+        return True
+
+    @classmethod
+    def load(cls, path=FEEDBACK_SNAPSHOT_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            store = cls(data["nutrients"].tolist(), capacity=max(1024, len(data["user_ids"])))
+            count = len(data["user_ids"])
+            store.users = {user_id: i for i, user_id in enumerate(data["user_ids"].tolist())}
+            store.user_weights[:count] = data["user_weights"]
+            store.user_events[:count] = data["user_events"]
+            store.global_weights[:] = data["global_weights"]
+            store.events = store.saved_events = int(data["events"])
+        return store
+
+
+def align(learned, nutrients):
+    """A learned {nutrient: multiplier} mapping as a vector over `nutrients` (None if nothing was learned)."""
+    if not learned:
+        return None
+    return np.array([learned.get(name, 1.0) for name in nutrients])
+
+
+class FeedbackLearner:
+    """
+    Online update of a WeightStore from feedback on catalog recipes. An event moves the
+    user's log-weights along the recipe's ReLU-normalized feature row, centred on its mean
+    and scaled to unit length, times the event's reward: accepting a recipe that is rich in a
+    nutrient makes agreement on that nutrient count more in the user's similarity, rejecting
+    it makes it count less. Each event is one O(#nutrients) step; there is no pass over past
+    events.
+    """
+
+    def __init__(self, store, catalog):
+        self.store = store
+        self.catalog = catalog
+        columns = [store.columns.get(name, -1) for name in catalog.nutrients]
+        self._columns = None if columns == list(range(len(store.nutrients))) else np.array(columns)
+
+    def direction(self, row):
+        features = self.catalog.features[row]
+        centred = features - features.sum() / len(features)
+        centred /= max(float(np.sqrt(centred @ centred)), 1e-12)
+        if self._columns is None:
+            return centred
+        direction = np.zeros(len(self.store.nutrients), dtype=np.float32)
+        known = self._columns >= 0
+        direction[self._columns[known]] = centred[known]
+        return direction
+
+    def record(self, user_id, recipe_id, event, rating=None):
+        """Applies one feedback event; returns its reward. Raises KeyError for a Recipe_id not in the catalog."""
+        row = self.catalog.row_of(recipe_id)
+        if row is None:
+            raise KeyError(f"Unknown Recipe_id: {recipe_id}")
+        value = reward(event, rating)
+        self.store.update(user_id, self.direction(row), value)
+        return value
+
+    def replay(self, events):
+        """Feeds (user_id, recipe_id, event, rating) tuples through record(); returns the number applied."""
+        applied = 0
+        for user_id, recipe_id, event, rating in events:
+            try:
+                self.record(user_id, recipe_id, event, rating)
+                applied += 1
+            except (KeyError, ValueError):
+                continue
+        return applied
+
+
+_store = None
+_store_lock = threading.Lock()
+_learners = weakref.WeakKeyDictionary()
+
+
+def feedback_store(nutrients=None, path=FEEDBACK_SNAPSHOT_PATH):
+    """
+    This process's WeightStore: loaded from the last snapshot on first use, or created for
+    `nutrients` when the first feedback arrives. None while there is neither.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None and os.path.exists(path):
+                _store = WeightStore.load(path)
+                print(f"Loaded learned weights for {len(_store)} user(s) ({_store.events} events)")
+            if _store is None and nutrients is not None:
+                _store = WeightStore(nutrients)
+    return _store
+
+
+def feedback_learner(catalog):
+    """The FeedbackLearner of a catalog over this process's store (rebuilt when the catalog is reloaded)."""
+    learner = _learners.get(catalog)
+    if learner is None:
+        learner = _learners[catalog] = FeedbackLearner(feedback_store(catalog.nutrients), catalog)
+    return learner
+
+
+def snapshot_periodically(interval):
+    """Background thread saving the store every `interval` seconds when it changed."""
+    def run():
+        while True:
+            time.sleep(interval)
+            store = feedback_store()
+            if store is not None:
+                try:
+                    store.save()
+                except OSError as e:
+                    print(f"Feedback snapshot failed: {e}")
+    thread = threading.Thread(target=run, name="feedback-snapshot", daemon=True)
+    thread.start()
+    return thread
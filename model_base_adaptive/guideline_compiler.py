@@ -0,0 +1,89 @@
+import numpy as np
+
+# Keyword-based extraction (in a real app, use an LLM here)
+# Ingredient triggers, checked only in guidelines that say "avoid" or "limit"
+AVOID_TRIGGERS = [
+    (("sugar",), "sugar"),
+    (("salt", "sodium"), "salt"),
+    (("fat",), "fat"),
+    (("oil",), "oil"),
+]
+# Phrase -> (nutrient, threshold)
+THRESHOLD_PHRASES = [
+    ("low sodium", ("Sodium, Na (mg)", 1500)),
+    ("low sugar", ("Sugars, total (g)", 25)),
+]
+# Weight of a nutrient mentioned by a retrieved guideline (others weigh 1.0)
+PRIORITY_BOOST = 2.0
+
+
+def compile_guideline(text):
+    """Negative constraints of one guideline text: {"avoid_ingredients": [...], "nutrient_thresholds": {...}}."""
+    text = text.lower()
+    record = {"avoid_ingredients": [], "nutrient_thresholds": {}}
+    if "avoid" in text or "limit" in text:
+        for keywords, ingredient in AVOID_TRIGGERS:
+            if any(keyword in text for keyword in keywords):
+                record["avoid_ingredients"].append(ingredient)
+    for phrase, (nutrient, threshold) in THRESHOLD_PHRASES:
+        if phrase in text:
+            record["nutrient_thresholds"][nutrient] = threshold
+    return record
+
+
+def nutrient_keywords(nutrients):
+    """(keyword, index) per nutrient: the name before any ',' or '(' (e.g. "sodium" for "Sodium, Na (mg)")."""
+    nutrient_map = {name.lower(): i for i, name in enumerate(nutrients)}
+    return [(name.split(',')[0].split('(')[0].strip(), idx) for name, idx in nutrient_map.items()]
+
+
+class CompiledGuidelines:
+    """
+    Every guideline of the corpus compiled once into its avoid list, nutrient thresholds and
+    the (sparse) set of nutrients it prioritizes, so a request only merges the records of its
+    retrieved guidelines instead of keyword-scanning their texts.
+
+    Priority sets are stored CSR-style: priority_indices[priority_offsets[g]:priority_offsets[g + 1]]
+    are the positions in `nutrients` that guideline g mentions. They are compiled per nutrient
+    list on first use (the catalog, not the guideline corpus, defines the nutrients).
+    """
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.records = [compile_guideline(text) for text in self.texts]
+        self._priority = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def constraints(self, ids):
+        """Merged constraints of the guidelines `ids`, in retrieval order (same shape as MedicalRAG.retrieve)."""
+        merged = {"avoid_ingredients": [], "nutrient_thresholds": {}}
+        for i in ids:
+            record = self.records[i]
+            merged["avoid_ingredients"].extend(record["avoid_ingredients"])
+            merged["nutrient_thresholds"].update(record["nutrient_thresholds"])
+        return merged
+
+    def priority_table(self, nutrients):
+        """(priority_offsets, priority_indices) of every guideline for this nutrient list."""
+        key = tuple(nutrients)
+        table = self._priority.get(key)
+        if table is None:
+            keywords = nutrient_keywords(nutrients)
+            indices = []
+            for text in self.texts:
+                text = text.lower()
+                indices.append(sorted(idx for keyword, idx in keywords if keyword in text))
+            offsets = np.concatenate([[0], np.cumsum([len(i) for i in indices])]).astype(np.int64)
+            flat = np.fromiter((i for group in indices for i in group), dtype=np.int64, count=offsets[-1])
+            table = self._priority[key] = (offsets, flat)
+        return table
+
+    def priority_weights(self, ids, nutrients):
+        """Medical priority per nutrient: PRIORITY_BOOST where a guideline in `ids` mentions it, else 1.0."""
+        offsets, flat = self.priority_table(nutrients)
+        weights = np.ones(len(nutrients))
+        for i in ids:
+            weights[flat[offsets[i]:offsets[i + 1]]] = PRIORITY_BOOST
+        return weights
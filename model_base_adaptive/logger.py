@@ -1,21 +1,203 @@
 from datetime import datetime
-from utils import load_json, save_json
+from utils import load_json
+import argparse
+import atexit
+import glob
+import json
 import os
+import queue
+import threading
+import time
 
+# Legacy single-file log: {user_id: [entries]} rewritten on every call
 LOG_FILE = "logs/diet_logs.json"
 
-def log_recommendations(user_id, recommendations):
-    logs = load_json(LOG_FILE)
+# Append-only JSON-lines segments, one writer (process) per segment file
+LOG_DIR = "logs/recommendations/"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+FLUSH_MAX_RECORDS = 256
+FLUSH_INTERVAL_S = 1.0
+QUEUE_MAX_RECORDS = 10000
+LEGACY_SEGMENT = "legacy.jsonl"
+
+
+class RecommendationLogWriter:
+    """
+    Background, batched writer for recommendation logs.
+
+    log() only enqueues (constant cost, never blocks; records are dropped and counted
+    if the queue is full). A daemon thread serializes records and appends them to the
+    current segment in one write per batch, flushing every FLUSH_MAX_RECORDS records or
+    FLUSH_INTERVAL_S seconds. Segments rotate at SEGMENT_MAX_BYTES. Each process writes
+    its own segments, so concurrent workers never contend for or clobber a file.
+    A batch that cannot be written (disk full, permissions, removed directory) is counted in
+    `failed` and reported; the thread keeps running and the next batch starts a new segment.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 flush_max_records=FLUSH_MAX_RECORDS, flush_interval_s=FLUSH_INTERVAL_S,
+                 queue_max_records=QUEUE_MAX_RECORDS):
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.flush_max_records = flush_max_records
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue(maxsize=queue_max_records)
+        self._thread = None
+        self._pid = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self):
+        # Restart the thread after a fork (threads do not survive into worker processes) or if it died
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._pid not in (None, os.getpid()):
+                # Forked: records still queued belong to the parent, which writes them itself
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._segment = None
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _new_segment(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        self._segment = os.path.join(self.log_dir, f"{stamp}-{os.getpid()}.jsonl")
+        self._segment_bytes = 0
+
+    def _write(self, batch):
+        data = "".join(json.dumps(record, default=str) + "\n" for record in batch).encode("utf-8")
+        if self._segment is None or self._segment_bytes + len(data) > self.segment_max_bytes:
+            self._new_segment()
+        fd = os.open(self._segment, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self._segment_bytes += len(data)
+        self.written += len(batch)
+
+    def _flush(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            self._segment = None
+            print(f"Recommendation log write failed, {len(batch)} record(s) lost: {e}")
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval_s
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if record is None:
+                    break
+                batch.append(record)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.flush_max_records or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval_s
+        if batch:
+            self._flush(batch)
+
+    def close(self, timeout=5.0):
+        """Flushes everything queued so far and stops the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
 
-    if not isinstance(logs, dict):
-        logs = {}
 
-    if user_id not in logs:
-        logs[user_id] = []
+_writer = RecommendationLogWriter()
+atexit.register(_writer.close)
 
-    logs[user_id].append({
+
+def log_recommendations(user_id, recommendations):
+    _writer.log({
+        "user_id": user_id,
         "timestamp": datetime.now().isoformat(),
         "data": recommendations.to_dict(orient="records") if hasattr(recommendations, 'to_dict') else recommendations
     })
 
-    save_json(LOG_FILE, logs)
+
+def log_feedback(user_id, recipe_id, event, rating=None):
+    _writer.log({
+        "user_id": user_id,
+        "timestamp": datetime.now().isoformat(),
+        "feedback": {"Recipe_id": recipe_id, "event": event, "rating": rating}
+    })
+
+
+def migrate_legacy_log(legacy_file=LOG_FILE, log_dir=LOG_DIR):
+    """
+    One-time migration of the legacy nested-dict file into a JSON-lines segment.
+    The legacy file is renamed to <name>.migrated afterwards; returns the number of entries moved.
+    """
+    if not os.path.exists(legacy_file):
+        return 0
+    logs = load_json(legacy_file)
+    if not isinstance(logs, dict):
+        logs = {}
+
+    os.makedirs(log_dir, exist_ok=True)
+    target = os.path.join(log_dir, LEGACY_SEGMENT)
+    count = 0
+    with open(target + ".tmp", "w") as f:
+        for user_id, entries in logs.items():
+            for entry in entries:
+                f.write(json.dumps({"user_id": user_id, **entry}, default=str) + "\n")
+                count += 1
+    os.replace(target + ".tmp", target)
+    os.replace(legacy_file, legacy_file + ".migrated")
+    return count
+
+
+def iter_logs(log_dir=LOG_DIR, legacy_file=LOG_FILE):
+    """Yields every logged record in write order: the legacy file (if not migrated yet), then all segments."""
+    if os.path.exists(legacy_file):
+        logs = load_json(legacy_file)
+        if isinstance(logs, dict):
+            for user_id, entries in logs.items():
+                for entry in entries:
+                    yield {"user_id": user_id, **entry}
+
+    segments = sorted(glob.glob(os.path.join(log_dir, "*.jsonl")))
+    legacy = os.path.join(log_dir, LEGACY_SEGMENT)
+    if legacy in segments:
+        segments.remove(legacy)
+        segments.insert(0, legacy)
+    for segment in segments:
+        with open(segment, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommendation log maintenance.")
+    parser.add_argument("--migrate", action="store_true", help="migrate logs/diet_logs.json into JSON-lines segments")
+    args = parser.parse_args()
+    if args.migrate:
+        print(f"Migrated {migrate_legacy_log()} entries into {LOG_DIR}")
@@ -4,42 +4,39 @@ from user_profile import UserProfile
 from rag_engine import MedicalRAG
 from constraint_engine import generate_constraints
 from recommender_engine import NutritionRecommender
+from pipeline_context import PipelineContext
+from pipeline_graph import StageGraph
+from meal_planner import MealPlanner
+from feedback_learner import feedback_store, align
 from logger import log_recommendations
+import metrics
 import numpy as np
 import json
 
-def run_recommendation_pipeline(user_data):
-    """
-    The core orchestration logic to generate recommendations and API payloads.
-    Shared between CLI and FastAPI.
-    """
-    recommender = NutritionRecommender()
-    all_nutrients = recommender.nutrients
-
-    profile = UserProfile(user_data)
-    user_vector = profile.generate_nutrient_vector(all_nutrients, nutrient_means=recommender.means)
-
-    rag = MedicalRAG()
-    retrieved_guidelines, r_constraints = rag.retrieve(user_data["medicalHistory"])
-
-    # Adaptive Weight Training: Dataset Variance * Medical Priority
+def compute_final_weights(recommender, rag, retrieved_guidelines, learned_weights=None):
+    """Adaptive Weight Training: Dataset Variance * Medical Priority (* weights learned from feedback)"""
     adaptive_weights = recommender.get_adaptive_weights()
-    priority_weights = np.ones(len(all_nutrients))
-    nutrient_map = {name.lower(): i for i, name in enumerate(all_nutrients)}
-
-    for g in retrieved_guidelines:
-        text = g["guideline"].lower()
-        for name, idx in nutrient_map.items():
-            keyword = name.split(',')[0].split('(')[0].strip()
-            if keyword in text:
-                priority_weights[idx] = 2.0
+    priority_weights = rag.priority_weights(retrieved_guidelines, recommender.nutrients)
 
     # Final combined weight vector
     final_weights = adaptive_weights * priority_weights
+    if learned_weights is not None:
+        final_weights = final_weights * learned_weights
+    return final_weights
 
-    constraints = generate_constraints(user_data["medicalHistory"])
-    
-    # Merge explicit User Profile constraints with RAG-derived ones
+def learned_weights(recommender, user_data, learned=None):
+    """
+    Per-nutrient multipliers learned from /feedback, aligned with the catalog (None until
+    there is feedback). `learned` is the {nutrient: multiplier} mapping the API process
+    looked up; without it this process's own store (its last snapshot) is used.
+    """
+    if learned is None:
+        store = feedback_store()
+        learned = store.learned(user_data.get("user_id", "user_001")) if store is not None else None
+    return align(learned, recommender.nutrients)
+
+def consolidate_constraints(user_data, r_constraints):
+    """Merge explicit User Profile constraints with RAG-derived ones."""
     consolidated_avoid = []
     if r_constraints and "avoid_ingredients" in r_constraints:
         consolidated_avoid.extend(r_constraints["avoid_ingredients"])
@@ -59,27 +56,238 @@ def run_recommendation_pipeline(user_data):
         r_constraints = {"avoid_ingredients": [], "nutrient_thresholds": {}}
     
     r_constraints["avoid_ingredients"] = list(set(consolidated_avoid))
+    return r_constraints
 
-    # Ranking with adaptive weights and consolidated constraints
-    recommendations = recommender.rank(user_vector, constraints, user_data, weights=final_weights, r_constraints=r_constraints)
+def aggregate_nutrient_ranges(profiles):
+    """Aggregate min/max for each nutrient across generative profiles."""
+    if not profiles or not isinstance(profiles, list):
+        return {}
 
-    # Generative Component: Optimal Nutrient Combinations with RAG constraints
-    optimal_profiles = recommender.generate_optimal_combinations(user_data, r_constraints=r_constraints)
-    
-    # API Payload Generation: Formalizing values for external backend
-    api_payload = recommender.generate_search_query(user_vector, final_weights, r_constraints, dietary_preference=user_data.get("dietaryPreference", ""))
+    nutrient_keys = profiles[0].keys()
+    nutrient_ranges = {}
     
+    for key in nutrient_keys:
+        values = [p[key] for p in profiles if key in p]
+        if values:
+            nutrient_ranges[key] = {
+                "min": min(values),
+                "max": max(values)
+            }
+    return nutrient_ranges
+
+def top_local_matches(recommendations):
+    return recommendations[["Recipe_title", "score"]].head(3).to_dict(orient="records") if not recommendations.empty else []
+
+# Output fields a caller can project the pipeline onto; a run only executes the stages they need
+PIPELINE_FIELDS = ["user_id", "api_request_payload", "top_local_matches", "generative_profiles", "nutrient_ranges"]
+# Fields of the full result document (build_results)
+DOCUMENT_FIELDS = ["user_id", "api_request_payload", "top_local_matches", "generative_profiles"]
+
+PIPELINE = StageGraph()
+
+@PIPELINE.stage("user_id", deps=["user_data"])
+def _user_id(user_data):
+    return user_data.get("user_id", "user_001")
+
+@PIPELINE.stage("user_vector", deps=["recommender", "user_data"], timer="profile")
+def _user_vector(recommender, user_data):
+    return UserProfile(user_data).generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+
+@PIPELINE.stage("rag")
+def _rag():
+    return MedicalRAG()
+
+@PIPELINE.stage("retrieval", deps=["rag", "user_data"], timer="rag")
+def _retrieval(rag, user_data):
+    return rag.retrieve(user_data["medicalHistory"])
+
+@PIPELINE.stage("learned_weights", deps=["recommender", "user_data", "learned"], timer="constraints")
+def _learned_weights(recommender, user_data, learned):
+    return learned_weights(recommender, user_data, learned)
+
+@PIPELINE.stage("final_weights", deps=["recommender", "rag", "retrieval", "learned_weights"], timer="constraints")
+def _final_weights(recommender, rag, retrieval, learned_weights):
+    return compute_final_weights(recommender, rag, retrieval[0], learned_weights)
+
+@PIPELINE.stage("constraints", deps=["user_data"])
+def _constraints(user_data):
+    return generate_constraints(user_data["medicalHistory"])
+
+@PIPELINE.stage("r_constraints", deps=["user_data", "retrieval"], timer="constraints")
+def _r_constraints(user_data, retrieval):
+    return consolidate_constraints(user_data, retrieval[1])
+
+# Candidate rows, avoid list and normalized vector are shared by the stages below
+@PIPELINE.stage("context", deps=["recommender", "user_data", "r_constraints", "user_vector", "final_weights"],
+                timer="constraints")
+def _context(recommender, user_data, r_constraints, user_vector, final_weights):
+    return PipelineContext(recommender, user_data, r_constraints=r_constraints, user_vector=user_vector, weights=final_weights)
+
+# Ranking with adaptive weights and consolidated constraints
+@PIPELINE.stage("recommendations", deps=["recommender", "context", "constraints"], timer="rank")
+def _recommendations(recommender, context, constraints):
+    return recommender.rank_context(context, constraints)
+
+# Generative Component: Optimal Nutrient Combinations with RAG constraints
+@PIPELINE.stage("generative_profiles", deps=["recommender", "context"], timer="generative")
+def _generative_profiles(recommender, context):
+    return recommender.optimal_combinations(context)
+
+# API Payload Generation: Formalizing values for external backend
+@PIPELINE.stage("api_request_payload", deps=["recommender", "user_data", "user_vector", "final_weights", "context"],
+                timer="search_query")
+def _api_request_payload(recommender, user_data, user_vector, final_weights, context):
+    return recommender.generate_search_query(
+        user_vector, final_weights, context.search_constraints, dietary_preference=user_data.get("dietaryPreference", "")
+    )
+
+@PIPELINE.stage("top_local_matches", deps=["recommendations"], timer="build_results")
+def _top_local_matches(recommendations):
+    return top_local_matches(recommendations)
+
+@PIPELINE.stage("nutrient_ranges", deps=["generative_profiles"], timer="build_results")
+def _nutrient_ranges(generative_profiles):
+    return aggregate_nutrient_ranges(generative_profiles)
+
+# Multi-day meal plan (POST /plan); not one of PIPELINE_FIELDS, see run_meal_plan
+@PIPELINE.stage("meal_plan", deps=["recommender", "context", "plan_days"], timer="plan")
+def _meal_plan(recommender, context, plan_days):
+    return MealPlanner(recommender).plan(context, days=plan_days)
+
+def build_results(outputs):
     # Structure output as JSON
-    results = {
+    return {
         "status": "success",
-        "user_id": user_data.get("user_id", "user_001"),
-        "api_request_payload": api_payload, 
+        "user_id": outputs["user_id"],
+        "api_request_payload": outputs["api_request_payload"], 
         "internal_preview": {
-            "top_local_matches": recommendations[["Recipe_title", "score"]].head(3).to_dict(orient="records"),
-            "generative_profiles": optimal_profiles
+            "top_local_matches": outputs["top_local_matches"],
+            "generative_profiles": outputs["generative_profiles"]
         }
     }
-    return results
+
+def run_recommendation_pipeline(user_data, fields=None, learned=None):
+    """
+    The core orchestration logic to generate recommendations and API payloads.
+    Shared between CLI and FastAPI.
+    Without `fields`, returns the full result document; with a list of PIPELINE_FIELDS,
+    returns just those fields and only runs the stages they depend on.
+    `learned` is the user's learned weight mapping (see learned_weights).
+    """
+    outputs = PIPELINE.run(DOCUMENT_FIELDS if fields is None else fields,
+                           recommender=NutritionRecommender(), user_data=user_data, learned=learned)
+    if fields is not None:
+        return outputs
+    with metrics.stage("build_results"):
+        return build_results(outputs)
+
+def run_meal_plan(user_data, days=1, learned=None):
+    """
+    Meal plan for `days` days: mealsPerDay recipes per day whose daily totals approach the
+    user's nutrient targets under the RAG thresholds. Shares the profile, RAG and filtering
+    stages with run_recommendation_pipeline.
+    """
+    outputs = PIPELINE.run(["user_id", "meal_plan"], recommender=NutritionRecommender(), user_data=user_data,
+                           plan_days=days, learned=learned)
+    return {"user_id": outputs["user_id"], **outputs["meal_plan"]}
+
+BATCH_PIPELINE = StageGraph()
+
+@BATCH_PIPELINE.stage("user_id", deps=["user_data_list"])
+def _batch_user_id(user_data_list):
+    return [_user_id(user_data) for user_data in user_data_list]
+
+@BATCH_PIPELINE.stage("user_vectors", deps=["recommender", "user_data_list"], timer="profile")
+def _batch_user_vectors(recommender, user_data_list):
+    return np.vstack([_user_vector(recommender, user_data) for user_data in user_data_list])
+
+@BATCH_PIPELINE.stage("rag")
+def _batch_rag():
+    return MedicalRAG()
+
+# Distinct condition sets are encoded in a single RAG call
+@BATCH_PIPELINE.stage("retrievals", deps=["rag", "user_data_list"], timer="rag")
+def _batch_retrievals(rag, user_data_list):
+    return rag.retrieve_batch([user_data["medicalHistory"] for user_data in user_data_list])
+
+@BATCH_PIPELINE.stage("learned_weights", deps=["recommender", "user_data_list", "learned_list"], timer="constraints")
+def _batch_learned_weights(recommender, user_data_list, learned_list):
+    learned_list = learned_list or [None] * len(user_data_list)
+    return [learned_weights(recommender, user_data, learned) for user_data, learned in zip(user_data_list, learned_list)]
+
+@BATCH_PIPELINE.stage("final_weights", deps=["recommender", "rag", "retrievals", "learned_weights"], timer="constraints")
+def _batch_final_weights(recommender, rag, retrievals, learned_weights):
+    return np.vstack([
+        compute_final_weights(recommender, rag, retrieved, learned)
+        for (retrieved, _), learned in zip(retrievals, learned_weights)
+    ])
+
+@BATCH_PIPELINE.stage("constraints_list", deps=["user_data_list"], timer="constraints")
+def _batch_constraints(user_data_list):
+    return [generate_constraints(user_data["medicalHistory"]) for user_data in user_data_list]
+
+@BATCH_PIPELINE.stage("r_constraints_list", deps=["user_data_list", "retrievals"], timer="constraints")
+def _batch_r_constraints(user_data_list, retrievals):
+    return [
+        consolidate_constraints(user_data, r_constraints) for user_data, (_, r_constraints) in zip(user_data_list, retrievals)
+    ]
+
+@BATCH_PIPELINE.stage("contexts", deps=["recommender", "user_data_list", "r_constraints_list", "user_vectors", "final_weights"],
+                      timer="constraints")
+def _batch_contexts(recommender, user_data_list, r_constraints_list, user_vectors, final_weights):
+    return [
+        _context(recommender, user_data, r_constraints_list[i], user_vectors[i], final_weights[i])
+        for i, user_data in enumerate(user_data_list)
+    ]
+
+# All users are scored against the catalog with one matrix product
+@BATCH_PIPELINE.stage("recommendations", deps=["recommender", "user_data_list", "user_vectors", "final_weights",
+                                               "constraints_list", "r_constraints_list", "contexts"], timer="rank")
+def _batch_recommendations(recommender, user_data_list, user_vectors, final_weights, constraints_list, r_constraints_list, contexts):
+    return recommender.rank_batch(
+        user_vectors, constraints_list, user_data_list, weights=final_weights, r_constraints_list=r_constraints_list,
+        contexts=contexts
+    )
+
+@BATCH_PIPELINE.stage("generative_profiles", deps=["recommender", "contexts"], timer="generative")
+def _batch_generative_profiles(recommender, contexts):
+    return [recommender.optimal_combinations(context) for context in contexts]
+
+@BATCH_PIPELINE.stage("api_request_payload", deps=["recommender", "user_data_list", "user_vectors", "final_weights", "contexts"],
+                      timer="search_query")
+def _batch_api_request_payload(recommender, user_data_list, user_vectors, final_weights, contexts):
+    return [
+        _api_request_payload(recommender, user_data, user_vectors[i], final_weights[i], contexts[i])
+        for i, user_data in enumerate(user_data_list)
+    ]
+
+@BATCH_PIPELINE.stage("top_local_matches", deps=["recommendations"], timer="build_results")
+def _batch_top_local_matches(recommendations):
+    return [top_local_matches(ranked) for ranked in recommendations]
+
+@BATCH_PIPELINE.stage("nutrient_ranges", deps=["generative_profiles"], timer="build_results")
+def _batch_nutrient_ranges(generative_profiles):
+    return [aggregate_nutrient_ranges(profiles) for profiles in generative_profiles]
+
+def run_recommendation_pipeline_batch(user_data_list, fields=None, learned_list=None):
+    """
+    Batched run_recommendation_pipeline for many profiles (e.g. nightly re-scoring).
+    Nutrient vectors are stacked into one matrix, distinct condition sets are encoded in a
+    single RAG call, and all users are scored against the catalog with one matrix product.
+    Returns results in input order, identical in shape to the single-user pipeline
+    (including the `fields` projection). `learned_list` holds each profile's `learned` mapping.
+    """
+    if not user_data_list:
+        return []
+
+    names = DOCUMENT_FIELDS if fields is None else fields
+    outputs = BATCH_PIPELINE.run(names, recommender=NutritionRecommender(), user_data_list=user_data_list,
+                                 learned_list=learned_list)
+    results = [{name: outputs[name][i] for name in names} for i in range(len(user_data_list))]
+    if fields is not None:
+        return results
+    with metrics.stage("build_results"):
+        return [build_results(result) for result in results]
 
 def main():
     user_data = load_json(USER_PREF)
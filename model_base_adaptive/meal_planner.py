@@ -0,0 +1,179 @@
+import time
+import numpy as np
+from config import (
+    MEAL_PLAN_POOL_SIZE, MEAL_PLAN_TIME_BUDGET_S, MEAL_PLAN_TOLERANCE,
+    MEAL_PLAN_THRESHOLD_PENALTY, MEAL_PLAN_DEFAULT_MEALS, MEAL_PLAN_MAX_MEALS
+)
+
+
+def meal_slots(user_data):
+    """(name, time) of each meal of the day: mealsPerDay meals, named after mealTimes when they agree."""
+    times = user_data.get("mealTimes")
+    times = sorted(times.items(), key=lambda item: str(item[1])) if isinstance(times, dict) else []
+    try:
+        count = int(user_data.get("mealsPerDay"))
+    except (TypeError, ValueError):
+        count = len(times) or MEAL_PLAN_DEFAULT_MEALS
+    count = min(max(count, 1), MEAL_PLAN_MAX_MEALS)
+    if len(times) == count:
+        return [(str(name), str(at)) for name, at in times]
+    return [(f"meal_{i + 1}", None) for i in range(count)]
+
+
+class MealPlanner:
+    """
+    Chooses the recipes of a 1-7 day meal plan so that each day's nutrient totals approach
+    the user's daily target vector (UserProfile.generate_nutrient_vector).
+
+    Nutrients are compared in a scaled space (divided by their target, multiplied by their
+    final weight), so a day's cost is ||totals - target||^2 plus a penalty on totals above
+    the RAG nutrient_thresholds, read as daily caps. Candidates are the context's filtered
+    rows narrowed to a pool: half what the ranker scores highest, half the recipes closest
+    to a per-meal share of the target. Each day is filled greedily (every slot aims at an
+    equal share of what is still missing) and then improved by single-recipe swaps, each
+    evaluated against the whole pool at once, until no swap helps, the day is within
+    MEAL_PLAN_TOLERANCE of its target, or the time budget is spent. Recipes are not repeated
+    within a plan until the pool runs out; after that the least-used recipes come first.
+    """
+
+    def __init__(self, recommender, pool_size=MEAL_PLAN_POOL_SIZE, time_budget=MEAL_PLAN_TIME_BUDGET_S,
+                 tolerance=MEAL_PLAN_TOLERANCE):
+        self.recommender = recommender
+        self.catalog = recommender.catalog
+        self.pool_size = pool_size
+        self.time_budget = time_budget
+        self.tolerance = tolerance
+
+    @staticmethod
+    def targets(context):
+        """(daily target vector, per-nutrient scale, scaled target) of a context."""
+        daily = np.asarray(context.user_vector, dtype=np.float64)
+        weights = np.ones_like(daily) if context.weights is None else np.asarray(context.weights, dtype=np.float64)
+        scale = weights / np.where(daily > 0, daily, 1.0)
+        return daily, scale, daily * scale
+
+    def deviation(self, context, rows):
+        """Relative deviation of the summed nutrients of `rows` (one day) from the daily target."""
+        _, scale, target = self.targets(context)
+        totals = self.catalog.nutrient_matrix[rows].sum(axis=0)
+        return float(np.linalg.norm(totals * scale - target) / max(np.linalg.norm(target), 1e-12))
+
+    def _pool(self, context, scale, target, meals):
+        """Candidate rows the plan is chosen from (catalog order)."""
+        rows = context.rows
+        if len(rows) <= self.pool_size:
+            return rows
+        k = self.pool_size // 2
+        ranked = (0.7 * self.recommender.similarities(context.user_vector, rows, weights=context.weights)
+                  + 0.3 * self.recommender.preferences.scores(context.user_data, rows))
+        distance = ((self.catalog.nutrient_matrix[rows] * scale - target / meals) ** 2).sum(axis=1)
+        return rows[np.union1d(np.argpartition(-ranked, k)[:k], np.argpartition(distance, k)[:k])]
+
+    @staticmethod
+    def _excess(capped_totals, share):
+        """Penalty for capped totals (1.0 = the daily cap) above `share` of the daily caps."""
+        return MEAL_PLAN_THRESHOLD_PENALTY * (np.maximum(0.0, capped_totals - share) ** 2).sum(axis=-1)
+
+    def _solve_day(self, X, capped, target, available, meals, deadline, goal):
+        """Greedy fill plus swap improvement for one day; returns (pool positions, timed_out)."""
+        mask = available.copy()
+        picks = []
+        total = np.zeros_like(target)
+        capped_total = np.zeros(capped.shape[1])
+        for slot in range(meals):
+            if not mask.any():
+                mask = available.copy()
+            share = (target - total) / (meals - slot)
+            cost = ((X - share) ** 2).sum(axis=1) + self._excess(capped_total + capped, (slot + 1) / meals)
+            cost[~mask] = np.inf
+            pick = int(np.argmin(cost))
+            picks.append(pick)
+            mask[pick] = False
+            total += X[pick]
+            capped_total += capped[pick]
+
+        cost = ((total - target) ** 2).sum() + self._excess(capped_total, 1.0)
+        improved = True
+        while improved and cost > goal:
+            if time.perf_counter() > deadline:
+                return picks, True
+            improved = False
+            for slot, current in enumerate(picks):
+                base, capped_base = total - X[current], capped_total - capped[current]
+                costs = ((base + X - target) ** 2).sum(axis=1) + self._excess(capped_base + capped, 1.0)
+                costs[~mask] = np.inf
+                best = int(np.argmin(costs))
+                if costs[best] < cost - 1e-12:
+                    mask[current], mask[best] = available[current], False
+                    picks[slot] = best
+                    total, capped_total = base + X[best], capped_base + capped[best]
+                    cost = costs[best]
+                    improved = True
+        return picks, False
+
+    def plan(self, context, days=1):
+        """Plan for `days` days from a PipelineContext (filtered rows, user vector, weights, thresholds)."""
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        slots = meal_slots(context.user_data)
+        catalog, nutrients = self.catalog, self.catalog.nutrients
+
+        daily, scale, target = self.targets(context)
+        caps = {name: float(cap) for name, cap in context.nutrient_thresholds.items() if name in catalog and cap > 0}
+        cap_columns = [nutrients.index(name) for name in caps]
+        # Day cost at which a plan counts as on target (relative deviation <= tolerance)
+        goal = (self.tolerance * np.linalg.norm(target)) ** 2
+
+        pool = self._pool(context, scale, target, len(slots))
+        raw = catalog.nutrient_matrix[pool]
+        X = raw * scale
+        capped = raw[:, cap_columns] / np.array(list(caps.values())) if caps else np.zeros((len(pool), 0))
+
+        plan_days, uses = [], np.zeros(len(pool), dtype=np.int64)
+        repeats = timed_out = False
+        for day in range(days if len(pool) else 0):
+            # Least-used recipes first: once the pool is exhausted the plan cycles through it again
+            level = uses.min()
+            while (uses <= level).sum() < min(len(slots), len(pool)):
+                level += 1
+            repeats |= bool(level > 0)
+            picks, day_timed_out = self._solve_day(X, capped, target, uses <= level, len(slots), deadline, goal)
+            timed_out |= day_timed_out
+            np.add.at(uses, picks, 1)
+            plan_days.append(self._describe_day(context, day, slots, pool[picks], caps))
+
+        return {
+            "days": plan_days,
+            "daily_targets": {name: round(float(value), 4) for name, value in zip(nutrients, daily)},
+            "solver": {
+                "candidates": int(len(context.rows)),
+                "pool": int(len(pool)),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+                "timed_out": bool(timed_out),
+                "repeats": bool(repeats),
+            },
+        }
+
+    def _describe_day(self, context, day, slots, rows, caps):
+        catalog = self.catalog
+        regions = catalog.regions[rows]
+        meals = [
+            {
+                "meal": name,
+                "time": at,
+                "Recipe_id": int(catalog.recipe_ids[row]),
+                "Recipe_title": str(catalog.titles[row]),
+                "Region": region if isinstance(region, str) else None,
+            }
+            for (name, at), row, region in zip(slots, rows, regions)
+        ]
+        totals = dict(zip(catalog.nutrients, catalog.nutrient_matrix[rows].sum(axis=0).tolist()))
+        return {
+            "day": day + 1,
+            "meals": meals,
+            "totals": {name: round(value, 4) for name, value in totals.items()},
+            "deviation": round(self.deviation(context, rows), 4),
+            "threshold_excess": {
+                name: round(totals[name] - cap, 4) for name, cap in caps.items() if totals[name] > cap
+            },
+        }
@@ -0,0 +1,253 @@
+"""
+Lightweight pipeline instrumentation.
+
+Engines call `stage(name)` / `count(name, value, **labels)`. Measurements are appended to the
+record list of the call currently being collected (`collect()`), or to a process-local pending
+list outside a call (e.g. engine init). `run_instrumented` wraps a pipeline call so its records
+travel back with the result from pool workers; the API process `merge`s them into the registry,
+renders Prometheus text for /metrics and builds the Server-Timing header.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from config import METRICS_ENABLED, PROFILE_DIR, PROFILE_INTERVAL_S
+
+# Histogram buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "foodoscope_stage_seconds": ("histogram", "Latency of pipeline stages and engine init."),
+    "foodoscope_request_seconds": ("histogram", "End-to-end latency per endpoint."),
+    "foodoscope_catalog_rows_scanned_total": ("counter", "Catalog rows scanned by the filter index."),
+    "foodoscope_candidate_rows_scored_total": ("counter", "Filtered candidate rows scored by similarity."),
+    "foodoscope_cache_requests_total": ("counter", "Cache lookups by cache and result (hit/miss)."),
+    "foodoscope_pool_inflight": ("gauge", "Pipeline calls admitted to the worker pool."),
+    "foodoscope_pool_queue_depth": ("gauge", "Admitted calls waiting for a free worker."),
+    "foodoscope_pool_rejected_total": ("counter", "Calls rejected because the pool was saturated."),
+    "foodoscope_pool_timed_out_total": ("counter", "Calls that exceeded the pipeline timeout."),
+}
+
+_local = threading.local()
+_pending = []
+_pending_lock = threading.Lock()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _record(kind, name, value, labels):
+    records = getattr(_local, "records", None)
+    if records is not None:
+        records.append((kind, name, labels, value))
+    else:
+        with _pending_lock:
+            _pending.append((kind, name, labels, value))
+
+
+class _Stage:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record("observe", "foodoscope_stage_seconds", time.perf_counter() - self.start,
+                (("stage", self.name),) + self.labels)
+        return False
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, **labels):
+    """Context manager timing one stage (a no-op when metrics are disabled)."""
+    if not METRICS_ENABLED:
+        return _NO_STAGE
+    return _Stage(name, _labels(labels))
+
+
+def count(name, value=1, **labels):
+    if METRICS_ENABLED:
+        _record("inc", name, value, _labels(labels))
+
+
+def observe(name, value, **labels):
+    if METRICS_ENABLED:
+        _record("observe", name, value, _labels(labels))
+
+
+def cache_lookup(cache, hit):
+    count("foodoscope_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def drain_pending():
+    with _pending_lock:
+        records = list(_pending)
+        _pending.clear()
+    return records
+
+
+class collect:
+    """Collects the records of the enclosed calls on this thread into `self.records`."""
+
+    def __enter__(self):
+        self._previous = getattr(_local, "records", None)
+        self.records = []
+        _local.records = self.records
+        return self
+
+    def __exit__(self, *exc):
+        _local.records = self._previous
+        return False
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every `interval` seconds from a background thread and
+    aggregates them as collapsed stacks ("a;b;c count" lines, flamegraph.pl / speedscope input).
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL_S):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def save(self, directory=PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self.thread_id}.folded")
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+        return path
+
+
+def run_instrumented(fn, args=(), profile=False):
+    """
+    Runs fn(*args) while collecting its records, optionally under the sampling profiler.
+    Returns (result, records, background_records, profile_path) so it can run in a pool worker;
+    background_records are the pending records of this process (e.g. engine init).
+    """
+    if not METRICS_ENABLED:
+        return fn(*args), [], [], None
+    profile_path = None
+    with collect() as collected:
+        if profile:
+            with SamplingProfiler() as profiler:
+                result = fn(*args)
+            profile_path = profiler.save()
+        else:
+            result = fn(*args)
+    return result, collected.records, drain_pending(), profile_path
+
+
+class Registry:
+    """Aggregated histograms, counters and gauges of the serving process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(lambda: [[0] * (len(BUCKETS) + 1), 0.0, 0])
+        self.counters = defaultdict(float)
+        self.gauges = {}
+
+    def merge(self, records):
+        with self._lock:
+            for kind, name, labels, value in records:
+                key = (name, labels)
+                if kind == "observe":
+                    buckets, _, _ = histogram = self.histograms[key]
+                    buckets[bisect.bisect_left(BUCKETS, value)] += 1
+                    histogram[1] += value
+                    histogram[2] += 1
+                elif kind == "inc":
+                    self.counters[key] += value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def set_counter(self, name, value, **labels):
+        with self._lock:
+            self.counters[(name, _labels(labels))] = value
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        self.merge(drain_pending())
+        with self._lock:
+            series = defaultdict(list)
+            for (name, labels), (buckets, total, n) in self.histograms.items():
+                cumulative = 0
+                for bound, hits in zip(list(BUCKETS) + ["+Inf"], buckets):
+                    cumulative += hits
+                    series[name].append(f"{name}_bucket{_format(labels + (('le', str(bound)),))} {cumulative}")
+                series[name].append(f"{name}_sum{_format(labels)} {total}")
+                series[name].append(f"{name}_count{_format(labels)} {n}")
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                series[name].append(f"{name}{_format(labels)} {value:g}")
+
+        lines = []
+        for name in sorted(series):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+
+def _format(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+
+def server_timing(records):
+    """Server-Timing header value: total milliseconds per stage of one request."""
+    totals = defaultdict(float)
+    for kind, name, labels, value in records:
+        if name == "foodoscope_stage_seconds":
+            totals[dict(labels)["stage"]] += value
+    return ", ".join(f"{stage.replace(' ', '_')};dur={seconds * 1000:.2f}" for stage, seconds in totals.items())
+
+
+REGISTRY = Registry()
@@ -0,0 +1,85 @@
+import re
+import numpy as np
+
+# Static constraint key -> (nutrient column, penalty factor)
+STATIC_PENALTIES = {
+    "max_sugar": ("Sugars, total (g)", 0.5),
+    "max_sodium": ("Sodium, Na (mg)", 0.3),
+}
+
+# Dictionary of non-compliant ingredients based on diet
+DIET_AVOIDANCE = {
+    "vegan": ["chicken", "beef", "pork", "fish", "egg", "dairy", "milk", "cheese", "honey", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
+    "vegetarian": ["chicken", "beef", "pork", "fish", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
+    "pescetarian": ["chicken", "beef", "pork", "meat", "lamb", "bacon", "steak"]
+}
+
+
+def with_diet_avoidance(avoid_ingredients, dietary_preference):
+    """Avoid list plus the diet's non-compliant ingredients, de-duplicated (first occurrence kept)."""
+    combined = list(avoid_ingredients or [])
+    combined.extend(DIET_AVOIDANCE.get((dietary_preference or "").lower(), []))
+    return list(dict.fromkeys(combined))
+
+
+def lower_titles(titles):
+    """Pre-lowercases recipe titles once so they can be matched repeatedly."""
+    return np.array([str(t).lower() for t in titles], dtype=object)
+
+
+def compile_avoid_matcher(avoid_ingredients):
+    """
+    Compiles the avoid list into a single multi-pattern matcher.
+    Uses the same robust stemming as the ranking loop (lowercase, strip trailing 's').
+    """
+    if not avoid_ingredients:
+        return None
+    stems = sorted({ing.lower().rstrip('s') for ing in avoid_ingredients})
+    return re.compile("|".join(re.escape(stem) for stem in stems))
+
+
+def avoid_mask(titles_lower, avoid_ingredients):
+    """Boolean mask of titles containing any avoided ingredient stem."""
+    matcher = compile_avoid_matcher(avoid_ingredients)
+    if matcher is None:
+        return np.zeros(len(titles_lower), dtype=bool)
+    search = matcher.search
+    return np.fromiter((search(t) is not None for t in titles_lower), dtype=bool, count=len(titles_lower))
+
+
+def _column(frame, name, rows):
+    if name not in frame:
+        return np.zeros(len(frame) if rows is None else len(rows))
+    values = np.asarray(frame[name])
+    return values if rows is None else values[rows]
+
+
+def compute_penalties(frame, constraints=None, r_thresholds=None, avoid_ingredients=None,
+                      rows=None, titles_lower=None, threshold_penalty=0.1, avoid_penalty=0.001):
+    """
+    Columnar penalty engine. Returns one multiplicative penalty per row.
+
+    frame: DataFrame (or RecipeCatalog) holding nutrient columns, and Recipe_title if
+    titles_lower is not given.
+    rows: optional positional row selection into frame (and titles_lower).
+    Penalties are applied in the same order as the original per-row loop
+    (static limits, RAG thresholds, ingredient avoidance) so products match bit for bit.
+    """
+    n = len(frame) if rows is None else len(rows)
+    penalties = np.ones(n)
+
+    for key, (nutrient, factor) in STATIC_PENALTIES.items():
+        if constraints and key in constraints:
+            penalties[_column(frame, nutrient, rows) > constraints[key]] *= factor
+
+    for nutrient, threshold in (r_thresholds or {}).items():
+        penalties[_column(frame, nutrient, rows) > threshold] *= threshold_penalty
+
+    if avoid_ingredients:
+        if titles_lower is None:
+            titles_lower = lower_titles(_column(frame, "Recipe_title", rows)) if "Recipe_title" in frame else np.full(n, "", dtype=object)
+        elif rows is not None:
+            titles_lower = titles_lower[rows]
+        penalties[avoid_mask(titles_lower, avoid_ingredients)] *= avoid_penalty
+
+    return penalties
@@ -0,0 +1,50 @@
+from functools import cached_property
+from penalty_engine import with_diet_avoidance
+
+
+class PipelineContext:
+    """
+    Request-scoped memo of the intermediates every pipeline stage shares.
+
+    The consolidated avoid list (RAG + allergies + diet), the filtered candidate rows and their
+    feature slice, and the normalized user vector are computed on first use and reused by
+    ranking, the generative stage and the search payload. Nothing here mutates user_data or
+    r_constraints, so a context can be built from the caller's objects directly.
+    """
+
+    def __init__(self, recommender, user_data, r_constraints=None, user_vector=None, weights=None):
+        self.recommender = recommender
+        self.user_data = user_data
+        self.r_constraints = r_constraints
+        self.user_vector = user_vector
+        self.weights = weights
+
+    @cached_property
+    def avoid_ingredients(self):
+        avoid = self.r_constraints.get("avoid_ingredients", []) if self.r_constraints else []
+        return with_diet_avoidance(avoid, self.user_data.get("dietaryPreference", ""))
+
+    @cached_property
+    def nutrient_thresholds(self):
+        return self.r_constraints.get("nutrient_thresholds", {}) if self.r_constraints else {}
+
+    @cached_property
+    def rows(self):
+        """Catalog positions that pass the diet, allergy, avoidance and region filters."""
+        return self.recommender.filter_indices(self.user_data, avoid_ingredients=self.avoid_ingredients)
+
+    @cached_property
+    def features(self):
+        """ReLU-normalized feature rows of the candidates."""
+        return self.recommender.catalog.features[self.rows]
+
+    @cached_property
+    def normalized_user(self):
+        return self.recommender.catalog.normalize(self.user_vector)
+
+    @cached_property
+    def search_constraints(self):
+        """r_constraints as sent in the search payload: the avoid list includes the diet's exclusions."""
+        constraints = dict(self.r_constraints or {"avoid_ingredients": [], "nutrient_thresholds": {}})
+        constraints["avoid_ingredients"] = list(self.avoid_ingredients)
+        return constraints
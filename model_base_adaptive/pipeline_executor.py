@@ -0,0 +1,367 @@
+import asyncio
+import gc
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from config import (
+    PIPELINE_POOL_KIND, PIPELINE_POOL_WORKERS, PIPELINE_MAX_QUEUE,
+    PIPELINE_TIMEOUT_S, PIPELINE_START_METHOD, ANN_MIN_ROWS, USE_RECIPE_STORE, EMBEDDING_SOCKET
+)
+
+
+class PoolSaturated(Exception):
+    """All workers are busy and the wait queue is full (maps to HTTP 429)."""
+
+
+class PipelineTimeout(Exception):
+    """The pipeline did not finish within the per-request timeout (maps to HTTP 503)."""
+
+
+def preload_engines():
+    """Worker initializer: loads the engines once per worker process/thread."""
+    from rag_engine import MedicalRAG
+    from recommender_engine import NutritionRecommender
+    # The query LRU starts empty, so the first request would otherwise load the embedding
+    # model; with a shared embedding process (EmbeddingClient installed) there is nothing to load
+    MedicalRAG().model
+    recommender = NutritionRecommender()
+    if len(recommender.catalog) >= ANN_MIN_ROWS:
+        recommender.ann_index()
+
+
+def preload_shared():
+    """
+    Loads what the "prefork" workers share before they are forked. The catalog comes from the
+    binary recipe store (compiled first if missing or stale): its matrices and title tables
+    are read-only memory maps and byte blobs rather than per-row Python objects, so requests
+    in the workers read them without touching reference counts and the pages stay shared.
+    The guideline snapshot, adaptive weights, ANN index and preference level columns are built
+    here once as well.
+    """
+    from recipe_store import read_manifest, is_store_current, compile_store
+    from recommender_engine import NutritionRecommender
+    if USE_RECIPE_STORE and NutritionRecommender._catalog is None and not is_store_current(read_manifest()):
+        print("Compiling the recipe store for the pre-fork pool...")
+        compile_store()
+    preload_engines()
+    NutritionRecommender().get_adaptive_weights()
+    _warm_shared()
+
+
+def swap_shared(swap):
+    """
+    "prefork" reload step, run off the event loop: swap() the snapshots in this process, then
+    build and freeze their derived data, so the next forked pool shares it like the first one.
+    """
+    summary = swap()
+    _warm_shared()
+    return summary
+
+
+def _warm_shared():
+    from recommender_engine import NutritionRecommender
+    NutritionRecommender().preferences.warm()
+    freeze_shared()
+
+
+def _prefork_worker():
+    """
+    Initializer of "prefork" workers. A forked worker inherits the server's signal handlers
+    (which only flag the parent's event loop) and the write end of its own call queue (so it
+    sees no EOF when the parent dies): restore the default handlers and exit with the parent.
+    It also inherits the parent's np.random state, so it is reseeded: otherwise every worker,
+    and every pool forked again on reload, would replay the same generative profiles.
+    """
+    np.random.seed()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    parent = os.getppid()
+
+    def watch_parent():
+        while os.getppid() == parent:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, name="parent-watch", daemon=True).start()
+    preload_engines()
+
+
+def _fork_locks():
+    """
+    Locks that threads of the API process (log writer, feedback snapshots, calls in the default
+    executor) may hold while a "prefork" pool is forked and that the pipeline code in a worker
+    takes as well. A worker forked while one of them is held would block on it forever.
+    Outer locks first: code holding one of them may go on to take a later one, never an earlier one.
+    Yielded one at a time, so the catalog and store are read once the reload locks are held.
+    """
+    import feedback_learner
+    import logger
+    import metrics
+    from rag_engine import MedicalRAG
+    from recommender_engine import NutritionRecommender
+    yield NutritionRecommender._reload_lock
+    yield MedicalRAG._snapshot_lock
+    yield feedback_learner._store_lock
+    yield MedicalRAG._query_cache_lock
+    if NutritionRecommender._catalog is not None:
+        yield NutritionRecommender._catalog.index._mask_cache_lock
+    if feedback_learner._store is not None:
+        yield feedback_learner._store.lock
+    yield logger._writer._lock
+    yield logger._writer._queue.mutex
+    yield metrics._pending_lock
+
+
+_fork_lock = threading.Lock()
+_fork_held = []
+_fork_guarded = False
+
+
+def _before_fork():
+    # Runs in the forking thread; waits (briefly) until no other thread is inside these locks
+    _fork_lock.acquire()
+    for lock in _fork_locks():
+        lock.acquire()
+        _fork_held.append(lock)
+
+
+def _after_fork():
+    # Parent and child each release their copy of the locks taken in _before_fork
+    while _fork_held:
+        _fork_held.pop().release()
+    _fork_lock.release()
+
+
+def guard_fork():
+    """
+    Makes every later fork of this process take _fork_locks() first and release them in both
+    processes afterwards, so a forked worker never starts with one of them held by a thread
+    that does not exist in it. Installed once ("prefork" pools fork on start and on every reload).
+    """
+    global _fork_guarded
+    if not _fork_guarded:
+        os.register_at_fork(before=_before_fork, after_in_parent=_after_fork, after_in_child=_after_fork)
+        _fork_guarded = True
+
+
+def freeze_shared():
+    """
+    Moves every object alive now out of the cyclic collector's generations (gc.freeze), so
+    collections in forked workers never write to the shared pages those objects live on.
+    Objects a previous freeze kept but that are garbage now (a reloaded snapshot) are freed first.
+    """
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def process_memory(pid):
+    """RSS, PSS and USS (pages only this process maps) of a process in MiB, from /proc (Linux); None elsewhere."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[name] = int(parts[0])
+    except OSError:
+        return None
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "pid": pid,
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(private / 1024, 1),
+    }
+
+
+def _ready():
+    return True
+
+
+class PipelineExecutor:
+    """
+    Runs CPU-bound pipeline calls off the event loop in a process or thread pool.
+
+    At most `workers + max_queue` calls are admitted; further calls fail fast with
+    PoolSaturated. Each admitted call waits at most `timeout` seconds (PipelineTimeout).
+    A timed-out call keeps its slot until the worker actually finishes, so the
+    admission bound always reflects real pool load.
+
+    "prefork" is a process pool forked from this process after preload_shared(), so the
+    catalog is in memory once for all workers, with query embeddings computed by one shared
+    embedding process (embedding_service.py) instead of a model per worker.
+    """
+
+    def __init__(self, kind=PIPELINE_POOL_KIND, workers=PIPELINE_POOL_WORKERS,
+                 max_queue=PIPELINE_MAX_QUEUE, timeout=PIPELINE_TIMEOUT_S, start_method=PIPELINE_START_METHOD):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.start_method = start_method
+        self._executor = None
+        self._embedding_server = None
+        self.embedding_socket = None
+        self._reload_lock = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    @property
+    def queue_depth(self):
+        """Admitted calls still waiting for a free worker."""
+        return max(0, self._inflight - self.workers)
+
+    @property
+    def uses_processes(self):
+        return self.kind in ("process", "prefork")
+
+    def _create_pool(self):
+        if self.uses_processes:
+            prefork = self.kind == "prefork"
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork" if prefork else self.start_method),
+                initializer=_prefork_worker if prefork else preload_engines,
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline", initializer=preload_engines)
+
+    async def _warm(self, pool):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(pool, _ready) for _ in range(self.workers)])
+
+    async def start(self):
+        """Creates the pool and waits until every worker has preloaded the engines."""
+        if self.kind not in ("process", "thread", "prefork"):
+            # "inline": no pool, run on the event loop (debugging only)
+            preload_engines()
+            return
+        if self.kind == "prefork":
+            self._start_embedding_server()
+            preload_shared()
+            guard_fork()
+        self._executor = self._create_pool()
+        await self._warm(self._executor)
+
+    def _start_embedding_server(self):
+        from embedding_service import start_server, default_socket_path, EmbeddingClient
+        from rag_engine import MedicalRAG
+        self.embedding_socket = EMBEDDING_SOCKET or default_socket_path()
+        self._embedding_server = start_server(self.embedding_socket)
+        # Installed before the guidelines are loaded and before forking: every worker inherits it
+        MedicalRAG._model = EmbeddingClient(self.embedding_socket)
+
+    async def reload(self, prepare, swap):
+        """
+        Switches the engines to the current data without dropping requests.
+
+        Thread/inline pools share the engine singletons, so `swap()` builds the next snapshots in
+        a background thread and swaps them in place. Worker processes each hold their own copy:
+        `prepare()` builds the on-disk artifacts in a one-off process, then a new pool is started
+        and warmed on them and replaces the old one, whose running and queued calls still finish
+        on the old snapshots (both pools are alive, and use memory, until then).
+        A "prefork" pool swaps the snapshots in this process first and forks the new pool from it,
+        although this process is multi-threaded by then: see guard_fork for the locks that are
+        held across the fork so no worker inherits one taken by another thread.
+        Concurrent reloads are serialized. Returns the summary of prepare()/swap().
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        async with self._reload_lock:
+            if not self.uses_processes or self._executor is None:
+                return await loop.run_in_executor(None, swap)
+
+            if self.kind == "prefork":
+                summary = await loop.run_in_executor(None, swap_shared, swap)
+            else:
+                builder = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(self.start_method))
+                try:
+                    summary = await loop.run_in_executor(builder, prepare)
+                finally:
+                    builder.shutdown(wait=False)
+
+            pool = self._create_pool()
+            try:
+                await self._warm(pool)
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            old, self._executor = self._executor, pool
+            old.shutdown(wait=False)
+            return summary
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._embedding_server is not None:
+            from embedding_service import stop_server
+            stop_server(self._embedding_server, self.embedding_socket)
+            self._embedding_server = None
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._inflight -= 1
+
+    async def run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+
+        with self._lock:
+            if self._inflight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(f"{self._inflight} requests in flight")
+            self._inflight += 1
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise PipelineTimeout(f"pipeline exceeded {self.timeout}s")
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "inflight": self._inflight,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def memory(self):
+        """
+        Memory of this process, each pool worker and the embedding server. A worker's USS is
+        what adding one more worker costs; with "prefork" the shared catalog pages are counted
+        in PSS (split between the processes mapping them) but not in any worker's USS.
+        """
+        # ProcessPoolExecutor keeps no public list of its worker processes
+        pids = list(getattr(self._executor, "_processes", None) or {}) if self.uses_processes else []
+        workers = [usage for usage in map(process_memory, sorted(pids)) if usage is not None]
+        report = {"kind": self.kind, "parent": process_memory(os.getpid()), "workers": workers}
+        if self._embedding_server is not None:
+            report["embedding_server"] = process_memory(self._embedding_server.pid)
+        if workers:
+            report["worker_uss_mb"] = round(sum(w["uss_mb"] for w in workers) / len(workers), 1)
+        processes = [report["parent"], report.get("embedding_server")] + workers
+        report["total_pss_mb"] = round(sum(p["pss_mb"] for p in processes if p), 1)
+        return report
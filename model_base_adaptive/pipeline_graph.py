@@ -0,0 +1,45 @@
+import metrics
+
+
+class StageGraph:
+    """
+    Pipeline stages as a dependency graph, evaluated lazily from an output projection.
+
+    Each stage computes one named value from the values it depends on (other stages or the
+    run's inputs). `run(outputs, **inputs)` evaluates only the stages the requested outputs
+    transitively need, each at most once, in registration order (so stages that draw from a
+    shared random state keep their relative order), and times them under their metrics label.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name, deps=(), timer=None):
+        """Decorator registering fn(*deps) as the stage producing `name`."""
+        def register(fn):
+            self.stages[name] = (fn, tuple(deps), timer or name)
+            return fn
+        return register
+
+    def required(self, outputs):
+        """Stage names needed for `outputs`, in evaluation order."""
+        needed = set()
+        pending = [o for o in outputs if o in self.stages]
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            pending.extend(d for d in self.stages[name][1] if d in self.stages)
+        return [name for name in self.stages if name in needed]
+
+    def run(self, outputs, **inputs):
+        unknown = [o for o in outputs if o not in self.stages and o not in inputs]
+        if unknown:
+            raise ValueError(f"Unknown pipeline output(s): {', '.join(unknown)}")
+        values = dict(inputs)
+        for name in self.required(outputs):
+            fn, deps, timer = self.stages[name]
+            with metrics.stage(timer):
+                values[name] = fn(*[values[d] for d in deps])
+        return {o: values[o] for o in outputs}
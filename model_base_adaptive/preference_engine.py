@@ -0,0 +1,181 @@
+import weakref
+import numpy as np
+from config import PREFERENCE_WEIGHTS
+
+# Cuisine matches by catalog column: the more specific the column, the stronger the match
+CUISINE_COLUMNS = {"Sub_region": 1.0, "Region": 0.9, "Continent": 0.5}
+
+# Title keywords marking a recipe as spicy
+SPICY_KEYWORDS = [
+    "chili", "chilli", "curry", "pepper", "jalapeno", "spicy", "harissa", "sriracha", "cayenne",
+    "masala", "vindaloo", "szechuan", "sichuan", "berbere", "piri", "wasabi", "kimchi", "tikka",
+]
+
+# Level preference -> how the catalog column is derived (see PreferenceEngine._level_columns)
+LEVEL_FIELDS = ["spiceLevel", "sweetness", "proteinLevel", "carbsLevel", "fatsLevel"]
+LEVEL_RANGE = (1, 5)
+
+# Energy per gram, for the macro shares behind the level preferences
+MACRO_KCAL = {
+    "proteinLevel": ("Protein (g)", 4.0),
+    "carbsLevel": ("Carbohydrate, by difference (g)", 4.0),
+    "fatsLevel": ("Total lipid (fat) (g)", 9.0),
+    "sweetness": ("Sugars, total (g)", 4.0),
+}
+
+
+def fuzzy_match(user_val, row_val):
+    """Simple fuzzy matching for categorical preferences."""
+    if not user_val or not row_val: return 0.5
+    user_val, row_val = str(user_val).lower(), str(row_val).lower()
+    if user_val == row_val: return 1.0
+    if user_val in row_val or row_val in user_val: return 0.8
+    return 0.2
+
+
+def cuisine_match(cuisine, value):
+    """1.0 for the same name, 0.8 when one contains the other, else 0 (missing values never match)."""
+    if not isinstance(value, str) or not value:
+        return 0.0
+    cuisine, value = cuisine.strip().lower(), value.lower()
+    if cuisine == value:
+        return 1.0
+    if cuisine and (cuisine in value or value in cuisine):
+        return 0.8
+    return 0.0
+
+
+def percentile_ranks(values):
+    """Rank of every value within the column, scaled to [0, 1]."""
+    values = np.asarray(values, dtype=np.float64)
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return (ranks / max(len(values) - 1, 1)).astype(np.float32)
+
+
+def level_target(level):
+    """A 1-5 preference level as a target position in [0, 1], or None if it is not set."""
+    try:
+        level = float(level)
+    except (TypeError, ValueError):
+        return None
+    low, high = LEVEL_RANGE
+    return (min(max(level, low), high) - low) / (high - low)
+
+
+class PreferenceEngine:
+    """
+    Vectorized preference scoring over one catalog.
+
+    Categorical preferences (regionPreference, cuisines) are scored once per distinct
+    Region / Sub_region / Continent value into a small affinity table, and rows are mapped
+    through their dictionary codes. Level preferences (spiceLevel, sweetness and the macro
+    levels) compare the user's 1-5 level with a per-row position in [0, 1] that is computed
+    once per catalog: the percentile of the recipe's energy share for macros and sugar, and
+    a spicy-title indicator for spice. The score of a row is the PREFERENCE_WEIGHTS-weighted
+    mean of the components the profile sets; a profile with none of them scores 0.5 everywhere.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.categoricals = catalog.categoricals
+        self._levels = None
+
+    def _level_columns(self):
+        if self._levels is None:
+            catalog = self.catalog
+            protein, carbs, fat = (
+                np.asarray(catalog[name], dtype=np.float64) if name in catalog else np.zeros(len(catalog))
+                for name, _ in (MACRO_KCAL["proteinLevel"], MACRO_KCAL["carbsLevel"], MACRO_KCAL["fatsLevel"])
+            )
+            energy = np.maximum(4.0 * protein + 4.0 * carbs + 9.0 * fat, 1e-6)
+            levels = {}
+            for field, (name, kcal) in MACRO_KCAL.items():
+                if name in catalog:
+                    levels[field] = percentile_ranks(kcal * np.asarray(catalog[name], dtype=np.float64) / energy)
+            levels["spiceLevel"] = catalog.index.any_keyword_mask(SPICY_KEYWORDS, lowered=True).astype(np.float32)
+            self._levels = levels
+        return self._levels
+
+    def warm(self):
+        """Builds the per-catalog level columns now instead of on the first request that sets a level."""
+        self._level_columns()
+        return self
+
+    def _affinity(self, column, score):
+        """score(value) for every dictionary value of a categorical column, plus the missing slot (code -1)."""
+        return np.array([score(value) for value in self.categoricals[column].values + [np.nan]], dtype=np.float64)
+
+    def region_scores(self, pref_region, rows):
+        table = self._affinity("Region", lambda value: fuzzy_match(pref_region, value))
+        return table[self.categoricals["Region"].codes[rows]]
+
+    def cuisine_scores(self, cuisines, rows):
+        best = np.zeros(len(rows))
+        for column, weight in CUISINE_COLUMNS.items():
+            table = self._affinity(column, lambda value: weight * max(cuisine_match(c, value) for c in cuisines))
+            np.maximum(best, table[self.categoricals[column].codes[rows]], out=best)
+        return best
+
+    def level_scores(self, targets, rows):
+        levels = self._level_columns()
+        scores = [1.0 - np.abs(levels[field][rows] - target) for field, target in targets.items() if field in levels]
+        return np.mean(scores, axis=0) if scores else None
+
+    def scores(self, user_data, rows=None):
+        """Preference score in [0, 1] for each row of `rows` (all rows if None)."""
+        rows = np.arange(len(self.catalog)) if rows is None else np.asarray(rows)
+        components = []
+        pref_region = user_data.get("regionPreference", "")
+        if pref_region:
+            components.append((PREFERENCE_WEIGHTS["region"], self.region_scores(pref_region, rows)))
+        cuisines = [c for c in user_data.get("cuisines") or [] if isinstance(c, str) and c.strip()]
+        if cuisines:
+            components.append((PREFERENCE_WEIGHTS["cuisines"], self.cuisine_scores(cuisines, rows)))
+        targets = {field: level_target(user_data.get(field)) for field in LEVEL_FIELDS}
+        targets = {field: target for field, target in targets.items() if target is not None}
+        if targets:
+            level_scores = self.level_scores(targets, rows)
+            if level_scores is not None:
+                components.append((PREFERENCE_WEIGHTS["levels"], level_scores))
+
+        if not components:
+            return np.full(len(rows), 0.5)
+        if len(components) == 1:
+            return np.asarray(components[0][1], dtype=np.float64)
+        total = sum(weight for weight, _ in components)
+        return sum(weight * np.asarray(score, dtype=np.float64) for weight, score in components) / total
+
+    @staticmethod
+    def signature(user_data):
+        """Everything scores() reads from a profile, so equal signatures share one score vector."""
+        return (
+            str(user_data.get("regionPreference", "") or ""),
+            tuple(sorted(c.strip().lower() for c in user_data.get("cuisines") or [] if isinstance(c, str) and c.strip())),
+            tuple(level_target(user_data.get(field)) for field in LEVEL_FIELDS),
+        )
+
+    def batch_scores(self, user_data_list):
+        """
+        Preference scores of many users as (distinct, inverse): one catalog-wide score row per
+        distinct preference signature, and each user's row in it. User i's score for `rows` is
+        distinct[inverse[i], rows]; no users x catalog matrix is built.
+        """
+        signatures = {}
+        inverse = np.array([signatures.setdefault(self.signature(u), len(signatures)) for u in user_data_list])
+        firsts = {}
+        for user_data, i in zip(user_data_list, inverse):
+            firsts.setdefault(i, user_data)
+        distinct = np.vstack([self.scores(firsts[i]) for i in range(len(signatures))])
+        return distinct, inverse
+
+
+_engines = weakref.WeakKeyDictionary()
+
+
+def preference_engine(catalog):
+    """The shared PreferenceEngine of a catalog (built on first use, dropped with the catalog)."""
+    engine = _engines.get(catalog)
+    if engine is None:
+        engine = _engines[catalog] = PreferenceEngine(catalog)
+    return engine
@@ -1,69 +1,264 @@
 from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
+import copy
+import hashlib
 import json
-from config import GUIDELINES_DATA, EMBEDDING_MODEL
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+import metrics
+from guideline_compiler import CompiledGuidelines
+from config import GUIDELINES_DATA, EMBEDDING_MODEL, RAG_CACHE_DIR, RAG_QUERY_CACHE_SIZE
+
+
+def index_cache_key(guidelines_bytes, model_name=EMBEDDING_MODEL):
+    """Cache key for the persisted index: guidelines file content + embedding model."""
+    digest = hashlib.sha256(guidelines_bytes)
+    digest.update(model_name.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def normalize_conditions(medical_conditions):
+    """Canonical (sorted, case-folded, de-duplicated) form of a condition list."""
+    return tuple(sorted({c.strip().casefold() for c in medical_conditions}))
+
+
+class GuidelineSnapshot:
+    """One immutable version of the guideline corpus: texts, embeddings, FAISS index and compiled records."""
+
+    def __init__(self, key, guidelines, embeddings, index, added=0):
+        self.key = key
+        self.guidelines = guidelines
+        self.texts = [g["guideline"] for g in guidelines]
+        self.conditions = [g["condition"] for g in guidelines]
+        self.embeddings = embeddings
+        self.index = index
+        self.added = added  # guidelines encoded for this version (0 when loaded from the cache)
+        # Constraints are compiled once per corpus; requests merge the retrieved records
+        with metrics.stage("init.rag.compile"):
+            self.compiled = CompiledGuidelines(self.texts)
+
 
 class MedicalRAG:
     _model = None
-    _index = None
-    _embeddings = None
-    _texts = None
-    _conditions = None
-    _guidelines = None
+    _snapshot = None
+    _snapshot_lock = threading.Lock()
+    _query_cache = OrderedDict()
+    _query_cache_lock = threading.Lock()
+    query_cache_hits = 0
+    query_cache_misses = 0
 
     def __init__(self):
+        if MedicalRAG._snapshot is None:
+            with MedicalRAG._snapshot_lock:
+                if MedicalRAG._snapshot is None:
+                    print("Initializing MedicalRAG (Model & Index)...")
+                    with metrics.stage("init.rag"):
+                        MedicalRAG._snapshot = MedicalRAG.load_snapshot()
+                    MedicalRAG.clear_query_cache()
+
+        # An instance keeps the snapshot it was created with, so a reload never changes it mid-request
+        snapshot = MedicalRAG._snapshot
+        self.snapshot = snapshot
+        self.index_key = snapshot.key
+        self.guidelines = snapshot.guidelines
+        self.texts = snapshot.texts
+        self.conditions = snapshot.conditions
+        self.embeddings = snapshot.embeddings
+        self.index = snapshot.index
+        self.compiled = snapshot.compiled
+
+    @property
+    def model(self):
+        """The SentenceTransformer is only loaded once a query actually needs encoding."""
         if MedicalRAG._model is None:
-            print("Initializing MedicalRAG (Model & Index)...")
-            MedicalRAG._model = SentenceTransformer(EMBEDDING_MODEL)
-            
-            with open(GUIDELINES_DATA, "r") as f:
-                MedicalRAG._guidelines = json.load(f)
-            
-            MedicalRAG._texts = [g["guideline"] for g in MedicalRAG._guidelines]
-            MedicalRAG._conditions = [g["condition"] for g in MedicalRAG._guidelines]
-            
-            MedicalRAG._embeddings = MedicalRAG._model.encode(MedicalRAG._texts)
-            
-            dim = MedicalRAG._embeddings.shape[1]
-            MedicalRAG._index = faiss.IndexFlatL2(dim)
-            MedicalRAG._index.add(np.array(MedicalRAG._embeddings))
-        
-        self.model = MedicalRAG._model
-        self.guidelines = MedicalRAG._guidelines
-        self.texts = MedicalRAG._texts
-        self.conditions = MedicalRAG._conditions
-        self.embeddings = MedicalRAG._embeddings
-        self.index = MedicalRAG._index
-    
-    def retrieve(self, medical_conditions, top_k=3):
-        query = " ".join(medical_conditions)
-        query_vec = self.model.encode([query])
-        
-        _, indices = self.index.search(query_vec, top_k)
-        retrieved = [self.guidelines[i] for i in indices[0]]
-
-        # Extract negative constraints dynamically
-        constraints = {
-            "avoid_ingredients": [],
-            "nutrient_thresholds": {} # e.g., {"Sodium, Na (mg)": 1500}
+            with metrics.stage("init.embedding_model"):
+                MedicalRAG._model = SentenceTransformer(EMBEDDING_MODEL)
+        return MedicalRAG._model
+
+    @classmethod
+    def _encode(cls, texts):
+        if cls._model is None:
+            cls._model = SentenceTransformer(EMBEDDING_MODEL)
+        return np.asarray(cls._model.encode(texts), dtype=np.float32)
+
+    @classmethod
+    def load_snapshot(cls, path=None, current=None):
+        """
+        Reads the guidelines file and returns its snapshot (index loaded from or added to
+        RAG_CACHE_DIR), or `current` when the file has not changed since it was built.
+        """
+        with open(path or GUIDELINES_DATA, "rb") as f:
+            raw = f.read()
+        key = index_cache_key(raw)
+        if current is not None and current.key == key:
+            return current
+        guidelines = json.loads(raw)
+        embeddings, index, added = cls._load_or_build_index(key, [g["guideline"] for g in guidelines])
+        return GuidelineSnapshot(key, guidelines, embeddings, index, added)
+
+    @classmethod
+    def reload(cls, path=None):
+        """
+        Builds the snapshot of the current guidelines file and swaps it in. Requests already
+        holding a MedicalRAG instance finish on the previous snapshot. Returns the new snapshot.
+        """
+        with cls._snapshot_lock:
+            current = cls._snapshot
+            snapshot = cls.load_snapshot(path, current)
+            if snapshot is current:
+                return current
+            cls._snapshot = snapshot
+        # Entries are keyed by index version; old ones can no longer be hit
+        cls.clear_query_cache()
+        return snapshot
+
+    @staticmethod
+    def _read_cache(cache_dir):
+        return np.load(os.path.join(cache_dir, "embeddings.npy"), mmap_mode="r"), \
+            faiss.read_index(os.path.join(cache_dir, "index.faiss"))
+
+    @staticmethod
+    def _cached_prefix(texts):
+        """
+        The largest cached corpus (same embedding model) whose texts are a prefix of `texts`:
+        guidelines appended to the file only need their own embeddings.
+        """
+        best, best_len = None, 0
+        if not os.path.isdir(RAG_CACHE_DIR):
+            return best, best_len
+        for name in os.listdir(RAG_CACHE_DIR):
+            try:
+                with open(os.path.join(RAG_CACHE_DIR, name, "corpus.json"), "r") as f:
+                    corpus = json.load(f)
+            except (OSError, ValueError):
+                continue
+            n = len(corpus["texts"])
+            if corpus["model"] == EMBEDDING_MODEL and best_len < n < len(texts) and corpus["texts"] == texts[:n]:
+                best, best_len = os.path.join(RAG_CACHE_DIR, name), n
+        return best, best_len
+
+    @classmethod
+    def _load_or_build_index(cls, key, texts):
+        """
+        Loads guideline embeddings (memory-mapped) and the FAISS index from RAG_CACHE_DIR.
+        On a miss, extends the largest cached prefix of the corpus with FAISS `add`
+        (only the new guidelines are encoded), or encodes everything when there is none;
+        the result is persisted under `key`. Returns (embeddings, index, encoded guidelines).
+        """
+        cache_dir = os.path.join(RAG_CACHE_DIR, key)
+        if os.path.exists(os.path.join(cache_dir, "index.faiss")):
+            return cls._read_cache(cache_dir) + (0,)
+
+        prefix_dir, n_cached = cls._cached_prefix(texts)
+        if prefix_dir is not None:
+            print(f"Extending guideline index with {len(texts) - n_cached} guideline(s)...")
+            cached, index = cls._read_cache(prefix_dir)
+            new = cls._encode(texts[n_cached:])
+            index.add(new)
+            embeddings = np.concatenate([np.asarray(cached), new])
+        else:
+            print("Building guideline index (cache miss)...")
+            embeddings = cls._encode(texts)
+            index = faiss.IndexFlatL2(embeddings.shape[1])
+            index.add(embeddings)
+
+        # Write to a temporary directory first so concurrent workers never see a partial cache
+        os.makedirs(RAG_CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=RAG_CACHE_DIR)
+        try:
+            np.save(os.path.join(tmp_dir, "embeddings.npy"), embeddings)
+            faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+            with open(os.path.join(tmp_dir, "corpus.json"), "w") as f:
+                json.dump({"model": EMBEDDING_MODEL, "texts": texts}, f)
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # Another process published the same key first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return embeddings, index, len(texts) - n_cached
+
+    @classmethod
+    def clear_query_cache(cls):
+        with cls._query_cache_lock:
+            cls._query_cache.clear()
+
+    @classmethod
+    def query_cache_stats(cls):
+        return {
+            "entries": len(cls._query_cache),
+            "hits": cls.query_cache_hits,
+            "misses": cls.query_cache_misses,
         }
 
-        # Simple keyword-based extraction (in a real app, use an LLM here)
-        for g in retrieved:
-            text = g["guideline"].lower()
-            # Ingredient avoidance
-            if "avoid" in text or "limit" in text:
-                # Mock extraction logic based on common dietary triggers
-                if "sugar" in text: constraints["avoid_ingredients"].append("sugar")
-                if "salt" in text or "sodium" in text: constraints["avoid_ingredients"].append("salt")
-                if "fat" in text: constraints["avoid_ingredients"].append("fat")
-                if "oil" in text: constraints["avoid_ingredients"].append("oil")
-            
-            # Nutrient thresholds
-            if "low sodium" in text:
-                constraints["nutrient_thresholds"]["Sodium, Na (mg)"] = 1500
-            if "low sugar" in text:
-                constraints["nutrient_thresholds"]["Sugars, total (g)"] = 25
-
-        return retrieved, constraints
+    def _cache_get(self, key):
+        with MedicalRAG._query_cache_lock:
+            entry = MedicalRAG._query_cache.get(key)
+            if entry is not None:
+                MedicalRAG._query_cache.move_to_end(key)
+                MedicalRAG.query_cache_hits += 1
+            else:
+                MedicalRAG.query_cache_misses += 1
+        metrics.cache_lookup("rag_query", entry is not None)
+        return entry
+
+    def _cache_put(self, key, entry):
+        with MedicalRAG._query_cache_lock:
+            MedicalRAG._query_cache[key] = entry
+            while len(MedicalRAG._query_cache) > RAG_QUERY_CACHE_SIZE:
+                MedicalRAG._query_cache.popitem(last=False)
+
+    def retrieve(self, medical_conditions, top_k=3):
+        """
+        Retrieves guidelines for the conditions and merges their compiled constraints.
+        Each returned guideline carries its corpus position as "id" (see priority_weights).
+        Results are cached per normalized condition set (and index version), so a hit
+        skips model inference; callers always receive their own copies.
+        """
+        return self.retrieve_batch([medical_conditions], top_k=top_k)[0]
+
+    def retrieve_batch(self, condition_lists, top_k=3):
+        """
+        retrieve() for many users: every distinct uncached condition set is encoded in a
+        single model.encode call and searched in one FAISS query.
+        """
+        keys = [(self.index_key, normalize_conditions(conditions), top_k) for conditions in condition_lists]
+        entries = {}
+        missing = {}
+        for key, conditions in zip(keys, condition_lists):
+            if key in entries or key in missing:
+                continue
+            entry = self._cache_get(key)
+            if entry is None:
+                missing[key] = conditions
+            else:
+                entries[key] = entry
+
+        if missing:
+            queries = [self._canonical_query(conditions) for conditions in missing.values()]
+            with metrics.stage("rag.encode"):
+                query_vecs = np.asarray(self.model.encode(queries), dtype=np.float32)
+            with metrics.stage("rag.search"):
+                _, indices = self.index.search(query_vecs, top_k)
+            for key, query_vec, row in zip(missing, query_vecs, indices):
+                row = row[row >= 0]  # FAISS pads with -1 when top_k exceeds the corpus
+                retrieved = [dict(self.guidelines[i], id=int(i)) for i in row]
+                entry = (query_vec, retrieved, self.compiled.constraints(row))
+                self._cache_put(key, entry)
+                entries[key] = entry
+
+        return [
+            (copy.deepcopy(entries[key][1]), copy.deepcopy(entries[key][2])) for key in keys
+        ]
+
+    def priority_weights(self, retrieved, nutrients):
+        """Per-nutrient medical priority of retrieved guidelines, from the compiled table."""
+        return self.compiled.priority_weights([g["id"] for g in retrieved], nutrients)
+
+    @staticmethod
+    def _canonical_query(medical_conditions):
+        # Encode the conditions in canonical order so every permutation shares one cache entry
+        unique = {c.strip().casefold(): c for c in medical_conditions}
+        return " ".join(unique[k] for k in sorted(unique))
@@ -0,0 +1,154 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+DIET_FLAGS = ["vegan", "pescetarian", "lacto_vegetarian"]
+
+# Characters that make pandas' str.contains treat a keyword as a regular expression
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+class RecipeIndex:
+    """
+    Load-time filter index over the recipe catalog.
+
+    - diet-flag bitmaps (one boolean mask per flag column)
+    - region -> row positions map
+    - inverted index from lowercased title tokens to row positions, used to answer
+      keyword (substring) lookups by scanning the token vocabulary instead of every title
+
+    Keyword masks are memoized, so repeated allergy/avoid lists cost one lookup each.
+    """
+
+    def __init__(self, titles, titles_lower, title_present, regions, diet_flags,
+                 token_index=None, mask_cache_bytes=256 * 1024 * 1024):
+        """
+        titles / titles_lower: per-row title sequences (original and lowercased)
+        title_present: boolean mask of rows with a title (missing titles never match)
+        regions: dictionary-encoded Region column (catalog.DictColumn)
+        diet_flags: {flag: boolean mask}
+        token_index: optional prebuilt (tokens, offsets, postings) CSR token index
+        """
+        self.size = len(titles_lower)
+        self.diet_flags = diet_flags
+        self.region_rows = self._group_rows(regions.codes, regions.values)
+
+        self._titles = titles
+        self._titles_lower = titles_lower
+        self._title_present = title_present if title_present is not None else np.ones(self.size, dtype=bool)
+        self._title_series = None
+
+        if token_index is None:
+            token_index = self.build_token_index(titles_lower, self._title_present)
+        self.tokens, self.token_offsets, self.token_postings = token_index
+
+        self._mask_cache = OrderedDict()
+        self._mask_cache_lock = threading.Lock()
+        self._mask_cache_size = max(64, mask_cache_bytes // max(1, self.size))
+
+    @staticmethod
+    def _group_rows(codes, values):
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+
+    @staticmethod
+    def build_token_index(titles_lower, title_present):
+        """Inverted index from whitespace tokens to row positions, in CSR form (tokens, offsets, postings)."""
+        postings = {}
+        for row, (title, present) in enumerate(zip(titles_lower, title_present)):
+            if not present:
+                continue
+            for token in set(title.split()):
+                postings.setdefault(token, []).append(row)
+        tokens = sorted(postings)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in tokens])
+        flat = np.fromiter((row for t in tokens for row in postings[t]), dtype=np.int64, count=int(offsets[-1]))
+        return tokens, offsets, flat
+
+    def _cached(self, key, build):
+        # The catalog is shared by pipeline threads; masks are built outside the lock
+        with self._mask_cache_lock:
+            mask = self._mask_cache.get(key)
+            if mask is not None:
+                self._mask_cache.move_to_end(key)
+                return mask
+        mask = build()
+        mask.flags.writeable = False
+        with self._mask_cache_lock:
+            self._mask_cache[key] = mask
+            while len(self._mask_cache) > self._mask_cache_size:
+                self._mask_cache.popitem(last=False)
+        return mask
+
+    def _scan_tokens(self, needle):
+        mask = np.zeros(self.size, dtype=bool)
+        offsets, postings = self.token_offsets, self.token_postings
+        hits = [postings[offsets[i]:offsets[i + 1]] for i, token in enumerate(self.tokens) if needle in token]
+        if hits:
+            mask[np.concatenate(hits)] = True
+        return mask
+
+    @property
+    def title_series(self):
+        """Titles as a pandas Series (missing titles as None) for regex keyword fallbacks."""
+        if self._title_series is None:
+            titles = np.asarray(list(self._titles), dtype=object)
+            self._title_series = pd.Series(np.where(self._title_present, titles, None), dtype=object)
+        return self._title_series
+
+    def keyword_mask(self, keyword, lowered=False):
+        """
+        Rows whose title contains `keyword`, with the same semantics as
+        `Recipe_title.str.contains(keyword, case=False, na=False)`, or with
+        `Recipe_title.str.lower().str.contains(keyword, na=False)` when `lowered` is set.
+        Plain keywords without whitespace are answered from the token index;
+        anything else falls back to a single vectorized scan.
+        """
+        def build():
+            if _REGEX_META.search(keyword):
+                if lowered:
+                    return self.title_series.str.lower().str.contains(keyword, na=False).to_numpy(dtype=bool)
+                return self.title_series.str.contains(keyword, case=False, na=False).to_numpy(dtype=bool)
+            needle = keyword if lowered else keyword.lower()
+            if needle and len(needle.split()) == 1 and needle == needle.strip():
+                return self._scan_tokens(needle)
+            return np.fromiter((needle in t for t in self._titles_lower), dtype=bool, count=self.size) & self._title_present
+
+        return self._cached((keyword, lowered), build)
+
+    def any_keyword_mask(self, keywords, lowered=False):
+        """Union of keyword masks, memoized on the keyword set."""
+        keywords = frozenset(keywords)
+
+        def build():
+            mask = np.zeros(self.size, dtype=bool)
+            for keyword in keywords:
+                mask |= self.keyword_mask(keyword, lowered=lowered)
+            return mask
+
+        return self._cached((keywords, lowered), build)
+
+    def region_mask(self, regions):
+        mask = np.zeros(self.size, dtype=bool)
+        for region in regions:
+            rows = self.region_rows.get(region)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def select(self, diet_flag=None, allergies=(), avoid_stems=(), regions=None):
+        """Combines all filters into one boolean mask and returns the surviving row positions."""
+        mask = np.ones(self.size, dtype=bool)
+        if diet_flag in self.diet_flags:
+            mask &= self.diet_flags[diet_flag]
+        if allergies:
+            mask &= ~self.any_keyword_mask(allergies)
+        if avoid_stems:
+            mask &= ~self.any_keyword_mask(avoid_stems, lowered=True)
+        if regions is not None:
+            mask &= self.region_mask(regions)
+        return np.flatnonzero(mask)
@@ -0,0 +1,267 @@
+"""
+Columnar binary recipe store.
+
+`compile_store` turns combined_recipes.csv into a directory of memory-mappable .npy
+files plus a manifest; `load_store` opens it as a RecipeCatalog without parsing the
+CSV or refitting the scaler. Pages are mapped read-only, so worker processes share them.
+
+Layout:
+    manifest.json            column order, dtype, scaler statistics, dictionaries, source stamp
+    nutrients.npy            RECIPE_STORE_DTYPE (n_rows x n_nutrients) raw nutrient matrix
+    features.npy             float32 ReLU-normalized feature matrix
+    recipe_id.npy            int64 recipe ids
+    <column>_codes.npy       int32 dictionary codes for Region / Sub_region / Continent
+    diet_flags.npy           packed bits, one row per diet flag
+    title_present.npy        packed bits
+    titles.bin + titles_offsets.npy              UTF-8 title string table
+    titles_lower.bin + titles_lower_offsets.npy  lowercased title string table
+    tokens.bin + tokens_offsets.npy, token_postings_offsets.npy, token_postings.npy
+                                                 title token index (CSR)
+
+RECIPE_STORE_DIR is a symlink to the current version (a sibling directory), replaced
+with one atomic rename per compile, so a reader sees either the previous store or the new
+one and never a partly written or deleted directory.
+
+Compile from model_base_adaptive/:  python recipe_store.py [--dtype float32]
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from config import FOOD_DATA, RECIPE_STORE_DIR, RECIPE_STORE_DTYPE
+from catalog import RecipeCatalog, DictColumn, CATEGORICAL_COLS
+from recipe_index import DIET_FLAGS
+
+STORE_VERSION = 1
+
+
+class StringTable:
+    """Read-only table of UTF-8 strings backed by a byte blob and an offsets array."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        self._view = memoryview(blob) if len(blob) else memoryview(b"")
+
+    @staticmethod
+    def encode(strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _get(self, i):
+        return str(self._view[int(self.offsets[i]):int(self.offsets[i + 1])], "utf-8")
+
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            return self._get(int(rows))
+        rows = np.arange(len(self))[rows] if isinstance(rows, slice) else np.asarray(rows)
+        return np.array([self._get(i) for i in rows.tolist()], dtype=object)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        """Decodes the whole table in one pass."""
+        data = self._view.tobytes()
+        bounds = self.offsets.tolist()
+        return [data[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _save_strings(out_dir, name, strings):
+    blob, offsets = StringTable.encode(strings)
+    blob.tofile(os.path.join(out_dir, name + ".bin"))
+    np.save(os.path.join(out_dir, name + "_offsets.npy"), offsets)
+
+
+def _load_strings(store_dir, name):
+    offsets = np.load(os.path.join(store_dir, name + "_offsets.npy"), mmap_mode="r")
+    path = os.path.join(store_dir, name + ".bin")
+    blob = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=np.uint8)
+    return StringTable(blob, offsets)
+
+
+def compile_store(csv_path=FOOD_DATA, out_dir=RECIPE_STORE_DIR, dtype=RECIPE_STORE_DTYPE):
+    """Compiles the recipes CSV into a new store version and publishes it atomically (see _publish)."""
+    foods = pd.read_csv(csv_path)
+    # combined_recipes.csv repeats Recipe_title as its last column
+    foods = foods.loc[:, ~foods.columns.str.fullmatch(r"Recipe_title\.\d+")]
+    catalog = RecipeCatalog.from_frame(foods)
+    n_rows = len(catalog)
+
+    out_dir = os.path.abspath(out_dir.rstrip("/"))
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(out_dir), prefix=os.path.basename(out_dir) + ".")
+
+    np.save(os.path.join(tmp_dir, "nutrients.npy"), np.ascontiguousarray(catalog.nutrient_matrix, dtype=dtype))
+    np.save(os.path.join(tmp_dir, "features.npy"), catalog.features)
+    np.save(os.path.join(tmp_dir, "recipe_id.npy"), catalog.recipe_ids.astype(np.int64))
+
+    dictionaries = {}
+    for col in CATEGORICAL_COLS:
+        column = catalog.categoricals[col]
+        np.save(os.path.join(tmp_dir, col + "_codes.npy"), column.codes)
+        dictionaries[col] = column.values
+
+    flags = [flag for flag in DIET_FLAGS if flag in catalog.diet_flags]
+    packed = np.packbits(np.vstack([catalog.diet_flags[f] for f in flags]), axis=1) if flags else np.zeros((0, 0), np.uint8)
+    np.save(os.path.join(tmp_dir, "diet_flags.npy"), packed)
+
+    title_present = foods["Recipe_title"].notna().to_numpy()
+    np.save(os.path.join(tmp_dir, "title_present.npy"), np.packbits(title_present))
+    _save_strings(tmp_dir, "titles", [str(t) if present else "" for t, present in zip(catalog.titles, title_present)])
+    _save_strings(tmp_dir, "titles_lower", catalog.titles_lower)
+
+    tokens, offsets, postings = catalog.index.tokens, catalog.index.token_offsets, catalog.index.token_postings
+    _save_strings(tmp_dir, "tokens", tokens)
+    np.save(os.path.join(tmp_dir, "token_postings_offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "token_postings.npy"), postings)
+
+    scaler = catalog.scaler
+    manifest = {
+        "version": STORE_VERSION,
+        "n_rows": n_rows,
+        "dtype": np.dtype(dtype).name,
+        "nutrients": catalog.nutrients,
+        "diet_flags": flags,
+        "dictionaries": dictionaries,
+        "scaler": {
+            "mean": scaler.mean_.tolist(),
+            "scale": scaler.scale_.tolist(),
+            "var": scaler.var_.tolist(),
+            "n_samples_seen": int(scaler.n_samples_seen_),
+        },
+        "means": catalog.means,
+        "stds": catalog.stds.tolist(),
+        "source": source_stamp(csv_path),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    _publish(tmp_dir, out_dir)
+    return manifest
+
+
+def _publish(version_dir, out_dir):
+    """
+    Points the out_dir symlink at version_dir with an atomic rename. The version it replaces
+    is kept for readers that resolved it just before the swap; older versions are removed.
+    """
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # A store compiled before versioned directories: move it aside once
+        previous = tempfile.mkdtemp(dir=os.path.dirname(out_dir), prefix=os.path.basename(out_dir) + ".")
+        os.rename(out_dir, previous)
+    else:
+        previous = os.path.realpath(out_dir) if os.path.islink(out_dir) else None
+    link = f"{out_dir}.{os.getpid()}.link"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, out_dir)
+    for path in glob.glob(glob.escape(out_dir) + ".*"):
+        # Versions still being written by another compile have no manifest yet
+        if path not in (version_dir, previous) and os.path.isfile(os.path.join(path, "manifest.json")):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _scaler_from_stats(stats, n_features):
+    scaler = StandardScaler()
+    scaler.mean_ = np.array(stats["mean"])
+    scaler.scale_ = np.array(stats["scale"])
+    scaler.var_ = np.array(stats["var"])
+    scaler.n_samples_seen_ = stats["n_samples_seen"]
+    scaler.n_features_in_ = n_features
+    return scaler
+
+
+def read_manifest(store_dir=RECIPE_STORE_DIR):
+    """The current version's manifest, with the resolved version directory under "directory"."""
+    store_dir = os.path.realpath(store_dir)
+    path = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    manifest["directory"] = store_dir
+    return manifest
+
+
+def is_store_current(manifest, csv_path=FOOD_DATA, dtype=RECIPE_STORE_DTYPE):
+    """
+    The store is current if it matches this format version and nutrient dtype and the CSV has
+    not changed since compiling.
+    """
+    if manifest is None or manifest.get("version") != STORE_VERSION:
+        return False
+    if manifest.get("dtype") != np.dtype(dtype).name:
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    stamp = source_stamp(csv_path)
+    source = manifest["source"]
+    return stamp["size"] == source["size"] and stamp["mtime_ns"] == source["mtime_ns"]
+
+
+def load_store(store_dir=RECIPE_STORE_DIR, manifest=None):
+    """Opens a compiled store as a RecipeCatalog; all large arrays are read-only memory maps."""
+    manifest = manifest or read_manifest(store_dir)
+    # Read every file from the version the manifest came from, even if a compile swaps the link meanwhile
+    store_dir = manifest.get("directory", store_dir)
+    n_rows = manifest["n_rows"]
+    nutrients = manifest["nutrients"]
+
+    def npy(name):
+        return np.load(os.path.join(store_dir, name), mmap_mode="r")
+
+    packed = npy("diet_flags.npy")
+    diet_flags = {
+        flag: np.unpackbits(packed[i], count=n_rows).astype(bool) for i, flag in enumerate(manifest["diet_flags"])
+    }
+    categoricals = {
+        col: DictColumn(npy(col + "_codes.npy"), manifest["dictionaries"][col]) for col in CATEGORICAL_COLS
+    }
+    tokens = _load_strings(store_dir, "tokens")
+
+    return RecipeCatalog(
+        nutrients=nutrients,
+        nutrient_matrix=npy("nutrients.npy"),
+        scaler=_scaler_from_stats(manifest["scaler"], len(nutrients)),
+        means=manifest["means"],
+        stds=pd.Series(manifest["stds"], index=nutrients),
+        recipe_ids=npy("recipe_id.npy"),
+        titles=_load_strings(store_dir, "titles"),
+        titles_lower=_load_strings(store_dir, "titles_lower"),
+        categoricals=categoricals,
+        diet_flags=diet_flags,
+        title_present=np.unpackbits(npy("title_present.npy"), count=n_rows).astype(bool),
+        features=npy("features.npy"),
+        token_index=(tokens.to_list(), npy("token_postings_offsets.npy"), npy("token_postings.npy")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile combined_recipes.csv into the binary recipe store.")
+    parser.add_argument("--csv", default=FOOD_DATA)
+    parser.add_argument("--out", default=RECIPE_STORE_DIR)
+    parser.add_argument("--dtype", default=RECIPE_STORE_DTYPE, choices=["float32", "float64"],
+                        help="nutrient matrix dtype (float64 reproduces CSV scores exactly); a store whose "
+                             "dtype differs from RECIPE_STORE_DTYPE is recompiled when the server loads it")
+    args = parser.parse_args()
+    manifest = compile_store(args.csv, args.out, args.dtype)
+    print(f"Compiled {manifest['n_rows']} recipes x {len(manifest['nutrients'])} nutrients into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,155 @@
+import os
+import threading
+import weakref
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import GradientBoostingRegressor
-from config import FOOD_DATA
+from config import (
+    FOOD_DATA, USE_RECIPE_STORE, GENERATIVE_MODEL_MODE,
+    ANN_INDEX_KIND, ANN_MIN_ROWS, ANN_SHORTLIST, BATCH_SIMILARITY_MAX_BYTES
+)
+from penalty_engine import compute_penalties, with_diet_avoidance
+from pipeline_context import PipelineContext
+from preference_engine import preference_engine
+from catalog import RecipeCatalog
+from recipe_store import read_manifest, is_store_current, load_store, compile_store, source_stamp
+import metrics
+
+
+def food_data_stamp():
+    return source_stamp(FOOD_DATA) if os.path.exists(FOOD_DATA) else None
+
+
+def refresh_recipe_store():
+    """Recompiles the binary recipe store if one is in use and FOOD_DATA changed since it was compiled."""
+    manifest = read_manifest() if USE_RECIPE_STORE else None
+    if manifest is not None and not is_store_current(manifest):
+        print("Recompiling the recipe store...")
+        compile_store()
+        return True
+    return False
+
 
 class NutritionRecommender:
-    _foods = None
-    _nutrients = None
-    _scaler = None
-    _means = None
-    _stds = None
-
-    def __init__(self):
-        if NutritionRecommender._foods is None:
-            print("Initializing NutritionRecommender (Dataset & Scaler)...")
-            NutritionRecommender._foods = pd.read_csv(FOOD_DATA)
-
-            # Identify nutritional columns dynamically
-            excluded_cols = [
-                "Recipe_id", "servings", "Recipe_title", "Region", "Sub_region", 
-                "Continent", "vegan", "pescetarian", "lacto_vegetarian"
-            ]
-            
-            NutritionRecommender._nutrients = [
-                col for col in NutritionRecommender._foods.select_dtypes(include=[np.number]).columns 
-                if col not in excluded_cols
-            ]
-            
-            NutritionRecommender._foods[NutritionRecommender._nutrients] = NutritionRecommender._foods[NutritionRecommender._nutrients].fillna(0)
-            NutritionRecommender._scaler = StandardScaler()
-            NutritionRecommender._scaler.fit(NutritionRecommender._foods[NutritionRecommender._nutrients])
-            
-            NutritionRecommender._means = NutritionRecommender._foods[NutritionRecommender._nutrients].mean().to_dict()
-            NutritionRecommender._stds = NutritionRecommender._foods[NutritionRecommender._nutrients].std()
+    _catalog = None
+    _catalog_source = None  # FOOD_DATA stamp the current catalog was built from
+    _reload_lock = threading.Lock()
+    # Derived per catalog snapshot; entries go away with their catalog
+    _ann_indexes = weakref.WeakKeyDictionary()
+    _adaptive_weights = weakref.WeakKeyDictionary()
+
+    def __init__(self, catalog=None):
+        if catalog is None and NutritionRecommender._catalog is None:
+            with NutritionRecommender._reload_lock:
+                if NutritionRecommender._catalog is None:
+                    with metrics.stage("init.recommender"):
+                        NutritionRecommender._catalog_source = food_data_stamp()
+                        NutritionRecommender._catalog = NutritionRecommender.build_catalog()
+
+        # An instance keeps the catalog it was created with, so a reload never changes it mid-request
+        if catalog is None:
+            catalog = NutritionRecommender._catalog
+        self.catalog = catalog
+        self.nutrients = catalog.nutrients
+        self.scaler = catalog.scaler
+        self.means = catalog.means
+        self.stds = catalog.stds
+
+    @property
+    def foods(self):
+        return self.catalog.foods
+
+    @property
+    def preferences(self):
+        return preference_engine(self.catalog)
+
+    @classmethod
+    def load_catalog(cls, foods):
+        """Builds the shared catalog (scaler + normalized feature matrix) from a recipes DataFrame."""
+        cls._catalog = RecipeCatalog.from_frame(foods)
+        return cls._catalog
+
+    @staticmethod
+    def build_catalog():
+        """Catalog of the current data: the binary store when it is current, else the CSV."""
+        manifest = read_manifest() if USE_RECIPE_STORE else None
+        if is_store_current(manifest):
+            print("Initializing NutritionRecommender (Binary Recipe Store)...")
+            return load_store(manifest=manifest)
+        print("Initializing NutritionRecommender (Dataset & Scaler)...")
+        return RecipeCatalog.from_frame(pd.read_csv(FOOD_DATA))
+
+    @classmethod
+    def reload_catalog(cls, force=False):
+        """
+        Rebuilds the catalog when FOOD_DATA changed (recompiling a stale recipe store first)
+        and swaps it in with its adaptive weights and ANN index already built, so the first
+        requests on the new version do not pay for them. Requests already holding a
+        NutritionRecommender finish on the previous catalog. Returns True if it was swapped.
+        """
+        with cls._reload_lock:
+            stamp = food_data_stamp()
+            if not force and cls._catalog is not None and stamp == cls._catalog_source:
+                return False
+            refresh_recipe_store()
+            recommender = cls(catalog=cls.build_catalog())
+            recommender.get_adaptive_weights()
+            if len(recommender.catalog) >= ANN_MIN_ROWS:
+                recommender.ann_index()
+            cls._catalog, cls._catalog_source = recommender.catalog, stamp
+            return True
 
-        self.foods = NutritionRecommender._foods
-        self.nutrients = NutritionRecommender._nutrients
-        self.scaler = NutritionRecommender._scaler
-        self.means = NutritionRecommender._means
-        self.stds = NutritionRecommender._stds
+    def ann_index(self, kind=None):
+        """Shared ANN index over the catalog features, built on first use (None when disabled)."""
+        kind = ANN_INDEX_KIND if kind is None else kind
+        if not kind:
+            return None
+        index = NutritionRecommender._ann_indexes.get(self.catalog)
+        if index is None or index.kind != kind:
+            from ann_index import RecipeAnnIndex
+            index = NutritionRecommender._ann_indexes[self.catalog] = RecipeAnnIndex(self.catalog.features, kind=kind)
+        return index
 
     def get_adaptive_weights(self):
         """
         Calculates weights based on dataset variance. 
         Highly variable nutrients are more distinguishing features.
         """
+        weights = NutritionRecommender._adaptive_weights.get(self.catalog)
+        if weights is not None:
+            return weights
+
         # Use inverse log variance or simply normalized std
         weights = self.stds.values / (self.stds.values.max() + 1e-6)
         # Ensure a minimum weight
-        return np.maximum(0.1, weights)
+        weights = np.maximum(0.1, weights)
+        weights.flags.writeable = False
+        NutritionRecommender._adaptive_weights[self.catalog] = weights
+        return weights
 
     def filter_foods(self, user_data, avoid_ingredients=None):
-        df = self.foods.copy()
-        avoid_ingredients = avoid_ingredients or []
-        
-        # Strict Diet-based Ingredient Avoidance
-        diet = user_data.get("dietaryPreference", "").lower()
-        diet_avoidance = {
-            "vegan": ["chicken", "beef", "pork", "fish", "egg", "dairy", "milk", "cheese", "honey", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "vegetarian": ["chicken", "beef", "pork", "fish", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "pescetarian": ["chicken", "beef", "pork", "meat", "lamb", "bacon", "steak"]
-        }
-        
-        if diet in diet_avoidance:
-            avoid_ingredients.extend(diet_avoidance[diet])
-            # Remove duplicates
-            avoid_ingredients = list(set(avoid_ingredients))
-
-        # Dietary Preferences
-        diet = user_data.get("dietaryPreference", "")
-        if diet == "vegan":
-            df = df[df["vegan"] == 1]
-        elif diet == "pescetarian":
-            df = df[df["pescetarian"] == 1]
-        elif diet == "lacto_vegetarian":
-            df = df[df["lacto_vegetarian"] == 1]
-
-        # Allergy-based ingredient filtering (keyword match in Title)
-        allergies = user_data.get("allergies", [])
-        for allergy in allergies:
-            df = df[~df["Recipe_title"].str.contains(allergy, case=False, na=False)]
+        rows = self.filter_indices(user_data, avoid_ingredients=avoid_ingredients)
+        return self.foods.iloc[rows].reset_index(drop=True)
 
-        # RAG-driven negative ingredient filtering (Robust Matching)
-        if avoid_ingredients:
-            for ingredient in avoid_ingredients:
-                # Use a simple stem (remove 's' at end) for broader matching
-                stem = ingredient.lower().rstrip('s')
-                df = df[~df["Recipe_title"].str.lower().str.contains(stem, na=False)]
-
-        if "regions" in user_data:
-            df = df[df["Region"].isin(user_data["regions"])]
+    def filter_indices(self, user_data, avoid_ingredients=None):
+        """Returns the catalog row positions that pass the diet, allergy, avoidance and region filters."""
+        # Strict Diet-based Ingredient Avoidance
+        avoid_ingredients = with_diet_avoidance(avoid_ingredients, user_data.get("dietaryPreference", ""))
 
-        return df.reset_index(drop=True)
+        # Allergies (keyword match in Title) and RAG-driven negative ingredients (robust stem match)
+        # are resolved against the catalog index as boolean masks
+        allergies = user_data.get("allergies", [])
+        # Use a simple stem (remove 's' at end) for broader matching
+        avoid_stems = [ingredient.lower().rstrip('s') for ingredient in avoid_ingredients]
 
-    def _fuzzy_match(self, user_val, row_val):
-        """Simple fuzzy matching for categorical preferences."""
-        if not user_val or not row_val: return 0.5
-        user_val, row_val = str(user_val).lower(), str(row_val).lower()
-        if user_val == row_val: return 1.0
-        if user_val in row_val or row_val in user_val: return 0.8
-        return 0.2
+        metrics.count("foodoscope_catalog_rows_scanned_total", len(self.catalog))
+        return self.catalog.index.select(
+            diet_flag=user_data.get("dietaryPreference", ""),
+            allergies=allergies,
+            avoid_stems=avoid_stems,
+            regions=user_data.get("regions"),
+        )
 
     def rank(self, user_vector, constraints, user_data, weights=None, top_n=5, r_constraints=None):
         """
@@ -108,33 +157,74 @@ class NutritionRecommender:
         Generates score ranges [min, max] to reflect fuzzy uncertainty.
         Includes RAG-driven negative constraints.
         """
-        avoid_ingredients = r_constraints.get("avoid_ingredients", []) if r_constraints else []
-        
-        # Ensure Diet Enforcement is included in avoid_ingredients
-        diet = user_data.get("dietaryPreference", "").lower()
-        diet_avoidance = {
-            "vegan": ["chicken", "beef", "pork", "fish", "egg", "dairy", "milk", "cheese", "honey", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "vegetarian": ["chicken", "beef", "pork", "fish", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab", "bacon", "steak"],
-            "pescetarian": ["chicken", "beef", "pork", "meat", "lamb", "bacon", "steak"]
-        }
-        if diet in diet_avoidance:
-            avoid_ingredients.extend(diet_avoidance[diet])
-            avoid_ingredients = list(set(avoid_ingredients))
+        context = PipelineContext(self, user_data, r_constraints=r_constraints, user_vector=user_vector, weights=weights)
+        return self.rank_context(context, constraints, top_n=top_n)
 
-        filtered_df = self.filter_foods(user_data, avoid_ingredients=avoid_ingredients)
-        
-        if filtered_df.empty:
+    def rank_context(self, context, constraints, top_n=5):
+        """rank() on a PipelineContext: reuses its candidate rows, feature slice and normalized user vector."""
+        rows = context.rows
+        if len(rows) == 0:
             return pd.DataFrame()
 
-        # Nutritional Similarity
-        food_vectors = filtered_df[self.nutrients].values
-        u_norm = self.scaler.transform(user_vector.reshape(1, -1))
-        X_norm = self.scaler.transform(food_vectors)
+        shortlist = self.shortlist(context.user_vector, rows, weights=context.weights, top_n=top_n)
+        features = context.features if shortlist is rows else self.catalog.features[shortlist]
+        metrics.count("foodoscope_candidate_rows_scored_total", len(shortlist))
+        sims = self._similarities(features, context.normalized_user, context.weights)
+        return self._rank_rows(
+            shortlist, sims, constraints, context.user_data, context.avoid_ingredients, context.r_constraints, top_n
+        )
+
+    def rank_batch(self, user_vectors, constraints_list, user_data_list, weights=None, top_n=5, r_constraints_list=None,
+                   contexts=None):
+        """
+        Batched rank(): scores every user against the whole catalog with one weighted
+        matrix product, then applies each user's filters as a row mask.
+        Returns one DataFrame per user, matching rank() up to floating-point rounding.
+        Pass the callers' PipelineContexts as `contexts` to reuse their candidate rows.
+        """
+        r_constraints_list = r_constraints_list or [None] * len(user_data_list)
+        contexts = contexts or [PipelineContext(self, user_data, r_constraints=r_constraints)
+                                for user_data, r_constraints in zip(user_data_list, r_constraints_list)]
+        weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        # Users are scored in blocks so the users x catalog matrices stay under BATCH_SIMILARITY_MAX_BYTES
+        block = max(1, BATCH_SIMILARITY_MAX_BYTES // (8 * max(len(self.catalog), 1)))
+
+        results = []
+        for start in range(0, len(user_data_list), block):
+            stop = min(start + block, len(user_data_list))
+            block_weights = weights[start:stop] if weights is not None and weights.ndim == 2 else weights
+            sims = self.batch_similarities(user_vectors[start:stop], weights=block_weights)
+            prefs, pref_rows = self.preferences.batch_scores(user_data_list[start:stop])
+            metrics.count("foodoscope_candidate_rows_scored_total", sims.size)
+            for i in range(start, stop):
+                rows = contexts[i].rows
+                if len(rows) == 0:
+                    results.append(pd.DataFrame())
+                    continue
+                results.append(self._rank_rows(
+                    rows, sims[i - start, rows], constraints_list[i], user_data_list[i], contexts[i].avoid_ingredients,
+                    r_constraints_list[i], top_n, pref_scores=prefs[pref_rows[i - start], rows]
+                ))
+        return results
+
+    def shortlist(self, user_vector, rows, weights=None, top_n=5, kind=None):
+        """
+        Narrows large filtered candidate sets to an ANN shortlist (rows stay in catalog order)
+        that rank() then scores exactly. Small sets, or ANN disabled, pass through unchanged.
+        Score ranges are then spread over the shortlist rather than every candidate.
+        """
+        index = self.ann_index(kind) if len(rows) >= ANN_MIN_ROWS else None
+        if index is None:
+            return rows
+        k = max(ANN_SHORTLIST, 4 * top_n)
+        return index.search(self.catalog.normalize(user_vector), k, weights=weights, rows=rows)
 
-        # Apply ReLU to focus on above-average features
-        u_relu = np.maximum(0, u_norm)
-        X_relu = np.maximum(0, X_norm)
+    def similarities(self, user_vector, rows, weights=None):
+        """Weighted ReLU-cosine similarity between one user vector and the given catalog rows."""
+        return self._similarities(self.catalog.features[rows], self.catalog.normalize(user_vector), weights)
 
+    @staticmethod
+    def _similarities(X_relu, u_relu, weights=None):
         if weights is not None:
             weights = np.array(weights).reshape(1, -1)
             X_weighted = X_relu * weights
@@ -142,11 +232,34 @@ class NutritionRecommender:
         else:
             X_weighted, u_weighted = X_relu, u_relu
 
-        sims = cosine_similarity(u_weighted, X_weighted)[0]
+        return cosine_similarity(u_weighted, X_weighted)[0]
+
+    def batch_similarities(self, user_vectors, weights=None, block_rows=65536):
+        """
+        Weighted ReLU-cosine similarity of many users against every catalog row, as a dense
+        users x catalog matrix (rank_batch calls it one block of users at a time).
+        With per-user weights w: cos(w*u, w*x) = ((u*w^2) @ x) / (|w*u| * sqrt(w^2 @ x^2)),
+        so the whole batch is two matrix products per block of catalog rows.
+        """
+        U = self.catalog.normalize(user_vectors)
+        W = np.ones_like(U) if weights is None else np.broadcast_to(np.asarray(weights, dtype=np.float64), U.shape)
+        W2 = W * W
+        UW2 = U * W2
+        u_norms = np.linalg.norm(U * W, axis=1)
+
+        n = len(self.catalog)
+        sims = np.zeros((len(U), n))
+        for start in range(0, n, block_rows):
+            X = np.asarray(self.catalog.features[start:start + block_rows], dtype=np.float64)
+            numerator = UW2 @ X.T
+            denominator = u_norms[:, None] * np.sqrt(W2 @ (X * X).T)
+            np.divide(numerator, denominator, out=sims[:, start:start + len(X)], where=denominator > 0)
+        return sims
 
-        # Preference Scoring (Fuzzy)
-        pref_region = user_data.get("regionPreference", "")
-        pref_scores = filtered_df.apply(lambda row: self._fuzzy_match(pref_region, row.get("Region", "")), axis=1).values
+    def _rank_rows(self, rows, sims, constraints, user_data, avoid_ingredients, r_constraints, top_n, pref_scores=None):
+        # Preference Scoring (region, cuisines, spice / sweetness / macro levels)
+        if pref_scores is None:
+            pref_scores = self.preferences.scores(user_data, rows)
 
         # Combined Base Score
         base_scores = 0.7 * sims + 0.3 * pref_scores
@@ -154,76 +267,100 @@ class NutritionRecommender:
         # Apply medical constraints as penalties (static + RAG-driven)
         r_thresholds = r_constraints.get("nutrient_thresholds", {}) if r_constraints else {}
         
-        for i in range(len(filtered_df)):
-            row = filtered_df.iloc[i]
-            penalty = 1.0
-            
-            # Static constraints from constraint_engine
-            if "max_sugar" in constraints:
-                if row.get("Sugars, total (g)", 0) > constraints["max_sugar"]:
-                    penalty *= 0.5
-            if "max_sodium" in constraints:
-                if row.get("Sodium, Na (mg)", 0) > constraints["max_sodium"]:
-                    penalty *= 0.3
-            
-            # RAG-driven thresholds
-            for nutrient, threshold in r_thresholds.items():
-                if row.get(nutrient, 0) > threshold:
-                    penalty *= 0.1 # Severe penalty for medically dangerous recipes
-
-            # Consolidated Ingredient Avoidance Check (Robust Matching)
-            if avoid_ingredients:
-                title = str(row.get("Recipe_title", "")).lower()
-                for ing in avoid_ingredients:
-                    stem = ing.lower().rstrip('s')
-                    if stem in title:
-                        penalty *= 0.001 # Extreme penalty to ensure it's at the bottom
-                        break
-
-            base_scores[i] *= penalty
-
-        # Generate Score Ranges
+        base_scores *= compute_penalties(
+            self.catalog, constraints=constraints, r_thresholds=r_thresholds,
+            avoid_ingredients=avoid_ingredients, rows=rows, titles_lower=self.catalog.titles_lower
+        )
+
+        # Partial top-k selection: only the returned rows get score ranges and nutrient ranges
+        top = self._top_k(base_scores, top_n)
+        top_rows = rows[top]
+        top_scores = base_scores[top]
+
+        # Generate Score Ranges (spread is still taken over every candidate)
         std_dev = np.std(base_scores) if len(base_scores) > 1 else 0.05
-        filtered_df["score_min"] = (base_scores - 0.1 * std_dev).clip(0, 1)
-        filtered_df["score_max"] = (base_scores + 0.1 * std_dev).clip(base_scores, 1)
-        filtered_df["score"] = base_scores
-
-        # Generate Fuzzy Nutrient Ranges (perturbing original values slightly)
-        nutrient_ranges = []
-        for i, row in filtered_df.iterrows():
-            recipe_ranges = {}
-            for nutrient in self.nutrients:
-                val = float(row[nutrient])
-                # Simulate 5% uncertainty range
-                recipe_ranges[nutrient] = {
-                    "min": round(max(0, val * 0.95), 4),
-                    "max": round(val * 1.05, 4)
-                }
-            nutrient_ranges.append(recipe_ranges)
-        
-        filtered_df["nutrient_ranges"] = nutrient_ranges
+        ranked = pd.DataFrame({
+            "Recipe_id": self.catalog.recipe_ids[top_rows],
+            "Recipe_title": self.catalog.titles[top_rows],
+            "Region": self.catalog.regions[top_rows],
+            "score": top_scores,
+            "score_min": (top_scores - 0.1 * std_dev).clip(0, 1),
+            "score_max": (top_scores + 0.1 * std_dev).clip(top_scores, 1),
+        }, index=top)
+
+        ranked["nutrient_ranges"] = self.nutrient_ranges(top_rows)
+
+        return ranked
 
-        return filtered_df.sort_values(by="score", ascending=False)[
-            ["Recipe_id", "Recipe_title", "Region", "score", "score_min", "score_max", "nutrient_ranges"]
-        ].head(top_n)
+    @staticmethod
+    def _top_k(scores, k):
+        """
+        Positions of the k highest scores in descending order (ties keep catalog order).
+        Uses a partial partition, so cost grows with k rather than with the candidate count.
+        Scores equal to 12 decimals count as ties, so the order does not depend on
+        floating-point summation order (single vs batched similarity).
+        """
+        scores = np.round(scores, 12)
+        n = len(scores)
+        k = max(0, min(k, n))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        if k < n:
+            kth = np.partition(scores, n - k)[n - k]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(n)
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][:k]
+
+    def nutrient_ranges(self, rows):
+        """Fuzzy nutrient ranges (simulated 5% uncertainty) for the given catalog rows."""
+        values = self.catalog.nutrient_matrix[rows]
+        lows = np.maximum(0, values * 0.95).tolist()
+        highs = (values * 1.05).tolist()
+        return [
+            {
+                nutrient: {"min": round(low, 4), "max": round(high, 4)}
+                for nutrient, low, high in zip(self.nutrients, low_row, high_row)
+            }
+            for low_row, high_row in zip(lows, highs)
+        ]
+
+    def _fit_generative_model(self, rows):
+        X_norm = self.scaler.transform(self.catalog.nutrient_matrix[rows])
+        y = self.catalog["Calories"][rows]
+        model = GradientBoostingRegressor(n_estimators=100)
+        model.fit(X_norm, y)
+        return model
+
+    def generative_model(self, rows, mode=None):
+        """
+        Fits the generative model for a candidate set according to GENERATIVE_MODEL_MODE.
+        Its output is not used by the synthetic profiles, so "skip" returns None without fitting.
+        """
+        mode = mode or GENERATIVE_MODEL_MODE
+        if mode == "skip":
+            return None
+        with metrics.stage("generative.fit"):
+            return self._fit_generative_model(rows)
 
     def generate_optimal_combinations(self, user_data, target_nutrient="score", r_constraints=None):
         """
         Uses Gradient Boosting to find nutrient combinations that maximize similarity score.
         Respects RAG-driven negative ingredient constraints.
         """
-        avoid_ingredients = r_constraints.get("avoid_ingredients", []) if r_constraints else None
-        df = self.filter_foods(user_data, avoid_ingredients=avoid_ingredients)
-        if df.empty or len(df) < 5:
+        return self.optimal_combinations(PipelineContext(self, user_data, r_constraints=r_constraints))
+
+    def optimal_combinations(self, context):
+        """generate_optimal_combinations() on a PipelineContext, reusing its candidate rows."""
+        rows = context.rows
+        if len(rows) < 5:
             return "Insufficient data to train generative model"
 
-        # Train on normalized data
-        X_orig = df[self.nutrients].values
-        X_norm = self.scaler.transform(X_orig)
-        y = df["Calories"].values 
+        self.generative_model(rows)
 
-        model = GradientBoostingRegressor(n_estimators=100)
-        model.fit(X_norm, y)
+        # Only the first candidates seed the synthetic profiles
+        X_norm = self.scaler.transform(self.catalog.nutrient_matrix[rows[:3]])
         
         # Perturb in normalized space
         top_norm = X_norm[:3]
@@ -255,12 +392,19 @@ class NutritionRecommender:
         
         # Format weights
         weight_dict = {name: float(w) for name, w in zip(self.nutrients, final_weights)}
+
+        # Catalog scaling statistics, so receivers score candidates in the same feature space
+        scaling = {
+            "mean": {name: float(m) for name, m in zip(self.nutrients, self.scaler.mean_)},
+            "std": {name: float(s) for name, s in zip(self.nutrients, self.scaler.scale_)},
+        }
         
         return {
             "target_nutrients": target_dict,
             "weights": weight_dict,
             "constraints": r_constraints,
             "dietary_preference": dietary_preference,
+            "scaling": scaling,
             "query_metadata": {
                 "engine": "Foodoscope-Adaptive-v2",
                 "similarity_mode": "ReLU-Cosine",
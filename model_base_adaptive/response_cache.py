@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import metrics
+from config import (
+    FOOD_DATA, GUIDELINES_DATA, RECIPE_STORE_DIR, GENERATIVE_MODEL_MODE,
+    RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_PATH
+)
+
+# Version is re-derived from file stats at most this often
+VERSION_CHECK_INTERVAL_S = 1.0
+
+# List fields the pipeline treats as unordered, case-insensitive keyword sets
+CASEFOLD_LIST_FIELDS = ["allergies", "healthGoals", "cuisines"]
+# List fields that are unordered but matched case-sensitively (generate_constraints)
+SORTED_LIST_FIELDS = ["medicalHistory"]
+# Fields that never change the /recommend response
+IGNORED_FIELDS = ["user_id"]
+
+
+def canonical_profile(user_data):
+    """
+    Canonical form of a profile: only the fields that affect the response, lists sorted and
+    de-duplicated, and keyword lists case-folded. Scalar strings keep their case because
+    the pipeline compares them exactly (e.g. gender, activityLevel, dietaryPreference flags).
+    """
+    canonical = {}
+    for field, value in user_data.items():
+        if field in IGNORED_FIELDS:
+            continue
+        if field in CASEFOLD_LIST_FIELDS:
+            value = sorted({str(v).strip().casefold() for v in value or []})
+        elif field in SORTED_LIST_FIELDS:
+            value = sorted({str(v).strip() for v in value or []})
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        canonical[field] = value
+    return canonical
+
+
+def profile_key(user_data, version="", fields=None):
+    """SHA-256 of the canonical profile, the data version and the selected output fields."""
+    payload = json.dumps(canonical_profile(user_data), sort_keys=True, separators=(",", ":"), default=str)
+    if fields:
+        payload = ",".join(sorted(fields)) + "|" + payload
+    return hashlib.sha256((version + "|" + payload).encode("utf-8")).hexdigest()
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return "-"
+
+
+def data_version():
+    """
+    Version of everything the cached responses were computed from: the recipe CSV,
+    the compiled recipe store, the medical guidelines and the generative mode.
+    """
+    parts = [
+        _stamp(FOOD_DATA),
+        _stamp(os.path.join(RECIPE_STORE_DIR, "manifest.json")),
+        _stamp(GUIDELINES_DATA),
+        GENERATIVE_MODEL_MODE,
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class MemoryBackend:
+    """In-process LRU of encoded responses, bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires <= now:
+                del self._entries[key]
+                self._bytes -= len(data)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data, expires):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (expires, data)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class DiskBackend:
+    """
+    SQLite-backed store shared by every process on the host (e.g. several uvicorn workers).
+    LRU order is approximated by last-access time; eviction runs on insert.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, data BLOB, size INTEGER, expires REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, now):
+        conn = self._connection()
+        row = conn.execute("SELECT data, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def put(self, key, data, expires):
+        if len(data) > self.max_bytes:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, data, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), expires, now),
+        )
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            count, total = count - 1, total - row[1]
+            self.evictions += 1
+
+    def clear(self):
+        self._connection().execute("DELETE FROM responses")
+
+    def stats(self):
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "evictions": self.evictions}
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of /recommend responses keyed by the canonical profile hash.
+    The data version is part of every key, and the backend is cleared whenever it changes,
+    so responses are never served across catalog or guideline updates.
+
+    The file stamps change as soon as a file is written, before the engines are reloaded, so
+    keys also carry a reload generation that invalidate() bumps once the new engines are in
+    place. Callers take the key when a request starts: a response computed on the previous
+    engines is stored under the previous generation, where no later request looks it up.
+    """
+
+    def __init__(self, backend=None, ttl=RESPONSE_CACHE_TTL_S):
+        self.backend = backend
+        self.ttl = ttl
+        self._version = None
+        self._version_checked = 0.0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def version(self):
+        now = time.monotonic()
+        if now - self._version_checked >= VERSION_CHECK_INTERVAL_S:
+            current = data_version()
+            with self._lock:
+                if self._version is not None and current != self._version:
+                    self.backend.clear()
+                    self.invalidations += 1
+                self._version = current
+                self._version_checked = now
+        return self._version
+
+    def key(self, user_data, fields=None):
+        return profile_key(user_data, f"{self.version()}:{self.generation}", fields)
+
+    def get(self, key):
+        data = self.backend.get(key, time.time())
+        metrics.cache_lookup("response", data is not None)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(data)
+
+    def put(self, key, response):
+        data = json.dumps(response, separators=(",", ":")).encode("utf-8")
+        self.backend.put(key, data, time.time() + self.ttl)
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def invalidate(self):
+        """Starts a new reload generation (keys taken before it no longer match) and clears the backend."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+        self.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": type(self.backend).__name__ if self.enabled else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
+        if self.enabled:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def create_response_cache(kind=RESPONSE_CACHE_BACKEND):
+    """Builds the configured cache: "memory", "disk", or "off" (a disabled cache)."""
+    if kind == "memory":
+        return ResponseCache(MemoryBackend())
+    if kind == "disk":
+        return ResponseCache(DiskBackend())
+    return ResponseCache(None)
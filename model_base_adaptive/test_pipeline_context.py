@@ -0,0 +1,179 @@
+import copy
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+from catalog import RecipeCatalog
+from constraint_engine import generate_constraints
+from pipeline_context import PipelineContext
+from recommender_engine import NutritionRecommender
+from user_profile import UserProfile
+from benchmarks.synthetic import synthetic_catalog, synthetic_profiles
+
+R_CONSTRAINTS = {"avoid_ingredients": ["sugar", "salt"], "nutrient_thresholds": {"Sodium, Na (mg)": 1500}}
+REGION_PREFERENCES = ["", "Middle Eastern", "Africa", "Chinese and Mongolian"]
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+# Frozen copy of the pre-context pipeline (filter_foods, rank and generate_optimal_combinations
+# as they were before PipelineContext), so the shared context is checked against an
+# independent implementation rather than against itself
+DIET_AVOIDANCE = {
+    "vegan": ["chicken", "beef", "pork", "fish", "egg", "dairy", "milk", "cheese", "honey", "meat", "lamb", "shrimp",
+              "seafood", "clam", "oyster", "crab", "bacon", "steak"],
+    "vegetarian": ["chicken", "beef", "pork", "fish", "meat", "lamb", "shrimp", "seafood", "clam", "oyster", "crab",
+                   "bacon", "steak"],
+    "pescetarian": ["chicken", "beef", "pork", "meat", "lamb", "bacon", "steak"],
+}
+
+
+def reference_avoid(user_data, r_constraints):
+    avoid = list(r_constraints.get("avoid_ingredients", []))
+    return set(avoid + DIET_AVOIDANCE.get(user_data.get("dietaryPreference", "").lower(), []))
+
+
+def reference_filter(foods, user_data, avoid_ingredients):
+    """Catalog positions of the recipes the pandas filter_foods kept."""
+    df = foods
+    diet = user_data.get("dietaryPreference", "")
+    if diet in ("vegan", "pescetarian", "lacto_vegetarian"):
+        df = df[df[diet] == 1]
+    for allergy in user_data.get("allergies", []):
+        df = df[~df["Recipe_title"].str.contains(allergy, case=False, na=False)]
+    for ingredient in avoid_ingredients:
+        df = df[~df["Recipe_title"].str.lower().str.contains(ingredient.lower().rstrip('s'), na=False)]
+    if "regions" in user_data:
+        df = df[df["Region"].isin(user_data["regions"])]
+    return df.index.to_numpy()
+
+
+def reference_fuzzy_match(user_val, row_val):
+    if not user_val or not row_val: return 0.5
+    user_val, row_val = str(user_val).lower(), str(row_val).lower()
+    if user_val == row_val: return 1.0
+    if user_val in row_val or row_val in user_val: return 0.8
+    return 0.2
+
+
+def reference_rank(recommender, foods, user_vector, constraints, user_data, weights, r_constraints, top_n=5):
+    """Per-row loop of the pre-context rank(): positions, scores, score ranges and nutrient ranges of the top rows."""
+    avoid = reference_avoid(user_data, r_constraints)
+    rows = reference_filter(foods, user_data, avoid)
+    df = foods.iloc[rows]
+    scaler, nutrients = recommender.scaler, recommender.nutrients
+    u_weighted = np.maximum(0, scaler.transform(user_vector.reshape(1, -1))) * weights
+    X_weighted = np.maximum(0, scaler.transform(df[nutrients].values)) * weights
+    sims = cosine_similarity(u_weighted, X_weighted)[0]
+    pref_region = user_data.get("regionPreference", "")
+    pref_scores = np.array([reference_fuzzy_match(pref_region, region) for region in df["Region"]])
+    base_scores = 0.7 * sims + 0.3 * pref_scores
+
+    for i in range(len(df)):
+        row = df.iloc[i]
+        penalty = 1.0
+        if "max_sugar" in constraints and row.get("Sugars, total (g)", 0) > constraints["max_sugar"]:
+            penalty *= 0.5
+        if "max_sodium" in constraints and row.get("Sodium, Na (mg)", 0) > constraints["max_sodium"]:
+            penalty *= 0.3
+        for nutrient, threshold in r_constraints.get("nutrient_thresholds", {}).items():
+            if row.get(nutrient, 0) > threshold:
+                penalty *= 0.1
+        title = str(row.get("Recipe_title", "")).lower()
+        if any(ing.lower().rstrip('s') in title for ing in avoid):
+            penalty *= 0.001
+        base_scores[i] *= penalty
+
+    std_dev = np.std(base_scores) if len(base_scores) > 1 else 0.05
+    top = np.argsort(-base_scores, kind="stable")[:top_n]
+    scores = base_scores[top]
+    nutrient_ranges = [
+        {n: {"min": round(max(0, float(row[n]) * 0.95), 4), "max": round(float(row[n]) * 1.05, 4)} for n in nutrients}
+        for _, row in df.iloc[top].iterrows()
+    ]
+    score_min, score_max = (scores - 0.1 * std_dev).clip(0, 1), (scores + 0.1 * std_dev).clip(scores, 1)
+    return rows[top], scores, score_min, score_max, nutrient_ranges
+
+
+def reference_profiles(recommender, foods, user_data, r_constraints):
+    rows = reference_filter(foods, user_data, reference_avoid(user_data, r_constraints))
+    if len(rows) < 5:
+        return "Insufficient data to train generative model"
+    X_norm = recommender.scaler.transform(foods.iloc[rows][recommender.nutrients].values)
+    synthetic_norm = [vec + np.random.normal(0, 0.05, size=vec.shape) for vec in X_norm[:3] for _ in range(2)]
+    synthetic = np.clip(recommender.scaler.inverse_transform(synthetic_norm), 0, None)
+    return [dict(zip(recommender.nutrients, profile.tolist())) for profile in synthetic]
+
+
+@pytest.fixture(scope="module")
+def catalog_frame():
+    return synthetic_catalog(2000)
+
+
+@pytest.fixture(scope="module")
+def recommender(catalog_frame):
+    return NutritionRecommender(catalog=RecipeCatalog.from_frame(catalog_frame))
+
+
+def cases(recommender):
+    weights = recommender.get_adaptive_weights()
+    for i, user_data in enumerate(synthetic_profiles(20, seed=3)):
+        user_data["regionPreference"] = REGION_PREFERENCES[i % len(REGION_PREFERENCES)]
+        profile = UserProfile(user_data)
+        user_vector = profile.generate_nutrient_vector(recommender.nutrients, nutrient_means=recommender.means)
+        yield user_data, user_vector, generate_constraints(user_data["medicalHistory"]), weights
+
+
+def test_shared_context_matches_reference_pipeline(recommender):
+    """Ranking, generative profiles and the search constraints from one shared context match the pre-context code."""
+    foods = recommender.foods
+    for user_data, user_vector, constraints, weights in cases(recommender):
+        r_constraints = copy.deepcopy(R_CONSTRAINTS)
+        context = PipelineContext(
+            recommender, user_data, r_constraints=r_constraints, user_vector=user_vector, weights=weights
+        )
+
+        expected_rows = reference_filter(foods, user_data, reference_avoid(user_data, R_CONSTRAINTS))
+        np.testing.assert_array_equal(context.rows, expected_rows)
+
+        ranked = recommender.rank_context(context, constraints)
+        rows, scores, score_min, score_max, nutrient_ranges = reference_rank(
+            recommender, foods, user_vector, constraints, user_data, weights, R_CONSTRAINTS
+        )
+        np.testing.assert_array_equal(ranked["Recipe_id"].to_numpy(), foods["Recipe_id"].to_numpy()[rows])
+        # The context scores float32 feature rows; the reference recomputes them in float64
+        np.testing.assert_allclose(ranked["score"].to_numpy(), scores, rtol=1e-5)
+        np.testing.assert_allclose(ranked["score_min"].to_numpy(), score_min, rtol=1e-5, atol=1e-7)
+        np.testing.assert_allclose(ranked["score_max"].to_numpy(), score_max, rtol=1e-5, atol=1e-7)
+        assert ranked["nutrient_ranges"].tolist() == nutrient_ranges
+
+        np.random.seed(0)
+        profiles = recommender.optimal_combinations(context)
+        np.random.seed(0)
+        expected = reference_profiles(recommender, foods, user_data, R_CONSTRAINTS)
+        if isinstance(expected, str):
+            assert profiles == expected
+        else:
+            assert [list(p) for p in profiles] == [list(p) for p in expected]
+            np.testing.assert_allclose([list(p.values()) for p in profiles], [list(p.values()) for p in expected])
+
+        search_constraints = context.search_constraints
+        assert set(search_constraints["avoid_ingredients"]) == reference_avoid(user_data, R_CONSTRAINTS)
+        assert search_constraints["nutrient_thresholds"] == R_CONSTRAINTS["nutrient_thresholds"]
+        assert r_constraints == R_CONSTRAINTS  # the context never mutates its inputs
+
+
+def test_request_filters_the_catalog_once(recommender, monkeypatch):
+    """Ranking, the generative stage and the search payload of one request share a single filter pass."""
+    calls = []
+    filter_indices = recommender.filter_indices
+    monkeypatch.setattr(
+        recommender, "filter_indices", lambda *args, **kwargs: calls.append(args) or filter_indices(*args, **kwargs)
+    )
+    for user_data, user_vector, constraints, weights in cases(recommender):
+        calls.clear()
+        context = PipelineContext(
+            recommender, user_data, r_constraints=R_CONSTRAINTS, user_vector=user_vector, weights=weights
+        )
+        recommender.rank_context(context, constraints)
+        recommender.optimal_combinations(context)
+        recommender.generate_search_query(user_vector, weights, context.search_constraints)
+        assert len(calls) == 1